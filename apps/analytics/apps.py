@@ -5,3 +5,13 @@ class AnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.analytics'
     verbose_name = 'Analytics'
+
+    def ready(self):
+        # Invalidate cached analytics results for the dates touched by billing writes
+        from django.db.models.signals import post_save, post_delete
+        from apps.billing.models import Purchase, CreditTransaction, ConsumptionEvent
+        from .signals import invalidate_analytics_for_instance
+        for model in (Purchase, CreditTransaction, ConsumptionEvent):
+            uid = f'analytics_invalidate_{model._meta.model_name}'
+            post_save.connect(invalidate_analytics_for_instance, sender=model, dispatch_uid=f'{uid}_save')
+            post_delete.connect(invalidate_analytics_for_instance, sender=model, dispatch_uid=f'{uid}_delete')
@@ -0,0 +1,46 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from apps.analytics.services.cohorts import cohort_matrices
+
+
+def synthetic_inputs(users: int, months: int, events_per_user: int, seed: int = 0):
+    """Actividad sintética con la forma de ``load_cohort_inputs`` (sin tocar la base de datos)."""
+    rng = np.random.default_rng(seed)
+    first_month = rng.integers(0, months, size=users)
+    user = np.repeat(np.arange(users), events_per_user)
+    # Actividad decreciente tras la primera compra
+    offset = np.minimum(rng.geometric(0.25, size=len(user)) - 1, months - 1)
+    month = first_month[user] + offset
+    revenue = rng.choice([0.0, 29.0, 79.0], size=len(user), p=[0.6, 0.3, 0.1])
+    credits = rng.integers(0, 20, size=len(user)).astype(np.float64)
+    return first_month, user, month, revenue, credits
+
+
+class Command(BaseCommand):
+    help = 'Time the vectorised cohort engine over synthetic data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100_000)
+        parser.add_argument('--months', type=int, default=24)
+        parser.add_argument('--events-per-user', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5, help='Runs; the best time is reported')
+        parser.add_argument('--budget-ms', type=float, default=1000.0)
+
+    def handle(self, *args, **opts):
+        months = opts['months']
+        inputs = synthetic_inputs(opts['users'], months, opts['events_per_user'])
+        best = None
+        for _ in range(max(1, opts['repeat'])):
+            t0 = time.perf_counter()
+            m = cohort_matrices(*inputs, start_month=0, n_months=months)
+            elapsed = (time.perf_counter() - t0) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        self.stdout.write(
+            f'users={opts["users"]} rows={len(inputs[1])} matrix={months}x{months} '
+            f'cohort_users={int(m["sizes"].sum())} best={best:.2f}ms'
+        )
+        if best > opts['budget_ms']:
+            self.stderr.write(self.style.WARNING(f'Above budget of {opts["budget_ms"]:.0f}ms'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Within budget'))
@@ -0,0 +1,59 @@
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from apps.billing.models import Purchase, ConsumptionEvent
+from apps.analytics.services.timeseries import grouped_series
+
+
+def _legacy_per_day(metric: str, from_dt: date, to_dt: date):
+    # Implementación anterior (una consulta aggregate() por día), conservada solo como referencia
+    data = []
+    cur = from_dt
+    while cur <= to_dt:
+        if metric == 'revenue':
+            val = float(Purchase.objects.filter(status=Purchase.STATUS_PAID, created_at__date=cur).aggregate(s=Sum('amount_usd'))['s'] or 0)
+        else:
+            val = int(ConsumptionEvent.objects.filter(created_at__date=cur).aggregate(s=Sum('credits_spent'))['s'] or 0)
+        data.append({'date': cur.isoformat(), 'value': val})
+        cur += timedelta(days=1)
+    return data
+
+
+class Command(BaseCommand):
+    help = 'Compare query count and latency of the grouped timeseries engine against the per-day loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--metric', default='revenue', choices=['revenue', 'credits'])
+        parser.add_argument('--days', type=int, nargs='+', default=[7, 30, 365])
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the best time is reported')
+
+    def _measure(self, fn, repeat):
+        best = None
+        queries = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                t0 = time.perf_counter()
+                result = fn()
+                elapsed = (time.perf_counter() - t0) * 1000
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return result, queries, best
+
+    def handle(self, *args, **opts):
+        metric = opts['metric']
+        repeat = max(1, opts['repeat'])
+        to_dt = date.today()
+        self.stdout.write(f'metric={metric} repeat={repeat}')
+        self.stdout.write(f"{'days':>6} {'impl':>8} {'queries':>8} {'ms':>10}")
+        for days in opts['days']:
+            from_dt = to_dt - timedelta(days=days - 1)
+            legacy, q_legacy, t_legacy = self._measure(lambda: _legacy_per_day(metric, from_dt, to_dt), repeat)
+            grouped, q_grouped, t_grouped = self._measure(lambda: grouped_series(metric, from_dt, to_dt), repeat)
+            self.stdout.write(f'{days:>6} {"loop":>8} {q_legacy:>8} {t_legacy:>10.2f}')
+            self.stdout.write(f'{days:>6} {"grouped":>8} {q_grouped:>8} {t_grouped:>10.2f}')
+            if legacy != grouped:
+                self.stderr.write(self.style.WARNING(f'{days}d: results differ between implementations'))
+        self.stdout.write(self.style.SUCCESS('Benchmark finished'))
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_factwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort_month', models.DateField()),
+                ('period', models.IntegerField()),
+                ('cohort_size', models.IntegerField(default=0)),
+                ('active_users', models.IntegerField(default=0)),
+                ('retention_rate', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('credits_consumed', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['cohort_month', 'period'],
+                'unique_together': {('cohort_month', 'period')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_cohortfact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cohortfact',
+            name='built_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -50,3 +50,30 @@ class DailyRiskFact(models.Model):
     class Meta:
         unique_together = ('date',)
         ordering = ['-date']
+
+
+class FactWatermark(models.Model):
+    """High-water mark del último build incremental de cada tabla de hechos."""
+    fact = models.CharField(max_length=50, unique=True)
+    high_water_mark = models.DateTimeField(null=True, blank=True)
+    last_run_at = models.DateTimeField(null=True, blank=True)
+    days_rebuilt = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fact} @ {self.high_water_mark}"
+
+
+class CohortFact(models.Model):
+    """Celda (cohorte, periodo) de las matrices de cohortes; la cohorte es el mes de la primera compra."""
+    cohort_month = models.DateField()
+    period = models.IntegerField()
+    cohort_size = models.IntegerField(default=0)
+    active_users = models.IntegerField(default=0)
+    retention_rate = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    credits_consumed = models.IntegerField(default=0)
+    built_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ('cohort_month', 'period')
+        ordering = ['cohort_month', 'period']
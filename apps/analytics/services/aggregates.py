@@ -1,33 +1,306 @@
+from collections import Counter, defaultdict
 from datetime import date, timedelta
-from django.db.models import Sum, Count
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from django.db.models import Count, Min, Sum, Q
+from django.db.models.functions import TruncDate
 from django.utils import timezone
-from apps.billing.models import Purchase, CreditTransaction, ConsumptionEvent
-from ..models import DailyRevenueFact, DailyCreditsFact
+from apps.billing.models import Plan, Purchase, CreditTransaction, ConsumptionEvent
+from apps.brokers.models import Broker
+from apps.dispatch.models import Dispatch
+from apps.loads.models import Load
+from ..models import DailyRevenueFact, DailyCreditsFact, DailyLoadsFact, DailyRiskFact
+from .cache import bump_dates
+from .timeseries import day_bounds
+
+GRANT_TYPES = [CreditTransaction.TYPE_PURCHASE, CreditTransaction.TYPE_RENEWAL]
+
+# Una compra deja de estar pendiente al pagarse; las suscripciones terminan al salir de PAID
+SUBSCRIPTION_ENDED = [Purchase.STATUS_PAST_DUE, Purchase.STATUS_CANCELED, Purchase.STATUS_REFUNDED]
+STARTED_STATUSES = [Purchase.STATUS_PAID, *SUBSCRIPTION_ENDED]
+
+# Umbral de cancelaciones (sobre el total de loads del broker) a partir del cual sube el riesgo
+RISK_CANCEL_RATIO = 0.25
+
+
+def date_runs(days):
+    """Agrupa fechas sueltas en tramos contiguos [(desde, hasta), ...]."""
+    runs = []
+    for d in sorted(set(days)):
+        if runs and d == runs[-1][1] + timedelta(days=1):
+            runs[-1] = (runs[-1][0], d)
+        else:
+            runs.append((d, d))
+    return runs
+
+
+def spans_q(field: str, runs):
+    # OR de rangos semiabiertos: una sola consulta que sigue pudiendo usar el índice del timestamp
+    parts = []
+    for first, last in runs:
+        start, end = day_bounds(first, last)
+        parts.append(Q(**{f'{field}__gte': start, f'{field}__lt': end}))
+    return reduce(or_, parts)
+
+
+def dates_q(field: str, runs):
+    # Equivalente a spans_q para columnas DateField
+    return reduce(or_, [Q(**{f'{field}__gte': first, f'{field}__lte': last}) for first, last in runs])
+
+
+def days_between(from_dt: date, to_dt: date):
+    return [from_dt + timedelta(days=i) for i in range((to_dt - from_dt).days + 1)]
+
+
+def compute_revenue(runs):
+    rows = (
+        Purchase.objects.filter(spans_q('created_at', runs))
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values('day')
+        .annotate(
+            revenue=Sum('amount_usd', filter=Q(status=Purchase.STATUS_PAID)),
+            refunds=Sum('amount_usd', filter=Q(status=Purchase.STATUS_REFUNDED)),
+        )
+    )
+    return {r['day']: {'revenue': r['revenue'] or 0, 'refunds': r['refunds'] or 0} for r in rows}
+
+
+def compute_credits(runs):
+    out = {}
+    granted = (
+        CreditTransaction.objects.filter(spans_q('created_at', runs), type__in=GRANT_TYPES)
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values('day')
+        .annotate(total=Sum('signed_amount'))
+    )
+    for r in granted:
+        out.setdefault(r['day'], {'credits_granted': 0, 'credits_consumed': 0, 'by_service': {}})
+        out[r['day']]['credits_granted'] = int(r['total'] or 0)
+    consumed = (
+        ConsumptionEvent.objects.filter(spans_q('created_at', runs))
+        .annotate(day=TruncDate('created_at'))
+        .order_by()
+        .values('day', 'service_type__code')
+        .annotate(total=Sum('credits_spent'))
+    )
+    for r in consumed:
+        row = out.setdefault(r['day'], {'credits_granted': 0, 'credits_consumed': 0, 'by_service': {}})
+        total = int(r['total'] or 0)
+        row['credits_consumed'] += total
+        row['by_service'][r['service_type__code']] = total
+    return out
+
+
+def _local_day(value):
+    return timezone.localtime(value).date()
+
+
+def compute_subscriptions(first: date, last: date):
+    """MRR, ARR, ARPU, suscripciones activas y clientes nuevos por día en [first, last].
+
+    Un barrido lineal sobre el historial: cada suscripción (``subscription_id`` o plan mensual)
+    aporta un evento de alta el día de ``created_at`` y, si ya no está en PAID, uno de baja el día
+    de ``updated_at`` (su último cambio de estado). Se recorre el rango una vez aplicando los
+    eventos de cada día, así que el coste es O(suscripciones + días) con una consulta por fuente.
+    """
+    start, _ = day_bounds(first, first)
+    _, end = day_bounds(last, last)
+    subs = Purchase.objects.filter(
+        Q(subscription_id__isnull=False) | Q(plan__renewal_interval=Plan.INTERVAL_MONTHLY),
+        Q(status=Purchase.STATUS_PAID) | Q(updated_at__gte=start),
+        status__in=STARTED_STATUSES, created_at__lt=end,
+    ).order_by().values_list('user_id', 'amount_usd', 'status', 'created_at', 'updated_at')
+    events = defaultdict(list)
+    for user_id, amount, status, created_at, updated_at in subs:
+        begins = max(_local_day(created_at), first)
+        ends = _local_day(updated_at) if status in SUBSCRIPTION_ENDED else None
+        if ends is not None and ends <= begins:
+            continue
+        events[begins].append((user_id, amount or 0, 1))
+        if ends is not None and ends <= last:
+            events[ends].append((user_id, -(amount or 0), -1))
+
+    firsts = (
+        Purchase.objects.filter(status__in=STARTED_STATUSES)
+        .order_by()
+        .values('user_id')
+        .annotate(first=Min('created_at'))
+        .filter(first__gte=start, first__lt=end)
+        .values_list('first', flat=True)
+    )
+    new_customers = Counter(_local_day(f) for f in firsts)
+
+    out = {}
+    mrr = Decimal(0)
+    active = 0
+    per_user = Counter()
+    for d in days_between(first, last):
+        for user_id, amount, delta in events.get(d, ()):
+            mrr += amount
+            active += delta
+            per_user[user_id] += delta
+            if not per_user[user_id]:
+                del per_user[user_id]
+        mrr_q = mrr.quantize(Decimal('0.01'))
+        out[d] = {
+            'mrr': mrr_q,
+            'arr': mrr_q * 12,
+            'arpu': (mrr / len(per_user)).quantize(Decimal('0.01')) if per_user else Decimal(0),
+            'active_subscriptions': active,
+            'new_customers': new_customers.get(d, 0),
+        }
+    return out
+
+
+REVENUE_FIELDS = ['revenue', 'refunds', 'mrr', 'arr', 'arpu', 'active_subscriptions', 'new_customers']
+
+
+def upsert_revenue(days, values):
+    objs = [DailyRevenueFact(date=d, **{**dict.fromkeys(REVENUE_FIELDS, 0), **values.get(d, {})}) for d in days]
+    DailyRevenueFact.objects.bulk_create(
+        objs, batch_size=500, update_conflicts=True, unique_fields=['date'], update_fields=REVENUE_FIELDS,
+    )
+    return len(objs)
+
+
+def upsert_credits(days, values):
+    empty = {'credits_granted': 0, 'credits_consumed': 0, 'by_service': {}}
+    objs = [DailyCreditsFact(date=d, **values.get(d, empty)) for d in days]
+    DailyCreditsFact.objects.bulk_create(
+        objs, batch_size=500, update_conflicts=True, unique_fields=['date'],
+        update_fields=['credits_granted', 'credits_consumed', 'by_service'],
+    )
+    return len(objs)
+
+
+def build_revenue_days(days):
+    days = sorted(set(days))
+    if not days:
+        return 0
+    values = compute_subscriptions(days[0], days[-1])
+    for d, row in compute_revenue(date_runs(days)).items():
+        values.setdefault(d, {}).update(row)
+    built = upsert_revenue(days, values)
+    # mrr y active_subscriptions se leen de DailyRevenueFact: bulk_create no emite señales
+    bump_dates(days)
+    return built
+
+
+def build_credits_days(days):
+    days = sorted(set(days))
+    if not days:
+        return 0
+    built = upsert_credits(days, compute_credits(date_runs(days)))
+    bump_dates(days)
+    return built
+
+
+def compute_loads(runs):
+    """Loads creados (por pickup_date), aceptados (con dispatch asignado ese día) y completados (por delivery_date).
+
+    ``Load`` no guarda fecha de alta, así que pickup_date es el día de referencia del load.
+    """
+    empty = {'loads_created': 0, 'loads_accepted': 0, 'loads_completed': 0, 'gross_revenue': 0}
+    out = {}
+    created = Load.objects.filter(dates_q('pickup_date', runs)).order_by().values('pickup_date').annotate(n=Count('id'))
+    for r in created:
+        out.setdefault(r['pickup_date'], dict(empty))['loads_created'] = r['n']
+    completed = (
+        Load.objects.filter(dates_q('delivery_date', runs), status='delivered')
+        .order_by()
+        .values('delivery_date')
+        .annotate(n=Count('id'), gross=Sum('rate'))
+    )
+    for r in completed:
+        row = out.setdefault(r['delivery_date'], dict(empty))
+        row['loads_completed'] = r['n']
+        row['gross_revenue'] = r['gross'] or 0
+    accepted = (
+        Dispatch.objects.filter(spans_q('assigned_at', runs))
+        .annotate(day=TruncDate('assigned_at'))
+        .order_by()
+        .values('day')
+        .annotate(n=Count('load', distinct=True))
+    )
+    for r in accepted:
+        out.setdefault(r['day'], dict(empty))['loads_accepted'] = r['n']
+    for row in out.values():
+        rate = row['loads_accepted'] * 100 / row['loads_created'] if row['loads_created'] else 0
+        row['acceptance_rate'] = Decimal(min(rate, 100)).quantize(Decimal('0.01'))
+    return out
+
+
+def compute_risk_snapshot():
+    """Snapshot actual del riesgo de brokers (una fila por broker, clasificada en Python).
+
+    Alto: no verificado y con cancelaciones >= RISK_CANCEL_RATIO. Medio: no verificado sin ese
+    historial, o verificado pero por encima del umbral.
+    """
+    rows = Broker.objects.order_by().annotate(
+        total=Count('loads'),
+        cancelled=Count('loads', filter=Q(loads__status='cancelled')),
+    ).values_list('is_verified', 'total', 'cancelled')
+    verified = high = medium = 0
+    for is_verified, total, cancelled in rows:
+        risky = bool(total) and cancelled / total >= RISK_CANCEL_RATIO
+        if is_verified:
+            verified += 1
+            medium += risky
+        elif risky:
+            high += 1
+        else:
+            medium += 1
+    return {'brokers_verified': verified, 'high_risk_count': high, 'medium_risk_count': medium}
+
+
+def upsert_loads(days, values):
+    empty = {'loads_created': 0, 'loads_accepted': 0, 'loads_completed': 0, 'gross_revenue': 0, 'acceptance_rate': 0}
+    objs = [DailyLoadsFact(date=d, **values.get(d, empty)) for d in days]
+    DailyLoadsFact.objects.bulk_create(
+        objs, batch_size=500, update_conflicts=True, unique_fields=['date'], update_fields=list(empty),
+    )
+    return len(objs)
+
+
+def build_loads_days(days):
+    days = sorted(set(days))
+    if not days:
+        return 0
+    built = upsert_loads(days, compute_loads(date_runs(days)))
+    # bulk_create no emite señales: las series de loads/riesgo leen estos facts directamente
+    bump_dates(days)
+    return built
+
+
+def build_risk_days(days):
+    # Brokers no tiene historial: solo se puede fotografiar el día de hoy
+    today = timezone.localdate()
+    if today not in set(days):
+        return 0
+    DailyRiskFact.objects.bulk_create(
+        [DailyRiskFact(date=today, **compute_risk_snapshot())],
+        update_conflicts=True, unique_fields=['date'],
+        update_fields=['brokers_verified', 'high_risk_count', 'medium_risk_count'],
+    )
+    bump_dates([today])
+    return 1
 
 
 def build_revenue_for_day(d: date):
-    qs_paid = Purchase.objects.filter(status=Purchase.STATUS_PAID, created_at__date=d)
-    revenue = qs_paid.aggregate(total=Sum('amount_usd'))['total'] or 0
-    refunds = Purchase.objects.filter(status=Purchase.STATUS_REFUNDED, created_at__date=d).aggregate(total=Sum('amount_usd'))['total'] or 0
-    DailyRevenueFact.objects.update_or_create(date=d, defaults={
-        'revenue': revenue,
-        'refunds': refunds,
-        # campos extra (mrr, arr, etc.) se rellenarán en iteraciones siguientes
-    })
+    build_revenue_days([d])
 
 
 def build_credits_for_day(d: date):
-    granted = CreditTransaction.objects.filter(created_at__date=d, type__in=['PURCHASE','SUBSCRIPTION_RENEWAL']).aggregate(total=Sum('signed_amount'))['total'] or 0
-    consumed = ConsumptionEvent.objects.filter(created_at__date=d).aggregate(total=Sum('credits_spent'))['total'] or 0
-    DailyCreditsFact.objects.update_or_create(date=d, defaults={
-        'credits_granted': int(granted or 0),
-        'credits_consumed': int(consumed or 0),
-    })
+    build_credits_days([d])
 
 
 def build_range(from_dt: date, to_dt: date):
-    cur = from_dt
-    while cur <= to_dt:
-        build_revenue_for_day(cur)
-        build_credits_for_day(cur)
-        cur += timedelta(days=1)
+    days = days_between(from_dt, to_dt)
+    build_revenue_days(days)
+    build_credits_days(days)
+    build_loads_days(days)
+    build_risk_days(days)
+    return len(days)
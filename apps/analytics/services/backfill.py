@@ -0,0 +1,52 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+from django.db import connections
+
+
+def split_range(from_dt: date, to_dt: date, chunk_days: int):
+    """Parte [from_dt, to_dt] en tramos consecutivos de como mucho ``chunk_days`` días."""
+    chunk_days = max(1, int(chunk_days))
+    chunks = []
+    cur = from_dt
+    while cur <= to_dt:
+        end = min(to_dt, cur + timedelta(days=chunk_days - 1))
+        chunks.append((cur, end))
+        cur = end + timedelta(days=1)
+    return chunks
+
+
+def build_chunk(from_dt: date, to_dt: date):
+    # Se ejecuta dentro del worker: agregación agrupada + bulk upsert para el tramo
+    from .aggregates import build_range
+    t0 = time.perf_counter()
+    days = build_range(from_dt, to_dt)
+    return from_dt, to_dt, days, time.perf_counter() - t0
+
+
+def _init_worker():
+    # Con 'spawn' cada worker arranca un intérprete limpio: configura Django y abre su propia conexión
+    import django
+    django.setup()
+
+
+def parallel_build(from_dt: date, to_dt: date, workers: int, chunk_days: int = 31, on_chunk=None):
+    """Construye los facts del rango en un pool de procesos, un tramo por tarea.
+
+    ``on_chunk(from_dt, to_dt, days, seconds, done, total)`` se llama en el proceso padre a medida
+    que termina cada tramo. Devuelve el total de días construidos.
+    """
+    chunks = split_range(from_dt, to_dt, chunk_days)
+    # No compartir sockets de la conexión del padre con los workers
+    connections.close_all()
+    ctx = multiprocessing.get_context('spawn')
+    total_days = 0
+    with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=ctx, initializer=_init_worker) as pool:
+        futures = [pool.submit(build_chunk, start, end) for start, end in chunks]
+        for done, fut in enumerate(as_completed(futures), start=1):
+            start, end, days, seconds = fut.result()
+            total_days += days
+            if on_chunk:
+                on_chunk(start, end, days, seconds, done, len(chunks))
+    return total_days
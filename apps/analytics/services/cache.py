@@ -0,0 +1,95 @@
+"""Caché versionada de resultados de analytics.
+
+Cada día tiene una versión (timestamp en ns) y la clave de un resultado incluye las versiones
+de todos los días de su rango: una escritura solo invalida los rangos que contienen su fecha.
+Con la caché local-memory la invalidación es por proceso; en producción usar ``CACHE_URL``.
+"""
+import hashlib
+import json
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_PREFIX = 'analytics:v:'
+RESULT_PREFIX = 'analytics:r:'
+STATS_KEYS = ('hits', 'misses', 'not_modified')
+# Cada día del rango es una clave de versión permanente: rangos mayores se rechazan
+MAX_RANGE_DAYS = 731
+
+CachedResult = namedtuple('CachedResult', ['key', 'etag', 'last_modified'])
+
+
+def _version_key(d: date):
+    return f'{VERSION_PREFIX}{d.isoformat()}'
+
+
+def _ttl():
+    return int(getattr(settings, 'ANALYTICS_CACHE_TTL', 300))
+
+
+def date_versions(from_dt: date, to_dt: date):
+    if (to_dt - from_dt).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'Range too long, max {MAX_RANGE_DAYS} days')
+    keys = [_version_key(from_dt + timedelta(days=i)) for i in range((to_dt - from_dt).days + 1)]
+    found = cache.get_many(keys)
+    missing = {k: time.time_ns() for k in keys if k not in found}
+    if missing:
+        for k, v in missing.items():
+            # add() respeta una versión escrita en paralelo por otro proceso
+            if not cache.add(k, v, None):
+                missing[k] = cache.get(k, v)
+        found.update(missing)
+    return [found[k] for k in keys]
+
+
+def bump_dates(dates):
+    """Invalida todos los resultados cuyo rango incluya alguna de ``dates``."""
+    now = time.time_ns()
+    cache.set_many({_version_key(d): now for d in set(dates)}, None)
+
+
+def resolve(namespace: str, params: dict, from_dt: date, to_dt: date) -> CachedResult:
+    versions = date_versions(from_dt, to_dt)
+    raw = json.dumps([namespace, params, from_dt.isoformat(), to_dt.isoformat(), versions], sort_keys=True, default=str)
+    digest = hashlib.sha1(raw.encode()).hexdigest()
+    return CachedResult(
+        key=f'{RESULT_PREFIX}{namespace}:{digest}',
+        etag=f'"{digest}"',
+        last_modified=max(versions) // 1_000_000_000,
+    )
+
+
+def _count(stat: str):
+    key = f'analytics:stats:{stat}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_or_compute(entry: CachedResult, compute):
+    data = cache.get(entry.key)
+    if data is not None:
+        _count('hits')
+        return data
+    _count('misses')
+    data = compute()
+    cache.set(entry.key, data, _ttl())
+    return data
+
+
+def record_not_modified():
+    _count('not_modified')
+
+
+def stats():
+    values = cache.get_many([f'analytics:stats:{s}' for s in STATS_KEYS])
+    out = {s: int(values.get(f'analytics:stats:{s}', 0)) for s in STATS_KEYS}
+    # Un 304 también es un acierto: no se ha tocado la base de datos
+    served = out['hits'] + out['not_modified']
+    total = served + out['misses']
+    out['hit_ratio'] = round(served / total, 4) if total else 0.0
+    return out
@@ -0,0 +1,192 @@
+from datetime import date, timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+from apps.billing.models import Purchase, ConsumptionEvent
+from ..models import CohortFact
+from .timeseries import day_bounds
+
+
+def _ttl():
+    return int(getattr(settings, 'ANALYTICS_COHORTS_TTL', 3600))
+
+
+def month_number(d: date) -> int:
+    return d.year * 12 + d.month - 1
+
+
+def month_date(n: int) -> date:
+    return date(int(n) // 12, int(n) % 12 + 1, 1)
+
+
+def _user_month_rows(qs, user_field, value_field):
+    """(user_id, mes absoluto, valor) por usuario y mes como arrays NumPy."""
+    rows = list(
+        qs.order_by()
+        .values_list(user_field, ExtractYear('created_at'), ExtractMonth('created_at'))
+        .annotate(v=Sum(value_field))
+    )
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    arr = np.array(rows, dtype=np.float64)
+    users = arr[:, 0].astype(np.int64)
+    months = (arr[:, 1] * 12 + arr[:, 2] - 1).astype(np.int64)
+    return users, months, arr[:, 3]
+
+
+def load_cohort_inputs(start_month: int, n_months: int):
+    """Carga los datos del motor de cohortes con dos consultas agrupadas.
+
+    Las compras pagadas se leen completas (por usuario y mes) porque la cohorte es el mes de la
+    primera compra; el consumo solo dentro de la ventana.
+    """
+    p_users, p_months, p_revenue = _user_month_rows(
+        Purchase.objects.filter(status=Purchase.STATUS_PAID), 'user_id', 'amount_usd',
+    )
+    start, end = day_bounds(month_date(start_month), month_date(start_month + n_months) - timedelta(days=1))
+    c_users, c_months, c_credits = _user_month_rows(
+        ConsumptionEvent.objects.filter(created_at__gte=start, created_at__lt=end),
+        'wallet__user_id', 'credits_spent',
+    )
+    # Índices densos de usuario compartidos por ambas fuentes
+    user_ids, inverse = np.unique(np.concatenate([p_users, c_users]), return_inverse=True)
+    p_idx, c_idx = inverse[:len(p_users)], inverse[len(p_users):]
+    first_month = np.full(len(user_ids), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first_month, p_idx, p_months)
+    return {
+        'first_month': first_month,
+        'user': np.concatenate([p_idx, c_idx]),
+        'month': np.concatenate([p_months, c_months]),
+        'revenue': np.concatenate([p_revenue, np.zeros(len(c_idx))]),
+        'credits': np.concatenate([np.zeros(len(p_idx)), c_credits]),
+    }
+
+
+def cohort_matrices(first_month, user, month, revenue, credits, start_month: int, n_months: int):
+    """Matrices cohorte x periodo (n_months x n_months) con operaciones vectorizadas.
+
+    ``first_month`` es el mes absoluto de la primera compra por índice de usuario; ``user``,
+    ``month``, ``revenue`` y ``credits`` describen filas de actividad (usuario, mes). Las celdas
+    de periodos aún no transcurridos quedan en NaN.
+    """
+    n = n_months
+    cohort = first_month - start_month
+    in_window = (cohort >= 0) & (cohort < n)
+    sizes = np.bincount(cohort[in_window], minlength=n).astype(np.int64)
+
+    row_cohort = cohort[user]
+    period = month - first_month[user]
+    valid = (row_cohort >= 0) & (row_cohort < n) & (period >= 0) & (row_cohort + period < n)
+    # Índice plano cohorte * n + periodo: bincount con pesos es mucho más rápido que np.add.at
+    cell = row_cohort[valid] * n + period[valid]
+    revenue_m = np.bincount(cell, weights=revenue[valid], minlength=n * n).reshape(n, n)
+    credits_m = np.bincount(cell, weights=credits[valid], minlength=n * n).reshape(n, n)
+
+    # Un usuario cuenta una vez por mes aunque tenga compra y consumo
+    keys = np.sort(user[valid] * (n * n) + cell)
+    active_keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))] if len(keys) else keys
+    active_m = np.bincount(active_keys % (n * n), minlength=n * n).reshape(n, n)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retention = np.where(sizes[:, None] > 0, active_m * 100.0 / sizes[:, None], 0.0)
+    future = np.add.outer(np.arange(n), np.arange(n)) >= n
+    for m in (retention, revenue_m, credits_m):
+        m[future] = np.nan
+    active_f = active_m.astype(np.float64)
+    active_f[future] = np.nan
+    return {
+        'sizes': sizes,
+        'active': active_f,
+        'retention': retention,
+        'revenue': revenue_m,
+        'credit_burn': credits_m,
+    }
+
+
+def compute_cohorts(start_month: int, n_months: int):
+    data = load_cohort_inputs(start_month, n_months)
+    return cohort_matrices(
+        data['first_month'], data['user'], data['month'], data['revenue'], data['credits'], start_month, n_months,
+    )
+
+
+def build_cohorts(start_month: int, n_months: int):
+    """Calcula y persiste las cohortes de la ventana en ``CohortFact`` (un bulk upsert)."""
+    m = compute_cohorts(start_month, n_months)
+    built_at = timezone.now()
+    objs = []
+    for c in range(n_months):
+        for k in range(n_months - c):
+            objs.append(CohortFact(
+                cohort_month=month_date(start_month + c),
+                period=k,
+                cohort_size=int(m['sizes'][c]),
+                active_users=int(m['active'][c, k]),
+                retention_rate=round(float(m['retention'][c, k]), 2),
+                revenue=round(float(m['revenue'][c, k]), 2),
+                credits_consumed=int(m['credit_burn'][c, k]),
+                built_at=built_at,
+            ))
+    CohortFact.objects.bulk_create(
+        objs, batch_size=500, update_conflicts=True, unique_fields=['cohort_month', 'period'],
+        update_fields=['cohort_size', 'active_users', 'retention_rate', 'revenue', 'credits_consumed', 'built_at'],
+    )
+    return m
+
+
+def read_cohorts(start_month: int, n_months: int, now=None):
+    """Matrices de la ventana desde ``CohortFact``; None si falta o está desfasada alguna celda.
+
+    Una celda construida con su mes aún abierto (el mes de actividad, cohorte + periodo) caduca a
+    los ``ANALYTICS_COHORTS_TTL`` segundos; construida tras cerrarse el mes ya no cambia.
+    """
+    now = now or timezone.now()
+    fresh_after = now - timedelta(seconds=_ttl())
+    rows = CohortFact.objects.filter(
+        cohort_month__gte=month_date(start_month), cohort_month__lte=month_date(start_month + n_months - 1),
+        period__lt=n_months,
+    ).values_list('cohort_month', 'period', 'cohort_size', 'active_users', 'retention_rate', 'revenue', 'credits_consumed', 'built_at')
+    closes_at = {}
+    n = n_months
+    out = {k: np.full((n, n), np.nan) for k in ('active', 'retention', 'revenue', 'credit_burn')}
+    sizes = np.zeros(n, dtype=np.int64)
+    filled = 0
+    for cohort_month, k, size, active, retention, revenue, credits, built_at in rows:
+        c = month_number(cohort_month) - start_month
+        if c + k >= n:
+            # Celda de una ventana construida con más meses por delante
+            continue
+        month = start_month + c + k
+        if month not in closes_at:
+            closes_at[month] = day_bounds(month_date(month + 1), month_date(month + 1))[0]
+        if built_at is None or (built_at < closes_at[month] and built_at < fresh_after):
+            return None
+        sizes[c] = size
+        out['active'][c, k] = active
+        out['retention'][c, k] = float(retention)
+        out['revenue'][c, k] = float(revenue)
+        out['credit_burn'][c, k] = credits
+        filled += 1
+    if filled != n * (n + 1) // 2:
+        return None
+    out['sizes'] = sizes
+    return out
+
+
+def default_start(n_months: int, today=None) -> int:
+    """Primer mes de la ventana de ``n_months`` que termina en el mes actual."""
+    return month_number(today or timezone.localdate()) - n_months + 1
+
+
+def matrices_payload(m, start_month: int, n_months: int):
+    def rows(a):
+        return [[None if np.isnan(v) else round(float(v), 2) for v in r] for r in a]
+    return {
+        'cohorts': [month_date(start_month + c).strftime('%Y-%m') for c in range(n_months)],
+        'sizes': [int(s) for s in m['sizes']],
+        'retention': rows(m['retention']),
+        'revenue': rows(m['revenue']),
+        'credit_burn': rows(m['credit_burn']),
+    }
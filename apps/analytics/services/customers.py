@@ -0,0 +1,122 @@
+import base64
+import json
+from decimal import Decimal
+from django.db.models import Count, F, FloatField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+from django.contrib.auth import get_user_model
+from apps.billing.models import Purchase, ConsumptionEvent
+from .timeseries import day_bounds
+
+User = get_user_model()
+
+RANKINGS = ('revenue', 'credits_consumed', 'purchase_count', 'refund_ratio')
+
+PAID = Q(status=Purchase.STATUS_PAID)
+REFUNDED = Q(status=Purchase.STATUS_REFUNDED)
+
+
+def _purchase_metrics():
+    return {
+        'revenue': Sum('amount_usd', filter=PAID),
+        'purchase_count': Count('id', filter=PAID),
+        'refund_ratio': Cast(Count('id', filter=REFUNDED), FloatField()) / Cast(Count('id'), FloatField()),
+    }
+
+
+def _range(prefix: str, from_dt, to_dt):
+    if not (from_dt and to_dt):
+        return {}
+    start, end = day_bounds(from_dt, to_dt)
+    return {f'{prefix}created_at__gte': start, f'{prefix}created_at__lt': end}
+
+
+def _purchases(from_dt, to_dt):
+    return Purchase.objects.filter(PAID | REFUNDED, **_range('', from_dt, to_dt)).order_by()
+
+
+def _consumed_subquery(from_dt, to_dt):
+    sq = (
+        ConsumptionEvent.objects.filter(wallet__user_id=OuterRef('pk'), **_range('', from_dt, to_dt))
+        .order_by()
+        .values('wallet__user_id')
+        .annotate(t=Sum('credits_spent'))
+        .values('t')[:1]
+    )
+    return Coalesce(Subquery(sq), Value(0))
+
+
+def _purchase_subquery(metric: str, from_dt, to_dt):
+    sq = (
+        _purchases(from_dt, to_dt).filter(user_id=OuterRef('pk'))
+        .values('user_id')
+        .annotate(v=_purchase_metrics()[metric])
+        .values('v')[:1]
+    )
+    return Subquery(sq)
+
+
+def encode_cursor(row, order_by):
+    value = row[order_by]
+    raw = json.dumps([str(value) if isinstance(value, Decimal) else value, row['uid']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str, order_by: str):
+    try:
+        value, uid = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (Decimal(value) if order_by == 'revenue' else value), int(uid)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def _ranked_ids(order_by: str, from_dt, to_dt, cursor, limit):
+    """Ids de la página pedida (limit + 1 para saber si hay más), agregando solo la fuente del ranking."""
+    if order_by == 'credits_consumed':
+        qs = (
+            ConsumptionEvent.objects.filter(**_range('', from_dt, to_dt))
+            .order_by()
+            .values(uid=F('wallet__user_id'))
+            .annotate(credits_consumed=Sum('credits_spent'))
+        )
+    else:
+        qs = _purchases(from_dt, to_dt).values(uid=F('user_id')).annotate(**_purchase_metrics())
+        if order_by in ('revenue', 'purchase_count'):
+            # Clientes con solo reembolsos no compiten en rankings de ingresos
+            qs = qs.filter(purchase_count__gt=0)
+    if cursor:
+        value, uid = decode_cursor(cursor, order_by)
+        qs = qs.filter(Q(**{f'{order_by}__lt': value}) | Q(**{order_by: value, 'uid__gt': uid}))
+    return qs.order_by(F(order_by).desc(), 'uid').values('uid')[:limit + 1]
+
+
+def top_customers_page(limit=10, from_dt=None, to_dt=None, order_by='revenue', cursor=None):
+    """Top clientes en una sola consulta, ordenados por ``order_by`` desc y user_id asc.
+
+    La paginación es por keyset: ``cursor`` codifica (valor, user_id) de la última fila de la
+    página anterior. Devuelve (filas, next_cursor) con next_cursor None en la última página.
+    """
+    if order_by not in RANKINGS:
+        raise ValueError(f'Unknown ranking: {order_by}')
+    # Una sola sentencia: el ranking va en un IN (subconsulta con LIMIT) y las métricas del resto
+    # de fuentes son subconsultas correlacionadas que solo se evalúan para esos usuarios.
+    ids = _ranked_ids(order_by, from_dt, to_dt, cursor, limit)
+    annotations = {m: _purchase_subquery(m, from_dt, to_dt) for m in ('revenue', 'purchase_count', 'refund_ratio')}
+    annotations['credits_consumed'] = _consumed_subquery(from_dt, to_dt)
+    rows = list(
+        User.objects.filter(pk__in=Subquery(ids))
+        .annotate(uid=F('pk'), **annotations)
+        .order_by(F(order_by).desc(nulls_last=True), 'pk')
+        .values('uid', 'username', *annotations)
+    )
+    next_cursor = encode_cursor(rows[limit - 1], order_by) if len(rows) > limit else None
+    return [
+        {
+            'user_id': r['uid'],
+            'username': r['username'],
+            'revenue': float(r['revenue'] or 0),
+            'credits_consumed': int(r['credits_consumed'] or 0),
+            'purchase_count': int(r['purchase_count'] or 0),
+            'refund_ratio': round(float(r['refund_ratio'] or 0), 4),
+        }
+        for r in rows[:limit]
+    ], next_cursor
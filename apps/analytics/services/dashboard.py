@@ -0,0 +1,111 @@
+"""Bundle del dashboard: los paneles son lecturas independientes y se lanzan en paralelo.
+
+Los paneles corren en un pool de hilos que vive lo que el proceso. Cada hilo conserva su
+conexión (las conexiones de Django son por hilo) entre peticiones, igual que los hilos de
+petición con ``CONN_MAX_AGE``: ``close_old_connections`` solo cierra las caducadas o rotas, así
+que cargar el dashboard no abre conexiones nuevas. La latencia total pasa a ser la del panel
+más lento en vez de la suma de todos.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections
+from apps.billing.models import Purchase
+from . import cache as analytics_cache
+
+PANELS = ('summary', 'breakdown', 'payments', 'top_customers', 'dunning')
+
+
+def _purchase_rows(qs, date_field: str, limit: int):
+    # Solo las columnas que pintan las tablas: sin select_related del usuario completo
+    rows = qs.order_by(f'-{date_field}').values('id', date_field, 'user__username', 'amount_usd', 'status')[:limit]
+    return [
+        {
+            'id': r['id'],
+            date_field: r[date_field],
+            'user': r['user__username'],
+            'amount_usd': float(r['amount_usd'] or 0),
+            'status': r['status'],
+        }
+        for r in rows
+    ]
+
+
+def _summary(from_dt, to_dt):
+    from ..selectors import kpis_summary
+    return analytics_cache.get_or_compute(
+        analytics_cache.resolve('summary_raw', {}, from_dt, to_dt), lambda: kpis_summary(from_dt, to_dt))
+
+
+def _breakdown(from_dt, to_dt):
+    from ..selectors import services_breakdown
+    return analytics_cache.get_or_compute(
+        analytics_cache.resolve('breakdown', {}, from_dt, to_dt), lambda: services_breakdown(from_dt, to_dt))
+
+
+def _top_customers(from_dt, to_dt):
+    from ..selectors import top_customers
+    return analytics_cache.get_or_compute(
+        analytics_cache.resolve('top_customers_dashboard', {'limit': 10}, from_dt, to_dt),
+        lambda: {'results': top_customers(limit=10, from_dt=from_dt, to_dt=to_dt)})['results']
+
+
+def _payments(from_dt, to_dt):
+    return _purchase_rows(Purchase.objects.all(), 'created_at', 20)
+
+
+def _dunning(from_dt, to_dt):
+    return _purchase_rows(Purchase.objects.filter(status=Purchase.STATUS_PAST_DUE), 'updated_at', 10)
+
+
+LOADERS = {
+    'summary': _summary,
+    'breakdown': _breakdown,
+    'payments': _payments,
+    'top_customers': _top_customers,
+    'dunning': _dunning,
+}
+
+
+def _run_panel(name, from_dt, to_dt):
+    close_old_connections()
+    try:
+        return LOADERS[name](from_dt, to_dt)
+    finally:
+        close_old_connections()
+
+
+def _workers():
+    return int(getattr(settings, 'ANALYTICS_DASHBOARD_WORKERS', len(PANELS)))
+
+
+_pool = {'executor': None, 'size': 0}
+_pool_lock = threading.Lock()
+
+
+def _executor(workers: int) -> ThreadPoolExecutor:
+    """Pool compartido del proceso; se recrea solo si cambia el número de hilos."""
+    with _pool_lock:
+        if _pool['executor'] is None or _pool['size'] != workers:
+            if _pool['executor'] is not None:
+                _pool['executor'].shutdown(wait=False)
+            _pool['executor'] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analytics-dashboard')
+            _pool['size'] = workers
+        return _pool['executor']
+
+
+def dashboard_bundle(from_dt, to_dt, panels=None):
+    """Datos de todos los paneles del dashboard en un dict {panel: datos}.
+
+    Con ``ANALYTICS_DASHBOARD_WORKERS`` <= 1 se ejecuta en serie sobre la conexión actual.
+    """
+    panels = list(panels or PANELS)
+    unknown = set(panels) - set(PANELS)
+    if unknown:
+        raise ValueError(f'Unknown panel: {sorted(unknown)[0]}')
+    workers = min(_workers(), len(panels))
+    if workers <= 1:
+        return {name: LOADERS[name](from_dt, to_dt) for name in panels}
+    pool = _executor(_workers())
+    futures = {name: pool.submit(_run_panel, name, from_dt, to_dt) for name in panels}
+    return {name: f.result() for name, f in futures.items()}
@@ -0,0 +1,112 @@
+from datetime import date, datetime, timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from apps.billing.models import Purchase, CreditTransaction, ConsumptionEvent
+from apps.dispatch.models import Dispatch
+from apps.loads.models import Load
+from ..models import FactWatermark
+from .aggregates import build_revenue_days, build_credits_days, build_loads_days, build_risk_days
+
+# Por tabla de hechos: fuentes (modelo, campo de cambio, campo de día) y el builder que recalcula
+# días concretos. Un campo de cambio None indica una fuente sin timestamp de modificación: solo
+# cuenta para el bootstrap y se cubre con una ventana móvil de ``window_days`` días hasta hoy.
+# ``levels``: el fact guarda niveles (MRR, suscripciones activas) que existen aunque ese día no
+# cambie ninguna fila, así que se rehacen siempre todos los días desde el mark anterior hasta hoy.
+FACT_SOURCES = {
+    'revenue': {
+        # updated_at también como día: un cambio de estado da de baja la suscripción ese día (MRR)
+        'sources': [(Purchase, 'updated_at', 'created_at'), (Purchase, 'updated_at', 'updated_at')],
+        'levels': True,
+        'builder': build_revenue_days,
+    },
+    'credits': {
+        'sources': [(CreditTransaction, 'created_at', 'created_at'), (ConsumptionEvent, 'created_at', 'created_at')],
+        'builder': build_credits_days,
+    },
+    'loads': {
+        'sources': [(Dispatch, 'assigned_at', 'assigned_at'), (Load, None, 'pickup_date')],
+        'window_days': 14,
+        'builder': build_loads_days,
+    },
+    'risk': {
+        # Snapshot de brokers: siempre se rehace el día de hoy
+        'sources': [],
+        'window_days': 1,
+        'builder': build_risk_days,
+    },
+}
+
+
+def _overlap():
+    # Margen para no perder filas de transacciones que confirman con un timestamp anterior al mark
+    return timedelta(seconds=int(getattr(settings, 'ANALYTICS_WATERMARK_OVERLAP_SECONDS', 300)))
+
+
+def _as_local_date(value):
+    return timezone.localtime(value).date() if isinstance(value, datetime) else value
+
+
+def _days_until(first: date, until):
+    last = _as_local_date(until)
+    return {first + timedelta(days=i) for i in range((last - first).days + 1)}
+
+
+def dirty_days(fact: str, since, until):
+    """Días tocados por filas nuevas o modificadas en (since, until]."""
+    days = set()
+    for model, change_field, day_field in FACT_SOURCES[fact]['sources']:
+        if change_field is None:
+            continue
+        qs = model.objects.filter(**{f'{change_field}__lte': until})
+        if since is not None:
+            qs = qs.filter(**{f'{change_field}__gt': since})
+        days.update(
+            qs.annotate(day=TruncDate(day_field)).order_by().values_list('day', flat=True).distinct()
+        )
+    if FACT_SOURCES[fact].get('levels') and since is not None:
+        days |= _days_until(_as_local_date(since), until)
+    window = FACT_SOURCES[fact].get('window_days')
+    if window:
+        days |= _days_until(_as_local_date(until) - timedelta(days=window - 1), until)
+    return days
+
+
+def _bootstrap_days(fact: str, until):
+    # Sin watermark previo: reconstruir desde la fila más antigua hasta hoy
+    firsts = [
+        model.objects.aggregate(first=Min(day_field))['first']
+        for model, _, day_field in FACT_SOURCES[fact]['sources']
+    ]
+    firsts = [_as_local_date(f) for f in firsts if f is not None]
+    days = _days_until(min(firsts), until) if firsts else set()
+    # Los facts sin fuentes con historial (riesgo) también necesitan su ventana en el bootstrap
+    return days | dirty_days(fact, until, until)
+
+
+def build_fact_incremental(fact: str, now=None):
+    """Recalcula solo los días afectados desde el último mark de ``fact`` y avanza el mark.
+
+    Devuelve el número de días reconstruidos. Los borrados físicos de filas fuente no se
+    detectan; para eso sigue existiendo el rebuild por rango (``build_range``).
+    """
+    now = now or timezone.now()
+    with transaction.atomic():
+        mark, _ = FactWatermark.objects.select_for_update().get_or_create(fact=fact)
+        if mark.high_water_mark is None:
+            days = _bootstrap_days(fact, now)
+        else:
+            days = dirty_days(fact, mark.high_water_mark - _overlap(), now)
+        built = FACT_SOURCES[fact]['builder'](days)
+        mark.high_water_mark = now
+        mark.last_run_at = timezone.now()
+        mark.days_rebuilt = built
+        mark.save(update_fields=['high_water_mark', 'last_run_at', 'days_rebuilt'])
+    return built
+
+
+def build_incremental(facts=None, now=None):
+    now = now or timezone.now()
+    return {fact: build_fact_incremental(fact, now=now) for fact in (facts or FACT_SOURCES)}
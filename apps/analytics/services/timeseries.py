@@ -0,0 +1,107 @@
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+from django.db.models import DateField, F, Max, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from apps.billing.models import Purchase, ConsumptionEvent
+from ..models import DailyLoadsFact, DailyRevenueFact, DailyRiskFact
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+# queryset: callable que devuelve el queryset base
+# field: campo temporal (DateTimeField o DateField) sobre el que se agrupa
+# aggregate: expresión de agregación por bucket
+# cast: conversión del valor agregado para la respuesta JSON
+Metric = namedtuple('Metric', ['queryset', 'field', 'aggregate', 'cast'])
+
+METRICS = {
+    'revenue': Metric(lambda: Purchase.objects.filter(status=Purchase.STATUS_PAID), 'created_at', Sum('amount_usd'), float),
+    'credits': Metric(lambda: ConsumptionEvent.objects.all(), 'created_at', Sum('credits_spent'), int),
+    'loads': Metric(lambda: DailyLoadsFact.objects.all(), 'date', Sum('loads_created'), int),
+    # El riesgo es un snapshot diario: en semanas/meses se reporta el pico, no la suma
+    'risk': Metric(lambda: DailyRiskFact.objects.all(), 'date', Max('high_risk_count'), int),
+    # Igual que el riesgo, MRR y suscripciones activas son niveles, no flujos
+    'mrr': Metric(lambda: DailyRevenueFact.objects.all(), 'date', Max('mrr'), float),
+    'active_subscriptions': Metric(lambda: DailyRevenueFact.objects.all(), 'date', Max('active_subscriptions'), int),
+}
+
+
+def day_bounds(from_dt: date, to_dt: date):
+    """Rango semiabierto [from 00:00, to+1 00:00) en la zona horaria actual.
+
+    A diferencia de ``created_at__date__gte`` permite usar un índice plano sobre el timestamp.
+    """
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(from_dt, time.min), tz)
+    end = timezone.make_aware(datetime.combine(to_dt + timedelta(days=1), time.min), tz)
+    return start, end
+
+
+def bucket_start(d: date, granularity: str) -> date:
+    if granularity == 'week':
+        return d - timedelta(days=d.weekday())
+    if granularity == 'month':
+        return d.replace(day=1)
+    return d
+
+
+def iter_buckets(from_dt: date, to_dt: date, granularity: str):
+    cur = bucket_start(from_dt, granularity)
+    while cur <= to_dt:
+        yield cur
+        if granularity == 'week':
+            cur += timedelta(days=7)
+        elif granularity == 'month':
+            cur = (cur.replace(day=28) + timedelta(days=4)).replace(day=1)
+        else:
+            cur += timedelta(days=1)
+
+
+def _trunc(field: str, granularity: str):
+    if granularity == 'week':
+        return TruncWeek(field, output_field=DateField())
+    if granularity == 'month':
+        return TruncMonth(field, output_field=DateField())
+    if field == 'date':
+        # Los facts ya son diarios: TruncDate sobre un DateField falla en SQLite
+        return F(field)
+    return TruncDate(field)
+
+
+def _range_filter(metric: Metric, from_dt: date, to_dt: date):
+    if metric.field == 'date':
+        return {'date__gte': from_dt, 'date__lte': to_dt}
+    start, end = day_bounds(from_dt, to_dt)
+    return {f'{metric.field}__gte': start, f'{metric.field}__lt': end}
+
+
+def _as_date(value):
+    # sqlite puede devolver datetime al truncar semanas/meses
+    return value.date() if isinstance(value, datetime) else value
+
+
+def grouped_series(metric_name: str, from_dt: date, to_dt: date, granularity: str = 'day'):
+    """Serie temporal de ``metric_name`` con una sola consulta agrupada y huecos rellenados a 0."""
+    if metric_name not in METRICS:
+        raise ValueError(f'Unknown metric: {metric_name}')
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Unknown granularity: {granularity}')
+    if from_dt > to_dt:
+        raise ValueError('from must be <= to')
+    metric = METRICS[metric_name]
+    rows = (
+        metric.queryset()
+        .filter(**_range_filter(metric, from_dt, to_dt))
+        .annotate(bucket=_trunc(metric.field, granularity))
+        .order_by()
+        .values('bucket')
+        .annotate(value=metric.aggregate)
+        .values_list('bucket', 'value')
+    )
+    values = {_as_date(bucket): value for bucket, value in rows}
+    zero = metric.cast(0)
+    return [
+        {'date': b.isoformat(), 'value': metric.cast(values[b]) if values.get(b) is not None else zero}
+        for b in iter_buckets(from_dt, to_dt, granularity)
+    ]
@@ -0,0 +1,11 @@
+from django.utils import timezone
+from .services.cache import bump_dates
+
+
+def invalidate_analytics_for_instance(sender, instance, **kwargs):
+    # Los facts y las consultas en vivo agrupan por el día de created_at; en compras el cambio de
+    # estado (updated_at) también mueve el MRR de ese día
+    stamps = [getattr(instance, f, None) for f in ('created_at', 'updated_at')]
+    dates = [timezone.localtime(s).date() for s in stamps if s is not None]
+    if dates:
+        bump_dates(dates)
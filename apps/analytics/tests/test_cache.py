@@ -0,0 +1,47 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.billing.models import Purchase
+
+
+class AnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='cache-admin', password='pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('analytics:api_summary')
+
+    def test_etag_roundtrip_and_write_invalidation(self):
+        res = self.client.get(self.url, {'range': '7d'})
+        self.assertEqual(res.status_code, 200)
+        etag = res['ETag']
+        self.assertTrue(res.has_header('Last-Modified'))
+
+        with self.assertNumQueries(0):
+            res = self.client.get(self.url, {'range': '7d'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        # Una compra de hoy bumpea la versión del día y cambia el ETag
+        Purchase.objects.create(user=self.admin, amount_usd=12, status=Purchase.STATUS_PAID)
+        res = self.client.get(self.url, {'range': '7d'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res.json()['revenue']['total'], 12.0)
+
+    def test_stats_endpoint(self):
+        self.client.get(self.url)
+        self.client.get(self.url)
+        res = self.client.get(reverse('analytics:api_cache_stats'))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['hits'], 1)
+        self.assertEqual(res.json()['misses'], 1)
+        self.assertEqual(res.json()['hit_ratio'], 0.5)
+
+    def test_huge_range_is_rejected_before_touching_the_cache(self):
+        res = self.client.get(self.url, {'from': '0001-01-01', 'to': '2025-01-01'})
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(len(cache._cache), 0)
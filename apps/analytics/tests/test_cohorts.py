@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+import numpy as np
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.billing.models import Purchase, ConsumptionEvent, ServiceType
+from apps.billing.selectors import get_wallet_for_user
+from apps.analytics.models import CohortFact
+from apps.analytics.services.cohorts import build_cohorts, cohort_matrices, compute_cohorts, month_number, read_cohorts
+
+
+def _at(year, month):
+    return datetime(year, month, 15, 12, tzinfo=dt_timezone.utc)
+
+
+class CohortMatricesTests(TestCase):
+    def test_vectorised_matrices(self):
+        # usuario 0: cohorte 0, activo en 0 y 2 (dos filas en 0); usuario 1: cohorte 1; usuario 2: nunca compró
+        first = np.array([0, 1, np.iinfo(np.int64).max])
+        user = np.array([0, 0, 0, 1, 2])
+        month = np.array([0, 0, 2, 1, 1])
+        revenue = np.array([10.0, 0.0, 5.0, 20.0, 0.0])
+        credits = np.array([0.0, 3.0, 1.0, 0.0, 7.0])
+        m = cohort_matrices(first, user, month, revenue, credits, start_month=0, n_months=3)
+        self.assertEqual(m['sizes'].tolist(), [1, 1, 0])
+        self.assertEqual(m['retention'][0].tolist(), [100.0, 0.0, 100.0])
+        self.assertEqual(m['revenue'][0, 0], 10.0)
+        self.assertEqual(m['credit_burn'][0, 0], 3.0)
+        self.assertEqual(m['revenue'][1, 0], 20.0)
+        # periodos futuros de la última cohorte
+        self.assertTrue(np.isnan(m['retention'][1, 2]))
+        self.assertTrue(np.isnan(m['retention'][2, 1]))
+
+
+class CohortQueriesTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        exam = ServiceType.objects.create(code='exam', label='Exam')
+        self.a = User.objects.create_user(username='a', password='pass', is_staff=True)
+        b = User.objects.create_user(username='b', password='pass')
+        for user, when, amount in [(self.a, _at(2025, 1), 10), (self.a, _at(2025, 3), 15), (b, _at(2025, 2), 30)]:
+            p = Purchase.objects.create(user=user, amount_usd=amount, status=Purchase.STATUS_PAID)
+            Purchase.objects.filter(pk=p.pk).update(created_at=when)
+        ev = ConsumptionEvent.objects.create(wallet=get_wallet_for_user(b), service_type=exam, credits_spent=4)
+        ConsumptionEvent.objects.filter(pk=ev.pk).update(created_at=_at(2025, 3))
+        self.start = month_number(_at(2025, 1).date())
+
+    def test_two_queries(self):
+        with self.assertNumQueries(2):
+            m = compute_cohorts(self.start, 3)
+        self.assertEqual(m['sizes'].tolist(), [1, 1, 0])
+        self.assertEqual(m['retention'][0].tolist(), [100.0, 0.0, 100.0])
+        self.assertEqual(m['revenue'][0, 2], 15.0)
+        self.assertEqual(m['retention'][1, 1], 100.0)
+        self.assertEqual(m['credit_burn'][1, 1], 4.0)
+
+    def test_api_persists_and_reads_facts(self):
+        client = APIClient()
+        client.force_authenticate(self.a)
+        url = reverse('analytics:api_cohorts')
+        res = client.get(url, {'from': '2025-01', 'months': 3})
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual(body['cohorts'], ['2025-01', '2025-02', '2025-03'])
+        self.assertEqual(body['retention'][0], [100.0, 0.0, 100.0])
+        self.assertIsNone(body['revenue'][2][1])
+        self.assertEqual(CohortFact.objects.count(), 6)
+        with self.assertNumQueries(1):
+            again = client.get(url, {'from': '2025-01', 'months': 3}).json()
+        self.assertEqual(again, body)
+        self.assertEqual(client.get(url, {'from': '2025/01'}).status_code, 400)
+
+    def test_open_month_cells_expire(self):
+        build_cohorts(self.start, 3)
+        # Construidas hoy, con marzo de 2025 ya cerrado: no caducan
+        self.assertIsNotNone(read_cohorts(self.start, 3, now=datetime.now(dt_timezone.utc) + timedelta(days=365)))
+        # Construidas a mitad de marzo: las celdas de marzo caducan pasado el TTL
+        CohortFact.objects.update(built_at=_at(2025, 3))
+        self.assertIsNotNone(read_cohorts(self.start, 3, now=_at(2025, 3) + timedelta(minutes=5)))
+        self.assertIsNone(read_cohorts(self.start, 3, now=_at(2025, 3) + timedelta(hours=2)))
+        # Las celdas de meses ya cerrados al construirse siguen valiendo
+        self.assertIsNotNone(read_cohorts(self.start, 2, now=_at(2025, 4)))
@@ -0,0 +1,63 @@
+from unittest import mock
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.billing.models import Purchase
+from apps.analytics.services import dashboard
+from apps.analytics.services.dashboard import PANELS, dashboard_bundle
+
+
+class DashboardBundleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = get_user_model().objects.create_user(username='boss', password='pass', is_staff=True)
+        Purchase.objects.create(user=self.admin, amount_usd=12, status=Purchase.STATUS_PAID)
+        Purchase.objects.create(user=self.admin, amount_usd=5, status=Purchase.STATUS_PAST_DUE)
+
+    def test_bundle_has_every_panel(self):
+        today = timezone.localdate()
+        data = dashboard_bundle(today, today)
+        self.assertEqual(set(data), set(PANELS))
+        self.assertEqual(data['summary']['revenue'], 12.0)
+        self.assertEqual([p['amount_usd'] for p in data['payments']], [5.0, 12.0])
+        self.assertEqual(data['dunning'][0]['user'], 'boss')
+
+    def test_api_subset_and_errors(self):
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        url = reverse('analytics:api_dashboard')
+        res = client.get(url, {'panels': 'summary,dunning'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(set(res.json()) - {'from', 'to'}, {'summary', 'dunning'})
+        self.assertEqual(client.get(url, {'panels': 'nope'}).status_code, 400)
+
+    def test_page_renders_the_shell_without_loading_panels(self):
+        self.client.force_login(self.admin)
+        with mock.patch('apps.analytics.views.dashboard_bundle') as bundle, \
+                mock.patch('apps.analytics.views.render', return_value=HttpResponse()) as render:
+            self.client.get(reverse('analytics:dashboard'), {'range': '30d'})
+        bundle.assert_not_called()
+        self.assertEqual(render.call_args.args[2]['range'], '30d')
+
+
+@override_settings(ANALYTICS_DASHBOARD_WORKERS=5)
+class DashboardBundleConcurrentTests(TransactionTestCase):
+    def test_thread_pool_matches_serial(self):
+        cache.clear()
+        user = get_user_model().objects.create_user(username='thr', password='pass')
+        Purchase.objects.create(user=user, amount_usd=7, status=Purchase.STATUS_PAID)
+        today = timezone.localdate()
+        parallel = dashboard_bundle(today, today)
+        cache.clear()
+        with override_settings(ANALYTICS_DASHBOARD_WORKERS=1):
+            serial = dashboard_bundle(today, today)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel['payments'][0]['user'], 'thr')
+        # El pool se reutiliza entre llamadas
+        pool = dashboard._executor(5)
+        dashboard_bundle(today, today)
+        self.assertIs(dashboard._executor(5), pool)
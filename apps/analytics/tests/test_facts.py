@@ -0,0 +1,146 @@
+from datetime import date, datetime, time, timedelta
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from apps.billing.models import Plan, Purchase, CreditTransaction, ConsumptionEvent, ServiceType
+from apps.billing.selectors import get_wallet_for_user
+from apps.analytics.models import DailyRevenueFact, DailyCreditsFact, DailyLoadsFact, DailyRiskFact, FactWatermark
+from apps.brokers.models import Broker
+from apps.loads.models import Load
+from apps.analytics.services import cache as analytics_cache
+from apps.analytics.services.aggregates import build_range, build_credits_days, build_loads_days, build_revenue_days, build_risk_days, date_runs
+from apps.analytics.services.incremental import build_incremental
+from apps.analytics.services.backfill import split_range
+
+
+def _at(d: date):
+    return timezone.make_aware(datetime.combine(d, time(12, 0)))
+
+
+class FactBuilderTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='facts', password='pass')
+        self.wallet = get_wallet_for_user(self.user)
+        self.exam = ServiceType.objects.create(code='exam', label='Exam')
+        self.d1 = date(2025, 3, 1)
+        self.d2 = date(2025, 3, 3)
+        self._purchase(self.d1, 10, Purchase.STATUS_PAID)
+        self._purchase(self.d2, 4, Purchase.STATUS_REFUNDED)
+        ct = CreditTransaction.objects.create(wallet=self.wallet, type=CreditTransaction.TYPE_PURCHASE, signed_amount=10)
+        CreditTransaction.objects.filter(pk=ct.pk).update(created_at=_at(self.d1))
+        ce = ConsumptionEvent.objects.create(wallet=self.wallet, service_type=self.exam, credits_spent=3)
+        ConsumptionEvent.objects.filter(pk=ce.pk).update(created_at=_at(self.d2))
+
+    def _purchase(self, d, amount, status):
+        p = Purchase.objects.create(user=self.user, amount_usd=amount, status=status)
+        Purchase.objects.filter(pk=p.pk).update(created_at=_at(d), updated_at=_at(d))
+        return p
+
+    def test_revenue_and_credit_rebuilds_invalidate_the_day(self):
+        cache.clear()
+        for build in (build_revenue_days, build_credits_days):
+            before = analytics_cache.resolve('timeseries', {}, self.d1, self.d1).key
+            build([self.d1])
+            self.assertNotEqual(analytics_cache.resolve('timeseries', {}, self.d1, self.d1).key, before)
+
+    def test_date_runs(self):
+        days = [date(2025, 1, 1), date(2025, 1, 2), date(2025, 1, 5)]
+        self.assertEqual(date_runs(days), [(date(2025, 1, 1), date(2025, 1, 2)), (date(2025, 1, 5), date(2025, 1, 5))])
+
+    def test_split_range_covers_range_without_overlap(self):
+        chunks = split_range(date(2025, 1, 1), date(2025, 3, 10), 31)
+        self.assertEqual(chunks, [
+            (date(2025, 1, 1), date(2025, 1, 31)),
+            (date(2025, 2, 1), date(2025, 3, 3)),
+            (date(2025, 3, 4), date(2025, 3, 10)),
+        ])
+
+    def test_build_range_constant_queries(self):
+        # revenue 3+1 (ventas, suscripciones, clientes nuevos), credits 2+1, loads 3+1; riesgo no aplica a días pasados
+        with self.assertNumQueries(11):
+            build_range(self.d1, self.d2)
+        self.assertEqual(DailyRevenueFact.objects.count(), 3)
+        self.assertEqual(float(DailyRevenueFact.objects.get(date=self.d1).revenue), 10)
+        self.assertEqual(float(DailyRevenueFact.objects.get(date=self.d2).refunds), 4)
+        credits = DailyCreditsFact.objects.get(date=self.d2)
+        self.assertEqual(credits.credits_consumed, 3)
+        self.assertEqual(credits.by_service, {'exam': 3})
+        # idempotente: un segundo build actualiza en vez de duplicar
+        build_range(self.d1, self.d2)
+        self.assertEqual(DailyRevenueFact.objects.count(), 3)
+
+    def test_incremental_only_rebuilds_touched_days(self):
+        now = _at(self.d2 + timedelta(days=1))
+        built = build_incremental(facts=['revenue', 'credits'], now=now)
+        self.assertEqual(built, {'revenue': 4, 'credits': 4})
+        self.assertEqual(FactWatermark.objects.get(fact='revenue').high_water_mark, now)
+
+        later = now + timedelta(hours=2)
+        p = self._purchase(self.d1, 6, Purchase.STATUS_PAID)
+        Purchase.objects.filter(pk=p.pk).update(updated_at=later - timedelta(hours=1))
+        built = build_incremental(facts=['revenue', 'credits'], now=later)
+        # día de alta (created_at) y día del último cambio (updated_at)
+        self.assertEqual(built, {'revenue': 2, 'credits': 0})
+        self.assertEqual(float(DailyRevenueFact.objects.get(date=self.d1).revenue), 16)
+
+    def test_incremental_carries_revenue_levels_over_quiet_days(self):
+        plan = Plan.objects.create(name='Pro', price_usd=20, renewal_interval=Plan.INTERVAL_MONTHLY)
+        sub = Purchase.objects.create(user=self.user, plan=plan, amount_usd=20, status=Purchase.STATUS_PAID, subscription_id='sub_1')
+        Purchase.objects.filter(pk=sub.pk).update(created_at=_at(self.d1), updated_at=_at(self.d1))
+        now = _at(self.d2)
+        build_incremental(facts=['revenue'], now=now)
+        # Tres días sin ninguna fila nueva: el MRR sigue existiendo cada día
+        later = now + timedelta(days=3)
+        built = build_incremental(facts=['revenue'], now=later)
+        self.assertEqual(built, {'revenue': 4})
+        quiet = DailyRevenueFact.objects.filter(date__gt=self.d2).order_by('date')
+        self.assertEqual([(f.active_subscriptions, float(f.mrr)) for f in quiet], [(1, 20)] * 3)
+
+    def test_subscription_metrics_sweep(self):
+        plan = Plan.objects.create(name='Pro', price_usd=20, renewal_interval=Plan.INTERVAL_MONTHLY)
+        other = get_user_model().objects.create_user(username='subs', password='pass')
+        sub = Purchase.objects.create(user=self.user, plan=plan, amount_usd=20, status=Purchase.STATUS_CANCELED)
+        Purchase.objects.filter(pk=sub.pk).update(created_at=_at(self.d1), updated_at=_at(self.d2))
+        for amount in (10, 30):
+            p = Purchase.objects.create(user=other, amount_usd=amount, status=Purchase.STATUS_PAID, subscription_id=f'sub_{amount}')
+            Purchase.objects.filter(pk=p.pk).update(created_at=_at(self.d1 + timedelta(days=1)))
+        # one-off y pendiente no cuentan
+        Purchase.objects.create(user=other, plan=plan, amount_usd=99, status=Purchase.STATUS_PENDING)
+
+        build_range(self.d1, self.d2)
+        facts = {f.date: f for f in DailyRevenueFact.objects.all()}
+        day1, day2, day3 = (facts[self.d1 + timedelta(days=i)] for i in range(3))
+        self.assertEqual((float(day1.mrr), day1.active_subscriptions, day1.new_customers), (20, 1, 1))
+        self.assertEqual((float(day2.mrr), day2.active_subscriptions, float(day2.arpu)), (60, 3, 30))
+        self.assertEqual(day2.new_customers, 1)
+        self.assertEqual(float(day2.arr), 720)
+        # cancelada el día 3: baja ese mismo día
+        self.assertEqual((float(day3.mrr), day3.active_subscriptions, float(day3.arpu)), (40, 2, 40))
+
+
+class LogisticsFactTests(TestCase):
+    def setUp(self):
+        self.verified = Broker.objects.create(name='Good', is_verified=True)
+        self.shady = Broker.objects.create(name='Shady', is_verified=False)
+        self.day = date(2025, 5, 5)
+        for status in ('delivered', 'pending', 'cancelled'):
+            Load.objects.create(
+                broker=self.shady if status == 'cancelled' else self.verified,
+                origin='A', destination='B', pickup_date=self.day, delivery_date=self.day,
+                status=status, rate=100,
+            )
+
+    def test_loads_fact(self):
+        with self.assertNumQueries(4):
+            build_loads_days([self.day])
+        fact = DailyLoadsFact.objects.get(date=self.day)
+        self.assertEqual((fact.loads_created, fact.loads_completed, fact.loads_accepted), (3, 1, 0))
+        self.assertEqual(float(fact.gross_revenue), 100)
+
+    def test_risk_snapshot_only_for_today(self):
+        self.assertEqual(build_risk_days([self.day]), 0)
+        self.assertEqual(build_risk_days([timezone.localdate()]), 1)
+        fact = DailyRiskFact.objects.get(date=timezone.localdate())
+        self.assertEqual((fact.brokers_verified, fact.high_risk_count, fact.medium_risk_count), (1, 1, 0))
@@ -0,0 +1,39 @@
+from datetime import date, datetime, time
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from apps.billing.models import Purchase
+from apps.analytics.models import DailyRevenueFact
+from apps.analytics.selectors import kpis_summary
+
+
+def _at(d: date):
+    return timezone.make_aware(datetime.combine(d, time(12, 0)))
+
+
+class KpisSummaryTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='kpi', password='pass')
+        for d, amount, status in (
+            (date(2025, 4, 1), 10, Purchase.STATUS_PAID),
+            (date(2025, 4, 3), 5, Purchase.STATUS_PAID),
+            (date(2025, 4, 3), 2, Purchase.STATUS_REFUNDED),
+        ):
+            p = Purchase.objects.create(user=self.user, amount_usd=amount, status=status)
+            Purchase.objects.filter(pk=p.pk).update(created_at=_at(d))
+
+    def test_live_only(self):
+        # 2 pasadas sobre facts vacíos + 1 aggregate por fuente en vivo
+        with self.assertNumQueries(5):
+            data = kpis_summary(date(2025, 4, 1), date(2025, 4, 3))
+        self.assertEqual(data['revenue'], 15.0)
+        self.assertEqual(data['refunds'], 2.0)
+
+    def test_stitches_facts_with_live_days(self):
+        # Facts construidos solo para los dos primeros días; el 3 se calcula en vivo
+        DailyRevenueFact.objects.create(date=date(2025, 4, 1), revenue=100)
+        DailyRevenueFact.objects.create(date=date(2025, 4, 2), revenue=0)
+        data = kpis_summary(date(2025, 4, 1), date(2025, 4, 3))
+        self.assertEqual(data['revenue'], 105.0)
+        self.assertEqual(data['refunds'], 2.0)
@@ -0,0 +1,69 @@
+from datetime import date, datetime, time
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.billing.models import Purchase
+from apps.analytics.models import DailyLoadsFact
+from apps.analytics.selectors import timeseries
+
+
+def _at(d: date):
+    return timezone.make_aware(datetime.combine(d, time(12, 0)))
+
+
+class TimeseriesEngineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        self.user = User.objects.create_user(username='ts', password='pass', is_staff=True)
+        for d, amount in ((date(2025, 1, 1), 10), (date(2025, 1, 1), 5), (date(2025, 1, 3), 7), (date(2025, 2, 10), 20)):
+            p = Purchase.objects.create(user=self.user, amount_usd=amount, status=Purchase.STATUS_PAID)
+            Purchase.objects.filter(pk=p.pk).update(created_at=_at(d))
+        Purchase.objects.create(user=self.user, amount_usd=99, status=Purchase.STATUS_PENDING)
+
+    def test_daily_series_is_one_query_with_gaps_filled(self):
+        with self.assertNumQueries(1):
+            data = timeseries('revenue', date(2025, 1, 1), date(2025, 1, 4))
+        self.assertEqual(data, [
+            {'date': '2025-01-01', 'value': 15.0},
+            {'date': '2025-01-02', 'value': 0.0},
+            {'date': '2025-01-03', 'value': 7.0},
+            {'date': '2025-01-04', 'value': 0.0},
+        ])
+
+    def test_weekly_and_monthly_buckets(self):
+        weekly = timeseries('revenue', date(2025, 1, 1), date(2025, 1, 12), 'week')
+        self.assertEqual(weekly, [
+            {'date': '2024-12-30', 'value': 22.0},
+            {'date': '2025-01-06', 'value': 0.0},
+        ])
+        monthly = timeseries('revenue', date(2025, 1, 1), date(2025, 3, 31), 'month')
+        self.assertEqual([p['value'] for p in monthly], [22.0, 20.0, 0.0])
+
+    def test_unknown_metric_raises(self):
+        with self.assertRaises(ValueError):
+            timeseries('nope', date(2025, 1, 1), date(2025, 1, 2))
+
+    def test_api_granularity_and_explicit_range(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('analytics:api_timeseries')
+        res = client.get(url, {'metric': 'revenue', 'granularity': 'month', 'from': '2025-01-01', 'to': '2025-02-28'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['points'], [{'date': '2025-01-01', 'value': 22.0}, {'date': '2025-02-01', 'value': 20.0}])
+        res = client.get(url, {'granularity': 'year'})
+        self.assertEqual(res.status_code, 400)
+
+    def test_daily_series_on_a_fact_metric(self):
+        DailyLoadsFact.objects.create(date=date(2025, 1, 2), loads_created=4)
+        data = timeseries('loads', date(2025, 1, 1), date(2025, 1, 3))
+        self.assertEqual([p['value'] for p in data], [0, 4, 0])
+
+    def test_api_rejects_ranges_over_the_cap(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        res = client.get(reverse('analytics:api_timeseries'), {'metric': 'loads', 'from': '0001-01-01', 'to': '2025-01-01'})
+        self.assertEqual(res.status_code, 400)
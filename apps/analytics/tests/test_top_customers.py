@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.billing.models import Purchase, ConsumptionEvent, ServiceType
+from apps.billing.selectors import get_wallet_for_user
+from apps.analytics.selectors import top_customers, top_customers_page
+
+
+class TopCustomersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User = get_user_model()
+        exam = ServiceType.objects.create(code='exam', label='Exam')
+        self.users = []
+        # (revenue pagado, reembolsos, créditos consumidos)
+        for i, (paid, refunded, consumed) in enumerate([(50, 0, 1), (30, 1, 9), (30, 0, 4), (0, 1, 20)]):
+            u = User.objects.create_user(username=f'c{i}', password='pass', is_staff=True)
+            self.users.append(u)
+            if paid:
+                Purchase.objects.create(user=u, amount_usd=paid, status=Purchase.STATUS_PAID)
+            for _ in range(refunded):
+                Purchase.objects.create(user=u, amount_usd=5, status=Purchase.STATUS_REFUNDED)
+            ConsumptionEvent.objects.create(wallet=get_wallet_for_user(u), service_type=exam, credits_spent=consumed)
+
+    def test_revenue_ranking_single_query(self):
+        with self.assertNumQueries(1):
+            rows = top_customers(limit=3)
+        self.assertEqual([r['username'] for r in rows], ['c0', 'c1', 'c2'])
+        self.assertEqual(rows[1]['credits_consumed'], 9)
+        self.assertEqual(rows[1]['refund_ratio'], 0.5)
+
+    def test_other_rankings(self):
+        rows = top_customers(limit=2, order_by='credits_consumed')
+        self.assertEqual([r['username'] for r in rows], ['c3', 'c1'])
+        self.assertEqual(rows[1]['revenue'], 30.0)
+        rows = top_customers(limit=1, order_by='refund_ratio')
+        self.assertEqual(rows[0]['username'], 'c3')
+
+    def test_keyset_pagination_walks_all_rows_once(self):
+        seen = []
+        cursor = None
+        while True:
+            rows, cursor = top_customers_page(limit=1, cursor=cursor)
+            seen.extend(r['username'] for r in rows)
+            if not cursor:
+                break
+        # empate a 30: desempata por user_id asc
+        self.assertEqual(seen, ['c0', 'c1', 'c2'])
+
+    def test_api_next_cursor(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = reverse('analytics:api_top_customers')
+        res = client.get(url, {'limit': 2, 'order_by': 'purchase_count'})
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual(len(body['results']), 2)
+        res = client.get(url, {'limit': 2, 'order_by': 'purchase_count', 'cursor': body['next_cursor']})
+        self.assertEqual(len(res.json()['results']), 1)
+        self.assertIsNone(res.json()['next_cursor'])
+        self.assertEqual(client.get(url, {'order_by': 'nope'}).status_code, 400)
@@ -3,52 +3,143 @@ from django.shortcuts import render
 from django.contrib.auth.decorators import user_passes_test, login_required
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
-from .selectors import kpis_summary, services_breakdown, timeseries, top_customers, list_payments, list_dunning
-from apps.billing.models import Purchase
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.utils.http import http_date, parse_http_date_safe
+from .selectors import cohorts, kpis_summary, timeseries, top_customers_page, list_payments, list_dunning
+from .services import cache as analytics_cache
+from .services.cohorts import default_start, month_number
+from .services.dashboard import dashboard_bundle
 
 is_admin = user_passes_test(lambda u: u.is_authenticated and (u.is_staff or u.is_superuser))
 
 
+def _resolve_range(request):
+    """Rango de fechas a partir de ``?from=&to=`` (YYYY-MM-DD) o, si no vienen, de ``?range=7d|30d``."""
+    raw_from, raw_to = request.GET.get('from'), request.GET.get('to')
+    if raw_from or raw_to:
+        try:
+            to_dt = datetime.strptime(raw_to, '%Y-%m-%d').date() if raw_to else date.today()
+            from_dt = datetime.strptime(raw_from, '%Y-%m-%d').date() if raw_from else to_dt - timedelta(days=6)
+        except ValueError:
+            raise ValueError('Invalid date, expected YYYY-MM-DD')
+        if from_dt > to_dt:
+            raise ValueError('from must be <= to')
+        if (to_dt - from_dt).days >= analytics_cache.MAX_RANGE_DAYS:
+            raise ValueError(f'Range too long, max {analytics_cache.MAX_RANGE_DAYS} days')
+        return from_dt, to_dt
+    rng = request.GET.get('range', '7d')
+    to_dt = date.today()
+    from_dt = to_dt - timedelta(days=6) if rng == '7d' else to_dt - timedelta(days=29)
+    return from_dt, to_dt
+
+
+def _not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = {t.strip().removeprefix('W/') for t in if_none_match.split(',')}
+        return '*' in tags or entry.etag in tags
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE') or '')
+    return since is not None and entry.last_modified <= since
+
+
+def _cached_response(request, namespace, params, from_dt, to_dt, compute):
+    """Respuesta servida desde la caché versionada, con ETag/Last-Modified y 304 condicional."""
+    entry = analytics_cache.resolve(namespace, params, from_dt, to_dt)
+    headers = {
+        'ETag': entry.etag,
+        'Last-Modified': http_date(entry.last_modified),
+        'Cache-Control': 'private, no-cache',
+    }
+    if _not_modified(request, entry):
+        analytics_cache.record_not_modified()
+        return Response(status=304, headers=headers)
+    return Response(analytics_cache.get_or_compute(entry, compute), headers=headers)
+
+
 class AnalyticsSummaryApi(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        rng = request.GET.get('range','7d')
-        to_dt = date.today()
-        if rng == '7d':
-            from_dt = to_dt - timedelta(days=6)
-        elif rng == '30d':
-            from_dt = to_dt - timedelta(days=29)
-        else:
-            from_dt = to_dt - timedelta(days=6)
-        data = kpis_summary(from_dt, to_dt)
-        data = {
-            'revenue': {'total': data['revenue']},
-            'credits': data['credits'],
-        }
-        return Response(data)
+        try:
+            from_dt, to_dt = _resolve_range(request)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+        def compute():
+            data = kpis_summary(from_dt, to_dt)
+            return {
+                'revenue': {'total': data['revenue']},
+                'credits': data['credits'],
+            }
+        return _cached_response(request, 'summary', {}, from_dt, to_dt, compute)
 
 
 class AnalyticsTimeseriesApi(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         metric = request.GET.get('metric', 'revenue')
-        rng = request.GET.get('range','7d')
-        to_dt = date.today()
-        from_dt = to_dt - timedelta(days=6) if rng == '7d' else to_dt - timedelta(days=29)
-        data = timeseries(metric, from_dt, to_dt)
-        return Response({'metric': metric, 'points': data})
+        granularity = request.GET.get('granularity', 'day')
+        try:
+            from_dt, to_dt = _resolve_range(request)
+
+            def compute():
+                return {
+                    'metric': metric,
+                    'granularity': granularity,
+                    'from': from_dt.isoformat(),
+                    'to': to_dt.isoformat(),
+                    'points': timeseries(metric, from_dt, to_dt, granularity),
+                }
+            return _cached_response(request, 'timeseries', {'metric': metric, 'granularity': granularity}, from_dt, to_dt, compute)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
 
 class AnalyticsTopCustomersApi(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        rng = request.GET.get('range','7d')
-        to_dt = date.today()
-        from_dt = to_dt - timedelta(days=6) if rng == '7d' else to_dt - timedelta(days=29)
-        limit = int(request.GET.get('limit', 10))
-        data = top_customers(limit=limit, from_dt=from_dt, to_dt=to_dt)
-        return Response({'results': data})
+        order_by = request.GET.get('order_by', 'revenue')
+        cursor = request.GET.get('cursor') or None
+        try:
+            from_dt, to_dt = _resolve_range(request)
+            limit = min(max(int(request.GET.get('limit', 10)), 1), 100)
+
+            def compute():
+                rows, next_cursor = top_customers_page(limit=limit, from_dt=from_dt, to_dt=to_dt, order_by=order_by, cursor=cursor)
+                return {'results': rows, 'next_cursor': next_cursor}
+            params = {'limit': limit, 'order_by': order_by, 'cursor': cursor}
+            return _cached_response(request, 'top_customers', params, from_dt, to_dt, compute)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+
+
+class AnalyticsCohortsApi(APIView):
+    """Matrices de retención, ingresos y consumo de créditos por cohorte de primera compra.
+
+    ``?from=YYYY-MM`` (por defecto la ventana que termina este mes) y ``?months=`` (máx. 60).
+    Los administradores pueden forzar el recálculo con ``?refresh=1``.
+    """
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        try:
+            months = min(max(int(request.GET.get('months', 24)), 1), 60)
+            raw_from = request.GET.get('from')
+            if raw_from:
+                try:
+                    start_month = month_number(datetime.strptime(raw_from, '%Y-%m').date())
+                except ValueError:
+                    raise ValueError('Invalid month, expected YYYY-MM')
+            else:
+                start_month = default_start(months)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        refresh = request.GET.get('refresh') == '1' and request.user.is_staff
+        return Response(cohorts(start_month, months, refresh=refresh))
+
+
+class AnalyticsCacheStatsApi(APIView):
+    permission_classes = [IsAdminUser]
+    def get(self, request):
+        return Response(analytics_cache.stats())
 
 
 class AnalyticsPaymentsApi(APIView):
@@ -88,23 +179,24 @@ class AnalyticsDunningApi(APIView):
         return Response({'results': results})
 
 
+class AnalyticsDashboardApi(APIView):
+    """Todos los paneles del dashboard en una sola llamada (``?panels=summary,payments`` para un subconjunto)."""
+    permission_classes = [IsAdminUser]
+    def get(self, request):
+        try:
+            from_dt, to_dt = _resolve_range(request)
+            panels = [p for p in request.GET.get('panels', '').split(',') if p] or None
+            data = dashboard_bundle(from_dt, to_dt, panels)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'from': from_dt.isoformat(), 'to': to_dt.isoformat(), **data})
+
+
 @is_admin
 def dashboard_page(request):
-    rng = request.GET.get('range','7d')
-    to_dt = date.today()
-    from_dt = to_dt - timedelta(days=6) if rng=='7d' else to_dt - timedelta(days=29)
-    summary = kpis_summary(from_dt, to_dt)
-    breakdown = services_breakdown(from_dt, to_dt)
-    payments = Purchase.objects.select_related('user').order_by('-created_at')[:20]
-    top = top_customers(limit=10, from_dt=from_dt, to_dt=to_dt)
-    dunning = list_dunning(limit=10)
+    # Solo el esqueleto: la plantilla pide los paneles a AnalyticsDashboardApi
     context = {
         'segment': 'analytics',
-        'summary': summary,
-        'breakdown': breakdown,
-        'payments': payments,
-        'top_customers': top,
-        'dunning': dunning,
-        'range': rng,
+        'range': request.GET.get('range', '7d'),
     }
     return render(request, 'analytics/dashboard.html', context)
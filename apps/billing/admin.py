@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Plan, PlanBenefit, CreditWallet, CreditTransaction, Purchase, GuaranteeWindow, RefundRequest, ServiceType, ConsumptionEvent, CreditPack
+from .models import Plan, PlanBenefit, CreditWallet, CreditTransaction, Purchase, GuaranteeWindow, RefundRequest, ServiceType, ConsumptionEvent, CreditPack, CreditReservation, WalletCheckpoint, StripeWebhookEvent, StripeIdempotencyKey
 
 
 class PlanBenefitInline(admin.TabularInline):
@@ -24,7 +24,7 @@ class PlanAdmin(admin.ModelAdmin):
 
 @admin.register(CreditWallet)
 class CreditWalletAdmin(admin.ModelAdmin):
-    list_display = ('user','balance','created_at','updated_at')
+    list_display = ('user','balance','held','created_at','updated_at')
 
 @admin.register(CreditTransaction)
 class CreditTransactionAdmin(admin.ModelAdmin):
@@ -57,3 +57,23 @@ class ConsumptionEventAdmin(admin.ModelAdmin):
 @admin.register(CreditPack)
 class CreditPackAdmin(admin.ModelAdmin):
     list_display = ('name','credits','price_usd','is_active')
+
+@admin.register(CreditReservation)
+class CreditReservationAdmin(admin.ModelAdmin):
+    list_display = ('wallet','service_type','amount','status','reference','expires_at')
+    list_filter = ('status',)
+
+@admin.register(WalletCheckpoint)
+class WalletCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('wallet','balance','last_transaction_id','created_at')
+
+@admin.register(StripeWebhookEvent)
+class StripeWebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_id','event_type','status','attempts','available_at','processed_at')
+    list_filter = ('status','event_type')
+    search_fields = ('event_id',)
+
+@admin.register(StripeIdempotencyKey)
+class StripeIdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('key','created_at')
+    search_fields = ('key',)
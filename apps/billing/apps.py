@@ -11,3 +11,21 @@ class BillingConfig(AppConfig):
         from django.db.models.signals import post_save
         from .signals import create_user_wallet
         post_save.connect(create_user_wallet, sender=get_user_model(), dispatch_uid='billing_create_user_wallet')
+
+        from django.db.models.signals import post_delete
+        from .models import ServiceType
+        from .services.service_types import on_service_type_changed
+        post_save.connect(on_service_type_changed, sender=ServiceType, dispatch_uid='billing_service_types_saved')
+        post_delete.connect(on_service_type_changed, sender=ServiceType, dispatch_uid='billing_service_types_deleted')
+
+        from .services.stripe_cache import invalidate_customer
+        post_save.connect(invalidate_customer, sender='my_profile.Profile', dispatch_uid='billing_stripe_customer_saved')
+        post_delete.connect(invalidate_customer, sender='my_profile.Profile', dispatch_uid='billing_stripe_customer_deleted')
+
+        from .models import ConsumptionEvent
+        from .services.guarantees import on_consumption_saved
+        post_save.connect(on_consumption_saved, sender=ConsumptionEvent, dispatch_uid='billing_guarantee_usage')
+
+        from django.core import checks
+        from .throttling import check_shared_cache
+        checks.register(check_shared_cache, checks.Tags.caches)
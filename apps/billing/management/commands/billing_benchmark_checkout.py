@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import requests
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from apps.billing.models import Plan, Purchase, StripeWebhookEvent
+from apps.billing.services import stripe_http
+from apps.billing.services.stripe_fake import FakeStripe, django_deliverer, serve
+from apps.billing.services.stripe_service import create_checkout_session, request_refund
+from apps.billing.services.webhook_inbox import run_worker
+
+
+def percentiles(values, points=(50, 95, 99)):
+    ordered = sorted(values)
+    if not ordered:
+        return {p: 0.0 for p in points}
+    return {p: ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] for p in points}
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive checkout -> signed webhook -> inbox worker -> credit flows at high concurrency against the local '
+        'Stripe stand-in (use PostgreSQL: SQLite serialises writers)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=200, help='Checkouts to run (one user each)')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--webhook-workers', type=int, default=4)
+        parser.add_argument('--latency-ms', type=float, default=30, help='Fake Stripe latency per request')
+        parser.add_argument('--jitter-ms', type=float, default=20)
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of fake API calls failing with 500')
+        parser.add_argument('--refund-ratio', type=float, default=0.0, help='Fraction of paid flows refunded afterwards')
+        parser.add_argument('--timeout', type=float, default=120, help='Seconds to wait for every purchase to be credited')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark users, plan and purchases')
+
+    def handle(self, *args, **opts):
+        run = uuid.uuid4().hex[:8]
+        secret = f'whsec_bench_{run}'
+        app = FakeStripe(
+            latency_ms=opts['latency_ms'], jitter_ms=opts['jitter_ms'], error_rate=opts['error_rate'],
+            webhook_secret=secret, deliver=django_deliverer(),
+        )
+        server, base_url = serve(app)
+        saved = (stripe.api_base, stripe.api_key)
+        plan = Plan.objects.create(
+            name=f'Bench {run}', slug=f'bench-{run}', price_usd=10, credits_on_purchase=10,
+            renewal_interval=Plan.INTERVAL_ONE_OFF, stripe_price_id=f'price_bench_{run}', is_active=False,
+        )
+        User = get_user_model()
+        users = []
+        for i in range(opts['flows']):
+            user = User(username=f'bench_{run}_{i}', email=f'bench_{run}_{i}@example.com')
+            user.set_unusable_password()
+            user.save()
+            users.append(user)
+        try:
+            with override_settings(STRIPE_API_BASE=base_url, STRIPE_WEBHOOK_SECRET=secret):
+                stripe_http.configure(force=True)
+                stripe.api_key = stripe.api_key or 'sk_test_bench'
+                self._run(app, base_url, plan, users, opts)
+        finally:
+            server.shutdown()
+            server.server_close()
+            stripe.api_base, stripe.api_key = saved
+            stripe_http.configure(force=True)
+            if not opts['keep']:
+                StripeWebhookEvent.objects.filter(payload__data__object__metadata__plan_id=str(plan.pk)).delete()
+                User.objects.filter(pk__in=[u.pk for u in users]).delete()
+                plan.delete()
+
+    def _run(self, app, base_url, plan, users, opts):
+        checkout_ms, pay_ms, errors = [], [], []
+
+        def flow(user):
+            try:
+                t0 = time.perf_counter()
+                _, purchase = create_checkout_session(user, plan, 'http://bench/success', 'http://bench/cancel')
+                t1 = time.perf_counter()
+                requests.post(f'{base_url}/_fake/checkout/sessions/{purchase.checkout_session_id}/complete', timeout=30).raise_for_status()
+                checkout_ms.append((t1 - t0) * 1000)
+                pay_ms.append((time.perf_counter() - t1) * 1000)
+            except Exception as e:
+                errors.append(f'{type(e).__name__}: {e}')
+            finally:
+                connections.close_all()
+
+        stop = threading.Event()
+
+        def worker():
+            try:
+                run_worker(batch_size=20, poll_seconds=0.05, stop=stop)
+            finally:
+                connections.close_all()
+
+        ids = [u.pk for u in users]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts['webhook_workers'], thread_name_prefix='bench-webhooks') as workers:
+            worker_futures = [workers.submit(worker) for _ in range(opts['webhook_workers'])]
+            with ThreadPoolExecutor(max_workers=opts['concurrency'], thread_name_prefix='bench-checkout') as pool:
+                list(pool.map(flow, users))
+            checkout_done = time.perf_counter() - started
+            deadline = time.monotonic() + opts['timeout']
+            paid = 0
+            while time.monotonic() < deadline:
+                paid = Purchase.objects.filter(user_id__in=ids, status=Purchase.STATUS_PAID).count()
+                if paid >= len(users) - len(errors):
+                    break
+                time.sleep(0.05)
+            total = time.perf_counter() - started
+            stop.set()
+        errors.extend(f'webhook worker: {f.exception()!r}' for f in worker_futures if f.exception())
+
+        refunded = 0
+        if opts['refund_ratio'] > 0:
+            sample = Purchase.objects.filter(user_id__in=ids, status=Purchase.STATUS_PAID).select_related('user')
+            sample = list(sample[:int(len(users) * opts['refund_ratio'])])
+            t0 = time.perf_counter()
+            for purchase in sample:
+                request_refund(purchase.user, purchase)
+                refunded += 1
+            refund_ms = (time.perf_counter() - t0) * 1000 / max(1, refunded)
+
+        def fmt(name, values):
+            p = percentiles(values)
+            return f'{name:<22} p50={p[50]:8.1f}ms p95={p[95]:8.1f}ms p99={p[99]:8.1f}ms'
+
+        self.stdout.write(
+            f'flows={len(users)} concurrency={opts["concurrency"]} webhook_workers={opts["webhook_workers"]} '
+            f'latency={opts["latency_ms"]}+{opts["jitter_ms"]}ms error_rate={opts["error_rate"]}'
+        )
+        self.stdout.write(fmt('checkout session', checkout_ms))
+        self.stdout.write(fmt('pay + webhook ack', pay_ms))
+        self.stdout.write(fmt('webhook delivery', app.delivery_ms))
+        if refunded:
+            self.stdout.write(f'{"refund":<22} avg={refund_ms:8.1f}ms ({refunded} refunds)')
+        self.stdout.write(
+            f'checkouts done in {checkout_done:.2f}s, all credited in {total:.2f}s '
+            f'({paid / total if total else 0:.1f} flows/s), fake Stripe requests={app.requests}'
+        )
+        for message in errors[:5]:
+            self.stderr.write(self.style.WARNING(message))
+        if paid < len(users):
+            self.stderr.write(self.style.WARNING(f'{len(users) - paid} purchase(s) not credited ({len(errors)} flow error(s))'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All purchases credited'))
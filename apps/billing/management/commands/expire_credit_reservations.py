@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from apps.billing.services.reservations import expire_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release credit reservations whose TTL has passed (run periodically, e.g. every minute)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **opts):
+        count = expire_reservations(batch_size=opts['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} reservation(s)'))
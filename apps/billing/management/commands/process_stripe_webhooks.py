@@ -0,0 +1,38 @@
+import signal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import connections
+from apps.billing.services.webhook_inbox import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Drain the Stripe webhook inbox with a pool of workers (retries failed events with backoff)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Worker threads, each claiming its own batches')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when the inbox is empty')
+        parser.add_argument('--once', action='store_true', help='Drain what is available and exit (e.g. from cron)')
+
+    def handle(self, *args, **opts):
+        stop = threading.Event()
+        if not opts['once']:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: stop.set())
+
+        def worker():
+            try:
+                return run_worker(opts['batch_size'], opts['poll'], stop, opts['once'])
+            finally:
+                connections.close_all()
+
+        workers = max(1, opts['workers'])
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stripe-webhooks') as pool:
+            futures = [pool.submit(worker) for _ in range(workers)]
+            totals = {}
+            for fut in futures:
+                for status, n in fut.result().items():
+                    totals[status] = totals.get(status, 0) + n
+        summary = ', '.join(f'{n} {status.lower()}' for status, n in sorted(totals.items())) or 'nothing to do'
+        self.stdout.write(self.style.SUCCESS(f'Processed webhook events: {summary}'))
@@ -0,0 +1,38 @@
+import time
+from django.core.management.base import BaseCommand
+from apps.billing.services.reconcile import reconcile_wallets
+
+
+class Command(BaseCommand):
+    help = 'Check wallet balances against the credit ledger (from the last checkpoint) and report or fix drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Reconcile in N processes, one wallet-id chunk per task')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Wallet ids per chunk')
+        parser.add_argument('--fix', action='store_true', help='Set drifted balances to the ledger value')
+        parser.add_argument('--no-checkpoint', action='store_true', help='Do not write new checkpoints for clean wallets')
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+
+        def progress(result, done, total):
+            self.stdout.write(
+                f'[{done}/{total}] wallets {result.first_id}-{result.last_id}: {result.checked} checked, '
+                f'{len(result.drifts)} drift(s), {result.checkpoints} checkpoint(s)'
+            )
+            for d in result.drifts:
+                self.stdout.write(self.style.WARNING(
+                    f'  wallet {d.wallet_id}: balance {d.balance}, ledger {d.expected} ({d.balance - d.expected:+d})'
+                ))
+
+        results = reconcile_wallets(
+            workers=opts['workers'], chunk_size=opts['chunk_size'], fix=opts['fix'],
+            checkpoint=not opts['no_checkpoint'], on_chunk=progress,
+        )
+        checked = sum(r.checked for r in results)
+        drifted = sum(len(r.drifts) for r in results)
+        fixed = sum(r.fixed for r in results)
+        summary = f'Checked {checked} wallet(s) in {time.perf_counter() - t0:.2f}s: {drifted} drifted'
+        if opts['fix']:
+            summary += f', {fixed} fixed'
+        self.stdout.write(self.style.WARNING(summary) if drifted and not opts['fix'] else self.style.SUCCESS(summary))
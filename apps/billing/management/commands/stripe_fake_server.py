@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from apps.billing.services.stripe_fake import FakeStripe, http_deliverer, serve
+
+
+class Command(BaseCommand):
+    help = 'Run a local Stripe stand-in (point STRIPE_API_BASE at it) with optional latency and error injection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=12111)
+        parser.add_argument('--latency-ms', type=float, default=0, help='Fixed delay added to every request')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Extra uniform random delay (0..N ms)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of API requests answered with a 500')
+        parser.add_argument('--webhook-url', default='', help='Deliver signed events here, e.g. http://127.0.0.1:8000/billing/webhooks/stripe/')
+        parser.add_argument('--webhook-secret', default='', help='Defaults to STRIPE_WEBHOOK_SECRET')
+
+    def handle(self, *args, **opts):
+        app = FakeStripe(
+            latency_ms=opts['latency_ms'], jitter_ms=opts['jitter_ms'], error_rate=opts['error_rate'],
+            webhook_secret=opts['webhook_secret'] or getattr(settings, 'STRIPE_WEBHOOK_SECRET', '') or 'whsec_fake',
+            deliver=http_deliverer(opts['webhook_url']) if opts['webhook_url'] else None,
+        )
+        server, base_url = serve(app, opts['host'], opts['port'], background=False)
+        self.stdout.write(self.style.SUCCESS(f'Fake Stripe listening on {base_url} (STRIPE_API_BASE={base_url})'))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
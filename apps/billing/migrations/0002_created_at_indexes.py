@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consumptionevent',
+            index=models.Index(fields=['created_at'], name='billing_con_created_27a97e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['created_at'], name='billing_cre_created_582b8d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['created_at'], name='billing_pur_created_8ba406_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['updated_at'], name='billing_pur_updated_baffc9_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0002_created_at_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditwallet',
+            name='held',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='CreditReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField()),
+                ('status', models.CharField(default='HELD', max_length=20)),
+                ('reference', models.CharField(blank=True, db_index=True, max_length=100)),
+                ('metadata', models.JSONField(blank=True, default=dict)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('service_type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='billing.servicetype')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='billing.creditwallet')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='billing_cre_status_d1912d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0003_credit_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.IntegerField()),
+                ('last_transaction_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['wallet', 'id'], name='billing_cre_wallet__36acc5_idx'),
+        ),
+        migrations.AddField(
+            model_name='walletcheckpoint',
+            name='wallet',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='billing.creditwallet'),
+        ),
+        migrations.AddIndex(
+            model_name='walletcheckpoint',
+            index=models.Index(fields=['wallet', '-last_transaction_id'], name='billing_wal_wallet__06f9e6_idx'),
+        ),
+    ]
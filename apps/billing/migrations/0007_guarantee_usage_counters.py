@@ -0,0 +1,42 @@
+# Generated by Django 4.2.24 on 2026-10-18 09:56
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_counters(apps, schema_editor):
+    GuaranteeWindow = apps.get_model('billing', 'GuaranteeWindow')
+    ConsumptionEvent = apps.get_model('billing', 'ConsumptionEvent')
+    for gw in GuaranteeWindow.objects.select_related('purchase').iterator():
+        totals = ConsumptionEvent.objects.filter(wallet__user_id=gw.purchase.user_id).aggregate(
+            linked=Sum('credits_spent', filter=Q(purchase_id=gw.purchase_id)),
+            window=Sum('credits_spent', filter=Q(created_at__gte=gw.start, created_at__lte=gw.end)),
+        )
+        gw.purchase_credits_used = totals['linked'] or 0
+        gw.window_credits_used = totals['window'] or 0
+        gw.save(update_fields=['purchase_credits_used', 'window_credits_used'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_stripe_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='guaranteewindow',
+            name='purchase_credits_used',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='guaranteewindow',
+            name='window_credits_used',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='consumptionevent',
+            index=models.Index(fields=['wallet', 'purchase', 'created_at'], name='billing_con_wallet__a4c0df_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
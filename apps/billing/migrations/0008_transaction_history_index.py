@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0007_guarantee_usage_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='credittransaction',
+            index=models.Index(fields=['wallet', '-created_at', 'id'], name='billing_cre_wallet__b41f42_idx'),
+        ),
+    ]
@@ -53,31 +53,22 @@ class PlanBenefit(models.Model):
 class CreditWallet(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, related_name='credit_wallet', on_delete=models.CASCADE)
     balance = models.IntegerField(default=0)
+    # Créditos retenidos por reservas activas (CreditReservation en HELD); siguen dentro de balance
+    held = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Wallet({self.user}) balance={self.balance}"
 
+    @property
+    def available(self):
+        return self.balance - self.held
+
     def debit(self, amount: int, reason: str = '', metadata: dict | None = None):
-        from django.db import transaction
-        if amount <= 0:
-            raise ValueError('amount must be > 0')
-        metadata = metadata or {}
-        with transaction.atomic():
-            w = CreditWallet.objects.select_for_update().get(pk=self.pk)
-            if w.balance < amount:
-                raise ValueError('Insufficient credits')
-            w.balance -= amount
-            w.save(update_fields=['balance', 'updated_at'])
-            CreditTransaction.objects.create(
-                wallet=w,
-                type=CreditTransaction.TYPE_DEBIT,
-                signed_amount=-amount,
-                reason=reason,
-                metadata=metadata,
-            )
-            return w.balance
+        from .services.ledger import debit_wallet
+        self.balance = debit_wallet(self.pk, amount, reason=reason, metadata=metadata)
+        return self.balance
 
 
 class CreditTransaction(models.Model):
@@ -103,6 +94,13 @@ class CreditTransaction(models.Model):
 
     class Meta:
         ordering = ['-created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Reconciliación: sumar solo las filas del wallet posteriores al último checkpoint
+            models.Index(fields=['wallet', 'id']),
+            # Historial por keyset: mismo orden que Meta.ordering dentro de cada wallet
+            models.Index(fields=['wallet', '-created_at', 'id']),
+        ]
 
 
 class CreditPack(models.Model):
@@ -142,6 +140,8 @@ class Purchase(models.Model):
     checkout_session_id = models.CharField(max_length=200, blank=True, null=True)
     subscription_id = models.CharField(max_length=200, blank=True, null=True)
     payment_intent_id = models.CharField(max_length=200, blank=True, null=True)
+    # Nonce de la Idempotency-Key de Stripe.Refund.create (billing.services.idempotency)
+    refund_idempotency_nonce = models.UUIDField(blank=True, null=True, editable=False)
 
     status = models.CharField(max_length=20, default=STATUS_PENDING)
     credits_granted = models.IntegerField(default=0)
@@ -153,6 +153,12 @@ class Purchase(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at']),
+            models.Index(fields=['updated_at']),
+        ]
+
     def open_guarantee(self):
         start = timezone.now()
         end = start + timezone.timedelta(days=30)
@@ -163,6 +169,8 @@ class Purchase(models.Model):
             'start': start,
             'end': end,
             'status': GuaranteeWindow.STATUS_ACTIVE,
+            # Ventana nueva: aún no hay consumo dentro; el de la propia compra se conserva
+            'window_credits_used': 0,
         })
 
     def __str__(self):
@@ -178,6 +186,9 @@ class GuaranteeWindow(models.Model):
     start = models.DateTimeField()
     end = models.DateTimeField()
     status = models.CharField(max_length=20, default=STATUS_ACTIVE)
+    # Contadores de consumo mantenidos en cada débito (services/guarantees.py)
+    purchase_credits_used = models.PositiveIntegerField(default=0)
+    window_credits_used = models.PositiveIntegerField(default=0)
 
 
 class RefundRequest(models.Model):
@@ -207,3 +218,80 @@ class ConsumptionEvent(models.Model):
 
     class Meta:
         ordering = ['-created_at', 'id']
+        indexes = [
+            models.Index(fields=['created_at']),
+            # Consumo de una compra / de un wallet en la ventana de garantía
+            models.Index(fields=['wallet', 'purchase', 'created_at']),
+        ]
+
+
+class CreditReservation(models.Model):
+    """Créditos retenidos para un servicio en curso: se capturan al terminar o se liberan."""
+    STATUS_HELD = 'HELD'
+    STATUS_CAPTURED = 'CAPTURED'
+    STATUS_RELEASED = 'RELEASED'
+    STATUS_EXPIRED = 'EXPIRED'
+
+    wallet = models.ForeignKey(CreditWallet, related_name='reservations', on_delete=models.CASCADE)
+    service_type = models.ForeignKey(ServiceType, on_delete=models.PROTECT)
+    amount = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, default=STATUS_HELD)
+    reference = models.CharField(max_length=100, blank=True, db_index=True)
+    metadata = models.JSONField(default=dict, blank=True)
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'expires_at'])]
+
+    def __str__(self):
+        return f"Reservation #{self.pk} {self.amount}cr {self.status}"
+
+
+class WalletCheckpoint(models.Model):
+    """Saldo verificado de un wallet hasta una transacción del ledger (incluida)."""
+    wallet = models.ForeignKey(CreditWallet, related_name='checkpoints', on_delete=models.CASCADE)
+    balance = models.IntegerField()
+    last_transaction_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['wallet', '-last_transaction_id'])]
+
+    def __str__(self):
+        return f"Checkpoint({self.wallet_id}) {self.balance} @ tx {self.last_transaction_id}"
+
+
+class StripeWebhookEvent(models.Model):
+    """Bandeja de entrada de webhooks de Stripe: el endpoint guarda el evento verificado y un worker lo procesa."""
+    STATUS_PENDING = 'PENDING'
+    STATUS_PROCESSING = 'PROCESSING'
+    STATUS_DONE = 'DONE'
+    STATUS_FAILED = 'FAILED'
+
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Próximo intento (PENDING) o fin del lease del worker que lo tiene (PROCESSING)
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+    def __str__(self):
+        return f"{self.event_type} {self.event_id} {self.status}"
+
+
+class StripeIdempotencyKey(models.Model):
+    """Objetos de Stripe ya aplicados (``invoice:<id>``, ``checkout:<session>``): se insertan antes de procesarlos."""
+    key = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.key
@@ -1,4 +1,7 @@
-from .models import Plan, CreditWallet
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Plan, CreditReservation, CreditWallet
 
 
 def active_plans():
@@ -6,7 +9,32 @@ def active_plans():
 
 
 def get_wallet_for_user(user):
-    from django.db import transaction
-    with transaction.atomic():
-        wallet, _ = CreditWallet.objects.select_for_update().get_or_create(user=user)
+    """Wallet del usuario, creándolo si no existe. No toma locks: el saldo se mueve con ``services.ledger``."""
+    # get_or_create ya resuelve la carrera de dos altas simultáneas (user es unique)
+    wallet, _ = CreditWallet.objects.get_or_create(user=user)
     return wallet
+
+
+def peek_wallet(user):
+    """Lectura sin lock ni escritura: el wallet existente o uno sin guardar con saldo 0."""
+    return CreditWallet.objects.filter(user=user).first() or CreditWallet(user=user)
+
+
+def get_balance(user) -> int:
+    # Un único SELECT de la columna: no espera a débitos en curso ni crea el wallet
+    return CreditWallet.objects.filter(user=user).values_list('balance', flat=True).first() or 0
+
+
+def get_available_balance(user) -> int:
+    """Saldo menos los créditos retenidos por reservas activas (las vencidas sin barrer no cuentan)."""
+    expired = (
+        CreditReservation.objects.filter(wallet=OuterRef('pk'), status=CreditReservation.STATUS_HELD, expires_at__lte=timezone.now())
+        .values('wallet').annotate(total=Sum('amount')).values('total')
+    )
+    row = (
+        CreditWallet.objects.filter(user=user)
+        .annotate(expired=Coalesce(Subquery(expired), 0))
+        .values_list('balance', 'held', 'expired').first()
+    )
+    return row[0] - row[1] + row[2] if row else 0
+
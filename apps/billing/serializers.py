@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Plan, CreditWallet, ConsumptionEvent, Purchase
+from .models import Plan, CreditWallet, CreditTransaction, ConsumptionEvent, Purchase
 
 
 class PlanBenefitSerializer(serializers.Serializer):
@@ -35,9 +35,16 @@ class PortalSessionSerializer(serializers.Serializer):
     return_url = serializers.URLField(required=False)
 
 class WalletSerializer(serializers.ModelSerializer):
+    available = serializers.IntegerField(read_only=True)
+
     class Meta:
         model = CreditWallet
-        fields = ('balance',)
+        fields = ('balance', 'held', 'available')
+
+class CreditTransactionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CreditTransaction
+        fields = ('id', 'type', 'signed_amount', 'reason', 'metadata', 'created_at')
 
 class ConsumeSerializer(serializers.Serializer):
     service_code = serializers.CharField()
@@ -45,6 +52,14 @@ class ConsumeSerializer(serializers.Serializer):
     source = serializers.CharField(required=False, allow_blank=True)
     metadata = serializers.JSONField(required=False)
 
+class ConsumeBatchItemSerializer(ConsumeSerializer):
+    # Solo staff puede consumir en nombre de otros usuarios
+    user_id = serializers.IntegerField(required=False)
+
+class ConsumeBatchSerializer(serializers.Serializer):
+    mode = serializers.ChoiceField(choices=['atomic', 'best_effort'], default='atomic')
+    items = ConsumeBatchItemSerializer(many=True, allow_empty=False, max_length=500)
+
 class RefundRequestSerializer(serializers.Serializer):
     purchase_id = serializers.IntegerField()
     reason_text = serializers.CharField(required=False, allow_blank=True)
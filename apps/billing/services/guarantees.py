@@ -0,0 +1,112 @@
+"""Consumo durante la garantía y elegibilidad de reembolso.
+
+Cada ``GuaranteeWindow`` lleva dos contadores que se actualizan en el mismo débito que crea el
+``ConsumptionEvent`` (UPDATE con ``F()``, sin leer): ``purchase_credits_used`` (consumo ligado a
+la compra) y ``window_credits_used`` (todo el consumo del usuario dentro de la ventana activa).
+El uso de una compra es el primero si hay consumo ligado y si no el segundo, igual que la
+consulta que sustituyen, así que comprobar la elegibilidad no toca ``ConsumptionEvent``.
+``usage_from_events`` recalcula los mismos valores con agregados sobre el índice
+(wallet, purchase, created_at) para compras sin ventana o para reconstruir los contadores.
+"""
+from collections import defaultdict, namedtuple
+from django.conf import settings
+from django.db.models import Case, F, Q, Sum, When
+from django.utils import timezone
+from ..models import ConsumptionEvent, CreditWallet, GuaranteeWindow, Purchase
+
+Eligibility = namedtuple('Eligibility', ['purchase_id', 'eligible', 'used', 'refund_amount', 'reason'])
+
+
+def record_usage(entries, at=None):
+    """Suma el consumo de ``entries`` [(wallet_id, purchase_id | None, créditos)] a los contadores."""
+    at = at or timezone.now()
+    per_purchase, per_wallet = defaultdict(int), defaultdict(int)
+    for wallet_id, purchase_id, credits in entries:
+        if purchase_id:
+            per_purchase[purchase_id] += credits
+        per_wallet[wallet_id] += credits
+    if per_purchase:
+        GuaranteeWindow.objects.filter(purchase_id__in=per_purchase).update(
+            purchase_credits_used=Case(*[When(purchase_id=pid, then=F('purchase_credits_used') + n) for pid, n in per_purchase.items()]),
+        )
+    if per_wallet:
+        # Un solo UPDATE (sin leer las ventanas antes): el Case elige el incremento por wallet del usuario
+        GuaranteeWindow.objects.filter(
+            status=GuaranteeWindow.STATUS_ACTIVE, start__lte=at, end__gte=at,
+            purchase__user__credit_wallet__in=list(per_wallet),
+        ).update(window_credits_used=Case(*[
+            When(purchase_id__in=Purchase.objects.filter(user__credit_wallet=wid).values('pk'), then=F('window_credits_used') + n)
+            for wid, n in per_wallet.items()
+        ]))
+
+
+def on_consumption_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        record_usage([(instance.wallet_id, instance.purchase_id, instance.credits_spent)], at=instance.created_at)
+
+
+def usage_from_events(purchase: Purchase):
+    """(consumo ligado a la compra, consumo en la ventana) con una sola consulta agregada."""
+    window = Q(pk__in=[])
+    if purchase.guarantee_starts_at and purchase.guarantee_ends_at:
+        window = Q(created_at__gte=purchase.guarantee_starts_at, created_at__lte=purchase.guarantee_ends_at)
+    totals = ConsumptionEvent.objects.filter(
+        wallet_id__in=CreditWallet.objects.filter(user_id=purchase.user_id).values('pk'),
+    ).aggregate(
+        linked=Sum('credits_spent', filter=Q(purchase=purchase)),
+        window=Sum('credits_spent', filter=window),
+    )
+    return totals['linked'] or 0, totals['window'] or 0
+
+
+def refresh_usage(purchase: Purchase):
+    """Reconstruye los contadores de la ventana de ``purchase`` desde los eventos."""
+    linked, window = usage_from_events(purchase)
+    GuaranteeWindow.objects.filter(purchase=purchase).update(purchase_credits_used=linked, window_credits_used=window)
+
+
+def used_credits(purchase: Purchase, guarantee: GuaranteeWindow | None = None) -> int:
+    """Créditos usados en la garantía; ``guarantee`` recién leída evita la consulta de contadores."""
+    if guarantee is not None:
+        counters = (guarantee.purchase_credits_used, guarantee.window_credits_used)
+    else:
+        # No se usa purchase.guarantee: la instancia cacheada puede tener contadores viejos
+        counters = GuaranteeWindow.objects.filter(purchase=purchase).values_list(
+            'purchase_credits_used', 'window_credits_used').first()
+    linked, window = counters if counters is not None else usage_from_events(purchase)
+    # Como antes: el consumo ligado a la compra manda; si no hay, el de la ventana
+    return linked or window
+
+
+def check(purchase: Purchase, now=None, guarantee: GuaranteeWindow | None = None) -> Eligibility:
+    """Elegibilidad e importe de reembolso de una compra (garantía, consumo y prorrata)."""
+    now = now or timezone.now()
+    if not purchase.guarantee_ends_at or purchase.guarantee_ends_at < now:
+        return Eligibility(purchase.pk, False, 0, 0, 'Guarantee window expired')
+    used = used_credits(purchase, guarantee)
+    threshold = int(getattr(settings, 'BILLING_ALLOW_REFUND_IF_USED_THRESHOLD', 0))
+    pro_rata = bool(getattr(settings, 'BILLING_REFUND_PRO_RATA', False))
+    if used == 0:
+        amount = purchase.amount_usd
+    elif pro_rata and purchase.credits_granted > 0 and purchase.amount_usd:
+        ratio = max(0, (purchase.credits_granted - used) / purchase.credits_granted)
+        amount = round(float(purchase.amount_usd) * ratio, 2)
+    elif used <= threshold:
+        amount = purchase.amount_usd
+    else:
+        return Eligibility(purchase.pk, False, used, 0, 'Refund not eligible due to usage')
+    return Eligibility(purchase.pk, True, used, amount, '')
+
+
+def eligible_purchases(user, now=None):
+    """Compras pagadas con la garantía en curso y elegibles, con su importe (una consulta)."""
+    now = now or timezone.now()
+    qs = Purchase.objects.filter(
+        user=user, status=Purchase.STATUS_PAID, guarantee_ends_at__gte=now,
+    ).select_related('guarantee', 'plan', 'credit_pack').order_by('-created_at')
+    out = []
+    for purchase in qs:
+        eligibility = check(purchase, now, getattr(purchase, 'guarantee', None))
+        if eligibility.eligible:
+            out.append((purchase, eligibility))
+    return out
@@ -0,0 +1,76 @@
+"""Historial de transacciones de un wallet: páginas por keyset y exportación en streaming.
+
+Las páginas siguen el orden del modelo (``-created_at, id``) y el índice compuesto
+(wallet, -created_at, id): ``cursor`` codifica (created_at, id) de la última fila servida y la
+siguiente página arranca justo después, sin OFFSET, así que la página 1000 cuesta lo mismo
+que la primera. La exportación recorre el ledger completo por (wallet, id) con ``iterator()``
+(cursor del lado del servidor en PostgreSQL) y emite línea a línea, con memoria constante.
+"""
+import base64
+import csv
+import json
+from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from ..models import CreditTransaction
+
+EXPORT_FIELDS = ('id', 'created_at', 'type', 'signed_amount', 'reason', 'metadata')
+EXPORT_CHUNK_SIZE = 2000
+
+
+def encode_cursor(tx):
+    raw = json.dumps([tx.created_at.isoformat(), tx.pk])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), int(pk)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def transactions_page(wallet, limit=50, cursor=None, type=None):
+    """(transacciones, next_cursor) del wallet, de la más reciente a la más antigua.
+
+    next_cursor es None en la última página. Un wallet sin guardar no tiene transacciones.
+    """
+    if not wallet.pk:
+        return [], None
+    qs = CreditTransaction.objects.filter(wallet=wallet)
+    if type:
+        qs = qs.filter(type=type)
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, pk__gt=pk))
+    rows = list(qs.order_by('-created_at', 'id')[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def iter_ledger(wallet, chunk_size=EXPORT_CHUNK_SIZE):
+    """Tuplas ``EXPORT_FIELDS`` del ledger completo en orden de id, sin cargarlo en memoria."""
+    if not wallet.pk:
+        return iter(())
+    qs = CreditTransaction.objects.filter(wallet=wallet).order_by('id').values_list(*EXPORT_FIELDS)
+    return qs.iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """Pseudo-buffer para csv.writer: devuelve la línea en vez de acumularla."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(wallet):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for pk, created_at, type, amount, reason, metadata in iter_ledger(wallet):
+        yield writer.writerow([pk, created_at.isoformat(), type, amount, reason, json.dumps(metadata, cls=DjangoJSONEncoder)])
+
+
+def ndjson_lines(wallet):
+    for row in iter_ledger(wallet):
+        yield json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + '\n'
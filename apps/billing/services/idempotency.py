@@ -0,0 +1,52 @@
+"""Claves de idempotencia para efectos de Stripe (insertar primero, procesar después).
+
+``claim`` inserta la clave en un savepoint: el primero que la inserta procesa y cualquier
+duplicado (reentrega de Stripe, fallback de ``checkout_success`` en paralelo) se queda en un
+INSERT fallido contra el índice único. Llamado dentro de la transacción del handler, si el
+handler falla la clave se deshace con él y la siguiente entrega puede reintentarlo.
+
+Las ``Idempotency-Key`` que enviamos a Stripe llevan además un nonce aleatorio guardado en la
+fila (``stripe_key``). Así, entornos o bases reiniciadas que comparten cuenta de Stripe no
+coinciden en la misma clave dentro de su ventana de 24 h. Tras un error definitivo (4xx,
+``is_definitive``) ``discard_stripe_key`` descarta el nonce, porque Stripe repetiría el error
+durante esa ventana. Con errores de red, timeouts o 5xx el nonce se conserva: Stripe puede haber
+creado el objeto y el reintento debe repetir la misma clave para recibirlo en vez de duplicarlo.
+"""
+import uuid
+import stripe
+from django.db import IntegrityError, transaction
+from ..models import StripeIdempotencyKey
+
+
+def claim(key: str) -> bool:
+    """True si ``key`` no se había procesado (y queda reservada en la transacción actual)."""
+    try:
+        with transaction.atomic():
+            StripeIdempotencyKey.objects.create(key=key)
+    except IntegrityError:
+        return False
+    return True
+
+
+def stripe_key(instance, field: str, prefix: str) -> str:
+    """``prefix:<pk>:<nonce>`` con el nonce de ``instance.<field>``, creándolo si falta.
+
+    El nonce se fija con un UPDATE condicional: llamadas concurrentes para la misma fila acaban
+    con la misma clave y Stripe sigue deduplicándolas.
+    """
+    model = type(instance)
+    if getattr(instance, field) is None:
+        model.objects.filter(pk=instance.pk, **{f'{field}__isnull': True}).update(**{field: uuid.uuid4()})
+        setattr(instance, field, model.objects.filter(pk=instance.pk).values_list(field, flat=True).get())
+    return f'{prefix}:{instance.pk}:{getattr(instance, field)}'
+
+
+def discard_stripe_key(instance, field: str):
+    type(instance).objects.filter(pk=instance.pk).update(**{field: None})
+    setattr(instance, field, None)
+
+
+def is_definitive(exc: Exception) -> bool:
+    """Si Stripe rechazó la petición sin crear nada (4xx), salvo conflicto (409) y rate limit (429)."""
+    status = getattr(exc, 'http_status', None) if isinstance(exc, stripe.error.StripeError) else None
+    return status is not None and 400 <= status < 500 and status not in (409, 429)
@@ -0,0 +1,168 @@
+"""Ledger de créditos: cada movimiento es un UPDATE condicional de una sola sentencia.
+
+``balance = balance ± n`` (con ``WHERE balance >= n`` en los débitos) no necesita leer el saldo
+antes ni bloquear la fila: dos débitos concurrentes se serializan en el propio UPDATE y el que
+deja el saldo por debajo de cero simplemente no afecta filas. El UPDATE devuelve el id y el saldo
+nuevo con RETURNING (PostgreSQL, SQLite >= 3.35) y las filas de ledger/consumo se insertan en la
+misma transacción, así que un fallo al insertarlas deshace también el movimiento de saldo.
+"""
+import sqlite3
+from django.db import connection, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from apps.analytics.services.cache import bump_dates
+from ..models import CreditWallet, CreditTransaction, ConsumptionEvent
+from ..selectors import get_wallet_for_user
+from . import guarantees
+
+
+def _returning_supported():
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def apply_delta(column: str, value, delta: int, floor: int | None = None, held_delta: int = 0):
+    """``UPDATE wallet SET balance = balance + delta`` condicional; (wallet_id, balance) o None si no aplica.
+
+    ``floor`` exige saldo disponible (balance - held) suficiente; ``held_delta`` mueve a la vez los
+    créditos retenidos por reservas.
+    """
+    now = timezone.now()
+    if _returning_supported():
+        table = connection.ops.quote_name(CreditWallet._meta.db_table)
+        updated_at = CreditWallet._meta.get_field('updated_at').get_db_prep_value(now, connection)
+        sql = f'UPDATE {table} SET balance = balance + %s, held = held + %s, updated_at = %s WHERE {column} = %s'
+        params = [delta, held_delta, updated_at, value]
+        if floor is not None:
+            sql += ' AND balance - held >= %s'
+            params.append(floor)
+        with connection.cursor() as cursor:
+            cursor.execute(sql + ' RETURNING id, balance', params)
+            return cursor.fetchone()
+    qs = CreditWallet.objects.filter(**{column: value})
+    if floor is not None:
+        qs = qs.filter(balance__gte=F('held') + floor)
+    if not qs.update(balance=F('balance') + delta, held=F('held') + held_delta, updated_at=now):
+        return None
+    return CreditWallet.objects.filter(**{column: value}).values_list('id', 'balance').get()
+
+
+def _debit(column: str, value, amount: int, reason: str, metadata: dict | None, consumption: dict | None):
+    if amount <= 0:
+        raise ValueError('amount must be > 0')
+    metadata = metadata or {}
+    with transaction.atomic():
+        row = apply_delta(column, value, -amount, floor=amount)
+        if row is None:
+            from .reservations import release_expired
+            # Reservas vencidas que el sweeper aún no liberó no cuentan como retenidas
+            if release_expired(column, value):
+                row = apply_delta(column, value, -amount, floor=amount)
+        if row is None:
+            # Sin fila: saldo disponible insuficiente o wallet aún no creado (saldo 0)
+            raise ValueError('Insufficient credits')
+        wallet_id, balance = row
+        CreditTransaction.objects.create(
+            wallet_id=wallet_id, type=CreditTransaction.TYPE_DEBIT, signed_amount=-amount,
+            reason=reason, metadata=metadata,
+        )
+        if consumption is not None:
+            ConsumptionEvent.objects.create(wallet_id=wallet_id, credits_spent=amount, **consumption)
+    return balance
+
+
+def debit(user, amount: int, reason: str = '', metadata: dict | None = None, consumption: dict | None = None) -> int:
+    """Descuenta ``amount`` créditos del wallet de ``user`` y devuelve el saldo nuevo.
+
+    ``consumption`` (service_type, source, purchase_id...) registra además el ConsumptionEvent.
+    Lanza ValueError('Insufficient credits') sin tocar nada si el saldo no alcanza.
+    """
+    return _debit('user_id', user.pk, amount, reason, metadata, consumption)
+
+
+def debit_wallet(wallet_id: int, amount: int, reason: str = '', metadata: dict | None = None) -> int:
+    return _debit('id', wallet_id, amount, reason, metadata, None)
+
+
+def credit(user, amount: int, tx_type: str = CreditTransaction.TYPE_PURCHASE, reason: str = '', metadata: dict | None = None) -> int:
+    """Abona ``amount`` créditos (creando el wallet si hace falta) y devuelve el saldo nuevo."""
+    with transaction.atomic():
+        row = apply_delta('user_id', user.pk, amount)
+        if row is None:
+            get_wallet_for_user(user)
+            row = apply_delta('user_id', user.pk, amount)
+        wallet_id, balance = row
+        CreditTransaction.objects.create(
+            wallet_id=wallet_id, type=tx_type, signed_amount=amount, reason=reason, metadata=metadata or {},
+        )
+    return balance
+
+
+MODE_ATOMIC = 'atomic'
+MODE_BEST_EFFORT = 'best_effort'
+MODES = (MODE_ATOMIC, MODE_BEST_EFFORT)
+
+
+def debit_bulk(entries, mode: str = MODE_ATOMIC):
+    """Débitos en lote con un número fijo de sentencias, sea cual sea el tamaño del lote.
+
+    ``entries``: dicts con user_id, amount, reason, metadata y consumption (como en ``debit``).
+    Los wallets implicados se bloquean en un SELECT, cada entrada se valida contra el saldo
+    disponible en memoria (en orden), y saldos, ledger y consumos se escriben con un UPDATE y dos bulk_create.
+    En modo atomic cualquier entrada sin saldo anula el lote (ValueError); en best_effort se
+    omite esa entrada y se siguen aplicando las demás.
+
+    Devuelve (resultados por entrada, {user_id: saldo final}).
+    """
+    if mode not in MODES:
+        raise ValueError(f'Unknown mode: {mode}')
+    if any(e['amount'] <= 0 for e in entries):
+        raise ValueError('amount must be > 0')
+    with transaction.atomic():
+        wallets = lock_wallets({e['user_id'] for e in entries})
+        balances = {uid: w.balance for uid, w in wallets.items()}
+        results, txs, events = [], [], []
+        for index, e in enumerate(entries):
+            wallet = wallets.get(e['user_id'])
+            if wallet is None or balances[e['user_id']] - wallet.held < e['amount']:
+                if mode == MODE_ATOMIC:
+                    raise ValueError(f'Insufficient credits (item {index})')
+                results.append({'index': index, 'ok': False, 'error': 'Insufficient credits'})
+                continue
+            balances[e['user_id']] -= e['amount']
+            results.append({'index': index, 'ok': True})
+            txs.append(CreditTransaction(
+                wallet_id=wallet.pk, type=CreditTransaction.TYPE_DEBIT, signed_amount=-e['amount'],
+                reason=e.get('reason', ''), metadata=e.get('metadata') or {},
+            ))
+            if e.get('consumption') is not None:
+                events.append(ConsumptionEvent(wallet_id=wallet.pk, credits_spent=e['amount'], **e['consumption']))
+        write_debits({w.pk: w.balance - balances[uid] for uid, w in wallets.items() if w.balance != balances[uid]}, txs, events)
+    return results, balances
+
+
+def lock_wallets(user_ids):
+    """{user_id: wallet} con SELECT ... FOR UPDATE; llamar dentro de ``transaction.atomic()``."""
+    return {w.user_id: w for w in CreditWallet.objects.select_for_update().filter(user_id__in=user_ids)}
+
+
+def write_debits(spent, txs, events, at=None):
+    """Escribe débitos ya validados contra los wallets de ``lock_wallets``.
+
+    ``spent`` {wallet_id: créditos} va en un solo UPDATE con Case; ``txs`` (CreditTransaction) y
+    ``events`` (ConsumptionEvent) en un bulk_create cada uno.
+    """
+    if not spent:
+        return
+    at = at or timezone.now()
+    CreditWallet.objects.filter(pk__in=spent).update(
+        balance=Case(*[When(pk=wid, then=F('balance') - n) for wid, n in spent.items()]),
+        updated_at=at,
+    )
+    CreditTransaction.objects.bulk_create(txs)
+    ConsumptionEvent.objects.bulk_create(events)
+    # bulk_create no emite post_save: contadores de garantía en dos sentencias por lote
+    guarantees.record_usage([(ev.wallet_id, ev.purchase_id, ev.credits_spent) for ev in events], at=at)
+    # ni invalida la caché de analytics del día (lo hace el post_save en los débitos sueltos)
+    bump_dates([timezone.localdate(at)])
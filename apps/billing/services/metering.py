@@ -0,0 +1,212 @@
+"""Consumo medido en buffer: servicios de alta frecuencia (mensajes, minutos de llamada) sin un débito por evento.
+
+``record()`` solo suma en memoria por (usuario, servicio, source, compra). El buffer se vuelca
+cada ``BILLING_METER_FLUSH_SECONDS`` (hilo en segundo plano) o al llegar a
+``BILLING_METER_FLUSH_EVENTS`` eventos, y al salir el proceso. Cada volcado es una transacción
+con un número fijo de sentencias y el mismo núcleo que ``ledger.debit_bulk``
+(``ledger.lock_wallets`` y ``ledger.write_debits``): wallets bloqueados en un SELECT, un UPDATE
+de saldos, un bulk_create de ``CreditTransaction`` (una por wallet) y otro de
+``ConsumptionEvent`` (una por clave agregada). Si el volcado falla, el lote vuelve al buffer
+para el siguiente intento; una caída del proceso pierde como mucho la ventana sin volcar.
+
+``BILLING_METER_OVERDRAFT`` decide qué pasa si el consumo supera el saldo disponible:
+``clamp`` (por defecto) cobra hasta el disponible y anota el resto como ``unbilled`` en la
+metadata; ``allow`` cobra todo y deja el saldo en negativo.
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from ..models import ConsumptionEvent, CreditTransaction
+from . import ledger
+from .service_types import get_service_type
+
+logger = logging.getLogger(__name__)
+
+OVERDRAFT_CLAMP = 'clamp'
+OVERDRAFT_ALLOW = 'allow'
+OVERDRAFT_MODES = (OVERDRAFT_CLAMP, OVERDRAFT_ALLOW)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def flush_usage(usage, overdraft: str = OVERDRAFT_CLAMP, at=None):
+    """Aplica ``usage`` {(user_id, service_type_id, source, purchase_id): [créditos, eventos, primero, último]}.
+
+    Devuelve {user_id: (cobrado, sin cobrar)}. Los usuarios sin wallet no se cobran.
+    """
+    if overdraft not in OVERDRAFT_MODES:
+        raise ValueError(f'Unknown overdraft mode: {overdraft}')
+    at = at or timezone.now()
+    per_user = defaultdict(list)
+    for key, value in usage.items():
+        per_user[key[0]].append((key, value))
+    out = {}
+    with transaction.atomic():
+        wallets = ledger.lock_wallets(per_user)
+        charges, txs, events = {}, [], []
+        for user_id, items in per_user.items():
+            wallet = wallets.get(user_id)
+            if wallet is None:
+                logger.warning('metering: user %s has no wallet, dropping %s credits', user_id, sum(v[0] for _, v in items))
+                continue
+            room = max(0, wallet.available) if overdraft == OVERDRAFT_CLAMP else None
+            charged = unbilled = 0
+            by_service = defaultdict(int)
+            for (_, service_type_id, source, purchase_id), (credits, count, first_at, last_at) in items:
+                take = credits if room is None else min(credits, room - charged)
+                charged += take
+                unbilled += credits - take
+                metadata = {'metered_events': count, 'first_at': first_at.isoformat(), 'last_at': last_at.isoformat()}
+                if take < credits:
+                    metadata['unbilled'] = credits - take
+                if take:
+                    by_service[service_type_id] += take
+                    events.append(ConsumptionEvent(
+                        wallet_id=wallet.pk, service_type_id=service_type_id, credits_spent=take,
+                        source=source, purchase_id=purchase_id, metadata=metadata,
+                    ))
+            out[user_id] = (charged, unbilled)
+            if unbilled:
+                logger.warning('metering: wallet %s short by %s credits', wallet.pk, unbilled)
+            if charged:
+                charges[wallet.pk] = charged
+                metadata = {'metered': {str(k): v for k, v in by_service.items()}}
+                if unbilled:
+                    metadata['unbilled'] = unbilled
+                txs.append(CreditTransaction(
+                    wallet_id=wallet.pk, type=CreditTransaction.TYPE_DEBIT, signed_amount=-charged,
+                    reason='Metered usage', metadata=metadata,
+                ))
+        ledger.write_debits(charges, txs, events, at=at)
+    return out
+
+
+class Meter:
+    """Buffer de consumo de un proceso; seguro entre hilos."""
+
+    def __init__(self, flush_seconds=None, flush_events=None, overdraft=None):
+        self.flush_seconds = float(flush_seconds if flush_seconds is not None else _setting('BILLING_METER_FLUSH_SECONDS', 5))
+        self.flush_events = int(flush_events if flush_events is not None else _setting('BILLING_METER_FLUSH_EVENTS', 1000))
+        self.overdraft = overdraft or _setting('BILLING_METER_OVERDRAFT', OVERDRAFT_CLAMP)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = {}
+        self._events = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, user, service_code: str, credits: int | None = None, source: str = '', purchase_id=None):
+        """Suma un uso al buffer; ``credits`` por defecto es el coste del servicio."""
+        st = get_service_type(service_code)
+        credits = st.default_cost_credits if credits is None else credits
+        if credits <= 0:
+            raise ValueError('credits must be > 0')
+        now = timezone.now()
+        key = (getattr(user, 'pk', user), st.pk, source, purchase_id)
+        with self._lock:
+            entry = self._buffer.get(key)
+            if entry is None:
+                self._buffer[key] = [credits, 1, now, now]
+            else:
+                entry[0] += credits
+                entry[1] += 1
+                entry[3] = now
+            self._events += 1
+            full = self._events >= self.flush_events
+        self._ensure_thread()
+        if full:
+            try:
+                self.flush()
+            except Exception:
+                # El lote sigue en el buffer; lo reintenta el hilo o el siguiente volcado
+                logger.exception('metering: flush failed, %s events pending', self.pending)
+
+    @property
+    def pending(self):
+        with self._lock:
+            return self._events
+
+    def _take(self):
+        with self._lock:
+            batch, self._buffer, self._events = self._buffer, {}, 0
+        return batch
+
+    def _restore(self, batch):
+        with self._lock:
+            for key, (credits, count, first_at, last_at) in batch.items():
+                entry = self._buffer.get(key)
+                if entry is None:
+                    self._buffer[key] = [credits, count, first_at, last_at]
+                else:
+                    entry[0] += credits
+                    entry[1] += count
+                    entry[2] = min(entry[2], first_at)
+                self._events += count
+
+    def flush(self):
+        """Vuelca el buffer; devuelve el resultado de ``flush_usage`` ({} si estaba vacío)."""
+        with self._flush_lock:
+            batch = self._take()
+            if not batch:
+                return {}
+            try:
+                return flush_usage(batch, self.overdraft)
+            except Exception:
+                # El lote vuelve al buffer: solo una caída del proceso lo pierde
+                self._restore(batch)
+                raise
+
+    def _ensure_thread(self):
+        if self._thread is not None or self.flush_seconds <= 0:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='billing-meter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_seconds):
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('metering: flush failed, retrying in %ss', self.flush_seconds)
+
+    def close(self):
+        """Detiene el hilo y vuelca lo pendiente."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 5)
+            self._thread = None
+        try:
+            self.flush()
+        except Exception:
+            logger.exception('metering: final flush failed, %s events lost', self.pending)
+
+
+_state = {'meter': None}
+_state_lock = threading.Lock()
+
+
+def meter() -> Meter:
+    """Meter del proceso, creado al primer uso y volcado al salir."""
+    if _state['meter'] is None:
+        with _state_lock:
+            if _state['meter'] is None:
+                _state['meter'] = Meter()
+                atexit.register(_state['meter'].close)
+    return _state['meter']
+
+
+def record(user, service_code: str, credits: int | None = None, source: str = '', purchase_id=None):
+    meter().record(user, service_code, credits, source, purchase_id)
+
+
+def flush():
+    return meter().flush()
@@ -0,0 +1,138 @@
+"""Reservas de créditos (hold / capture / release) para servicios de larga duración.
+
+Reservar sube ``CreditWallet.held`` con un UPDATE condicional sobre el saldo disponible
+(balance - held), así que no hay transacción ni lock abiertos mientras dura el servicio. Cada
+transición de la reserva es un UPDATE condicional sobre ``status``: solo gana la primera de
+capture / release / expiración concurrentes y el wallet se ajusta una única vez.
+
+Las reservas vencidas dejan de contar aunque el sweeper (``expire_credit_reservations``) aún no
+haya pasado: el saldo disponible las descuenta y una reserva o un débito que no caben liberan
+primero las vencidas del wallet y reintentan.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+from ..models import CreditReservation, CreditTransaction, CreditWallet, ConsumptionEvent
+from . import ledger
+from .service_types import get_service_type
+
+
+def _default_ttl():
+    return int(getattr(settings, 'BILLING_RESERVATION_TTL_SECONDS', 3600))
+
+
+def hold(user, service_code: str, amount: int, ttl_seconds: int | None = None, reference: str = '', metadata: dict | None = None):
+    """Retiene ``amount`` créditos de ``user``; ValueError('Insufficient credits') si no hay disponible."""
+    if amount <= 0:
+        raise ValueError('amount must be > 0')
+    st = get_service_type(service_code)
+    with transaction.atomic():
+        row = ledger.apply_delta('user_id', user.pk, 0, floor=amount, held_delta=amount)
+        if row is None and release_expired('user_id', user.pk):
+            row = ledger.apply_delta('user_id', user.pk, 0, floor=amount, held_delta=amount)
+        if row is None:
+            raise ValueError('Insufficient credits')
+        return CreditReservation.objects.create(
+            wallet_id=row[0],
+            service_type=st,
+            amount=amount,
+            reference=reference,
+            metadata=metadata or {},
+            expires_at=timezone.now() + timedelta(seconds=ttl_seconds or _default_ttl()),
+        )
+
+
+def _transition(reservation: CreditReservation, status: str) -> bool:
+    # Solo una transición gana: las demás no encuentran la reserva en HELD
+    won = CreditReservation.objects.filter(pk=reservation.pk, status=CreditReservation.STATUS_HELD).update(
+        status=status, updated_at=timezone.now(),
+    )
+    if won:
+        reservation.status = status
+    return bool(won)
+
+
+def capture(reservation: CreditReservation) -> int:
+    """Convierte la reserva en débito (ledger + consumo) y devuelve el saldo nuevo."""
+    with transaction.atomic():
+        if not _transition(reservation, CreditReservation.STATUS_CAPTURED):
+            raise ValueError('Reservation is not held')
+        _, balance = ledger.apply_delta('id', reservation.wallet_id, -reservation.amount, held_delta=-reservation.amount)
+        code = reservation.service_type.code
+        CreditTransaction.objects.create(
+            wallet_id=reservation.wallet_id, type=CreditTransaction.TYPE_DEBIT, signed_amount=-reservation.amount,
+            reason=f'Consume {code}', metadata={**reservation.metadata, 'reservation_id': reservation.pk},
+        )
+        ConsumptionEvent.objects.create(
+            wallet_id=reservation.wallet_id,
+            service_type_id=reservation.service_type_id,
+            credits_spent=reservation.amount,
+            source=reservation.metadata.get('source', ''),
+            purchase_id=reservation.metadata.get('purchase_id'),
+        )
+    return balance
+
+
+def release(reservation: CreditReservation, status: str = CreditReservation.STATUS_RELEASED) -> bool:
+    """Devuelve los créditos retenidos; False si la reserva ya no estaba en HELD."""
+    with transaction.atomic():
+        if not _transition(reservation, status):
+            return False
+        ledger.apply_delta('id', reservation.wallet_id, 0, held_delta=-reservation.amount)
+    return True
+
+
+def held_for(reference: str):
+    return CreditReservation.objects.filter(reference=reference, status=CreditReservation.STATUS_HELD).select_related('service_type').first()
+
+
+def _release_batch(qs, status: str) -> int:
+    """Libera en bloque las reservas de ``qs`` (en HELD) con un UPDATE de wallets por lote."""
+    with transaction.atomic():
+        rows = list(
+            qs.filter(status=CreditReservation.STATUS_HELD)
+            .select_for_update(skip_locked=True)
+            .values_list('id', 'wallet_id', 'amount')
+        )
+        if not rows:
+            return 0
+        CreditReservation.objects.filter(pk__in=[r[0] for r in rows]).update(status=status, updated_at=timezone.now())
+        per_wallet = {}
+        for _, wallet_id, amount in rows:
+            per_wallet[wallet_id] = per_wallet.get(wallet_id, 0) + amount
+        CreditWallet.objects.filter(pk__in=per_wallet).update(
+            held=Case(*[When(pk=wid, then=F('held') - n) for wid, n in per_wallet.items()]),
+            updated_at=timezone.now(),
+        )
+    return len(rows)
+
+
+def release_references(references, status: str = CreditReservation.STATUS_RELEASED) -> int:
+    return _release_batch(CreditReservation.objects.filter(reference__in=list(references)), status)
+
+
+def release_expired(column: str, value, now=None) -> int:
+    """Libera ya las reservas vencidas de un wallet (``column`` 'id' o 'user_id'), sin esperar al sweeper."""
+    now = now or timezone.now()
+    qs = CreditReservation.objects.filter(**{f'wallet__{column}': value}, expires_at__lte=now)
+    return _release_batch(qs, CreditReservation.STATUS_EXPIRED)
+
+
+def expire_reservations(now=None, batch_size: int = 500) -> int:
+    """Marca EXPIRED y libera las reservas vencidas, por lotes sobre el índice (status, expires_at)."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        ids = list(
+            CreditReservation.objects.filter(status=CreditReservation.STATUS_HELD, expires_at__lte=now)
+            .order_by('expires_at').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return total
+        released = _release_batch(CreditReservation.objects.filter(pk__in=ids), CreditReservation.STATUS_EXPIRED)
+        total += released
+        if not released:
+            # Lote entero bloqueado por otro sweeper
+            return total
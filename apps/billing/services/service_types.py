@@ -0,0 +1,74 @@
+"""Registro en memoria (por proceso) de ServiceType por código.
+
+Se carga entero en la primera consulta y se sirve desde memoria; los signals de ServiceType lo
+recargan en este proceso al confirmar la transacción (nunca con filas sin confirmar, que otro hilo
+podría ver y que un rollback dejaría colgando) y ``BILLING_SERVICE_TYPE_TTL`` acota cuánto tarda en
+ver cambios hechos desde otros procesos (0 = sin caché). Un código desconocido se da de alta con un
+solo INSERT.
+"""
+import time
+from django.conf import settings
+from django.db import transaction
+from ..models import ServiceType
+
+_state = {'by_code': None, 'loaded_at': 0.0}
+
+
+def _ttl():
+    return float(getattr(settings, 'BILLING_SERVICE_TYPE_TTL', 300))
+
+
+def default_cost(code: str) -> int:
+    return int(getattr(settings, 'BILLING_DEFAULT_EXAM_COST_CREDITS', 1)) if code == 'exam' else 1
+
+
+def _registry():
+    by_code = _state['by_code']
+    if by_code is None or time.monotonic() - _state['loaded_at'] >= _ttl():
+        by_code = {st.code: st for st in ServiceType.objects.all()}
+        # Se reemplaza el dict entero: los lectores de otros hilos nunca ven uno a medias
+        _state['by_code'], _state['loaded_at'] = by_code, time.monotonic()
+    return by_code
+
+
+def get_service_types(codes):
+    """{código: ServiceType} para ``codes``, creando los que falten."""
+    registry = _registry()
+    out = {}
+    for code in set(codes):
+        st = registry.get(code)
+        if st is None:
+            # El post_save del alta recarga el registro cuando la transacción confirma
+            st, _ = ServiceType.objects.get_or_create(
+                code=code, defaults={'label': code.capitalize(), 'default_cost_credits': default_cost(code)},
+            )
+        out[code] = st
+    return out
+
+
+def is_known(code: str) -> bool:
+    """Si ``code`` ya existe, sin darlo de alta."""
+    return code in _registry()
+
+
+def get_service_type(code: str) -> ServiceType:
+    return get_service_types([code])[code]
+
+
+def service_cost(code: str) -> int:
+    """Coste en créditos de un servicio (``default_cost_credits`` del ServiceType)."""
+    return get_service_type(code).default_cost_credits
+
+
+def invalidate(*args, **kwargs):
+    _state['by_code'] = None
+
+
+def _reload():
+    invalidate()
+    _registry()
+
+
+def on_service_type_changed(sender, instance, **kwargs):
+    # Dentro de una transacción se espera al commit; si hay rollback el registro no cambia
+    transaction.on_commit(_reload)
@@ -0,0 +1,74 @@
+"""Caché con TTL de objetos de Stripe que apenas cambian.
+
+Objetos de cuenta (configuración del portal, precios, productos) e ids de customer por usuario
+se guardan en la caché de Django bajo ``billing:stripe:<namespace>:<id>`` durante
+``BILLING_STRIPE_CACHE_TTL`` segundos, así que abrir el portal cuesta una sola llamada a Stripe.
+``invalidate`` los descarta antes (p. ej. cuando Stripe rechaza una configuración o cambia el
+perfil). Los aciertos y fallos se cuentan por namespace para ``stats``.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+PREFIX = 'billing:stripe:'
+NAMESPACES = ('portal_configuration', 'customer', 'price', 'product')
+
+
+def _ttl():
+    return int(getattr(settings, 'BILLING_STRIPE_CACHE_TTL', 3600))
+
+
+def _key(namespace: str, object_id) -> str:
+    return f'{PREFIX}{namespace}:{object_id}'
+
+
+def _count(namespace: str, stat: str):
+    key = f'{PREFIX}stats:{namespace}:{stat}'
+    if not cache.add(key, 1, None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+
+def get_or_fetch(namespace: str, object_id, fetch):
+    """Valor cacheado o ``fetch()``; un None de ``fetch`` no se cachea (se reintenta la próxima vez)."""
+    key = _key(namespace, object_id)
+    value = cache.get(key)
+    if value is not None:
+        _count(namespace, 'hits')
+        return value
+    _count(namespace, 'misses')
+    value = fetch()
+    if value is not None:
+        cache.set(key, value, _ttl())
+    return value
+
+
+def put(namespace: str, object_id, value):
+    cache.set(_key(namespace, object_id), value, _ttl())
+
+
+def invalidate(namespace: str, object_id):
+    cache.delete(_key(namespace, object_id))
+
+
+def retrieve(resource, object_id: str, namespace: str):
+    """``resource.retrieve(object_id)`` cacheado como dict (p. ej. ``stripe.Price``, 'price')."""
+    return get_or_fetch(namespace, object_id, lambda: resource.retrieve(object_id).to_dict())
+
+
+def stats():
+    keys = [f'{PREFIX}stats:{ns}:{s}' for ns in NAMESPACES for s in ('hits', 'misses')]
+    values = cache.get_many(keys)
+    out = {}
+    for ns in NAMESPACES:
+        hits = int(values.get(f'{PREFIX}stats:{ns}:hits', 0))
+        misses = int(values.get(f'{PREFIX}stats:{ns}:misses', 0))
+        total = hits + misses
+        out[ns] = {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else 0.0}
+    return out
+
+
+def invalidate_customer(sender, instance, **kwargs):
+    # post_save/post_delete del perfil: el id de customer pudo cambiar
+    invalidate('customer', instance.user_id)
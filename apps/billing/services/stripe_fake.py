@@ -0,0 +1,304 @@
+"""Stand-in local de la API de Stripe para pruebas de carga y latencia sin red.
+
+``FakeStripe`` es una app WSGI con la parte de la API que usa billing (customers, checkout
+sessions, configuraciones y sesiones del portal, refunds) y entrega webhooks firmados igual que
+Stripe, así que ``stripe.Webhook.construct_event`` los acepta. Se selecciona con
+``STRIPE_API_BASE`` (``stripe_http.configure`` apunta ahí la librería). ``latency_ms``/``jitter_ms``
+y ``error_rate`` simulan una API lenta o inestable: los 500 inyectados no se guardan en la caché
+de Idempotency-Key, de modo que el reintento de la librería puede salir bien.
+
+Rutas de control (no existen en Stripe): ``POST /_fake/checkout/sessions/<id>/complete`` simula
+el pago y entrega ``checkout.session.completed``; ``POST /_fake/subscriptions/<id>/invoice``
+entrega ``invoice.paid``.
+"""
+import hashlib
+import hmac
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qsl
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+API_VERSION = '2024-06-20'
+
+
+def new_id(prefix: str) -> str:
+    return f'{prefix}_{uuid.uuid4().hex[:24]}'
+
+
+def sign(payload: bytes, secret: str, timestamp: int | None = None) -> str:
+    """Cabecera Stripe-Signature (esquema v1: HMAC-SHA256 de ``<t>.<payload>``)."""
+    timestamp = int(timestamp or time.time())
+    mac = hmac.new(secret.encode(), f'{timestamp}.'.encode() + payload, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={mac}'
+
+
+def _form(body: bytes) -> dict:
+    """Cuerpo form-encoded de stripe-python (``metadata[user_id]=1``) a dict anidado simple."""
+    out = {}
+    for key, value in parse_qsl(body.decode(), keep_blank_values=True):
+        parts = re.findall(r'[^\[\]]+', key)
+        node = out
+        for part in parts[:-1]:
+            node = node.setdefault(part, {})
+        node[parts[-1]] = value
+    return out
+
+
+class _Error(Exception):
+    def __init__(self, status: int, message: str, type_: str = 'invalid_request_error'):
+        super().__init__(message)
+        self.status, self.type = status, type_
+
+
+class FakeStripe:
+    """App WSGI con estado en memoria (protegido por un lock) que imita la API de Stripe."""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 webhook_secret: str = '', deliver=None, base_url: str = '', seed: int | None = None):
+        self.latency_ms, self.jitter_ms, self.error_rate = latency_ms, jitter_ms, error_rate
+        self.webhook_secret = webhook_secret
+        # deliver(payload: bytes, signature: str) -> status; sin él los eventos quedan en ``outbox``
+        self.deliver = deliver
+        self.base_url = base_url
+        self.outbox = []
+        self.delivery_ms = []
+        self.requests = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._objects = {}
+        self._idempotent = {}
+        self._routes = [
+            ('POST', r'/v1/customers', self._create_customer),
+            ('GET', r'/v1/customers/(?P<id>[^/]+)', self._retrieve),
+            ('POST', r'/v1/checkout/sessions', self._create_checkout_session),
+            ('GET', r'/v1/checkout/sessions/(?P<id>[^/]+)', self._retrieve),
+            ('GET', r'/v1/billing_portal/configurations', self._list_portal_configurations),
+            ('POST', r'/v1/billing_portal/configurations', self._create_portal_configuration),
+            ('GET', r'/v1/billing_portal/configurations/(?P<id>[^/]+)', self._retrieve),
+            ('POST', r'/v1/billing_portal/sessions', self._create_portal_session),
+            ('POST', r'/v1/refunds', self._create_refund),
+            ('POST', r'/_fake/checkout/sessions/(?P<id>[^/]+)/complete', self._complete_checkout),
+            ('POST', r'/_fake/subscriptions/(?P<id>[^/]+)/invoice', self._pay_invoice),
+        ]
+
+    # -- WSGI -------------------------------------------------------------------------------
+
+    def __call__(self, environ, start_response):
+        method = environ['REQUEST_METHOD']
+        path = environ.get('PATH_INFO', '')
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else b''
+        params = _form(body) if method == 'POST' else dict(parse_qsl(environ.get('QUERY_STRING', '')))
+        with self._lock:
+            self.requests += 1
+        self._sleep()
+        status, data = self._dispatch(method, path, params, environ.get('HTTP_IDEMPOTENCY_KEY'))
+        payload = json.dumps(data).encode()
+        start_response(f'{status} {"OK" if status < 400 else "Error"}', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(payload))),
+            ('Request-Id', new_id('req')),
+        ])
+        return [payload]
+
+    def _sleep(self):
+        delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _dispatch(self, method, path, params, idempotency_key):
+        if not path.startswith('/_fake/') and self.error_rate and self._rng.random() < self.error_rate:
+            return 500, {'error': {'type': 'api_error', 'message': 'Injected error'}}
+        cache_key = (path, idempotency_key) if method == 'POST' and idempotency_key else None
+        if cache_key:
+            with self._lock:
+                if cache_key in self._idempotent:
+                    return self._idempotent[cache_key]
+        for route_method, pattern, handler in self._routes:
+            match = re.fullmatch(pattern, path)
+            if match and route_method == method:
+                try:
+                    result = 200, handler(params, **match.groupdict())
+                except _Error as e:
+                    result = e.status, {'error': {'type': e.type, 'message': str(e)}}
+                break
+        else:
+            result = 404, {'error': {'type': 'invalid_request_error', 'message': f'Unrecognized request URL ({method} {path})'}}
+        if cache_key and result[0] < 500:
+            with self._lock:
+                self._idempotent.setdefault(cache_key, result)
+                result = self._idempotent[cache_key]
+        return result
+
+    # -- objetos ----------------------------------------------------------------------------
+
+    def _store(self, obj: dict) -> dict:
+        with self._lock:
+            self._objects[obj['id']] = obj
+        return obj
+
+    def get(self, object_id: str) -> dict:
+        with self._lock:
+            obj = self._objects.get(object_id)
+        if obj is None:
+            raise _Error(404, f'No such object: {object_id}')
+        return obj
+
+    def _retrieve(self, params, id):
+        return self.get(id)
+
+    def _create_customer(self, params):
+        return self._store({
+            'id': new_id('cus'), 'object': 'customer', 'email': params.get('email'), 'name': params.get('name'),
+            'metadata': params.get('metadata', {}), 'created': int(time.time()),
+        })
+
+    def _create_checkout_session(self, params):
+        if not params.get('customer') and not params.get('customer_email'):
+            raise _Error(400, 'Missing customer')
+        session_id = new_id('cs_test')
+        mode = params.get('mode', 'payment')
+        return self._store({
+            'id': session_id, 'object': 'checkout.session', 'mode': mode, 'status': 'open', 'payment_status': 'unpaid',
+            'customer': params.get('customer'), 'metadata': params.get('metadata', {}),
+            'line_items': params.get('line_items', {}),
+            'success_url': params.get('success_url', '').replace('{CHECKOUT_SESSION_ID}', session_id),
+            'cancel_url': params.get('cancel_url'),
+            'url': f'{self.base_url}/_fake/pay/{session_id}',
+            'payment_intent': None, 'subscription': None, 'created': int(time.time()),
+        })
+
+    def _list_portal_configurations(self, params):
+        with self._lock:
+            configs = [o for o in self._objects.values() if o['object'] == 'billing_portal.configuration']
+        limit = int(params.get('limit', 10))
+        return {'object': 'list', 'data': configs[:limit], 'has_more': len(configs) > limit, 'url': '/v1/billing_portal/configurations'}
+
+    def _create_portal_configuration(self, params):
+        return self._store({
+            'id': new_id('bpc'), 'object': 'billing_portal.configuration', 'active': True, 'is_default': True,
+            'business_profile': params.get('business_profile', {}), 'features': params.get('features', {}),
+        })
+
+    def _create_portal_session(self, params):
+        customer = self.get(params.get('customer', ''))
+        configuration = params.get('configuration')
+        if configuration:
+            self.get(configuration)
+        else:
+            with self._lock:
+                has_default = any(o['object'] == 'billing_portal.configuration' for o in self._objects.values())
+            if not has_default:
+                raise _Error(400, 'No configuration provided and your test mode default configuration has not been created.')
+        session_id = new_id('bps')
+        return self._store({
+            'id': session_id, 'object': 'billing_portal.session', 'customer': customer['id'],
+            'configuration': configuration, 'return_url': params.get('return_url'),
+            'url': f'{self.base_url}/_fake/portal/{session_id}',
+        })
+
+    def _create_refund(self, params):
+        intent = params.get('payment_intent')
+        with self._lock:
+            paid = any(o.get('payment_intent') == intent for o in self._objects.values() if o['object'] == 'checkout.session')
+        if not paid:
+            raise _Error(404, f'No such payment_intent: {intent}')
+        return self._store({
+            'id': new_id('re'), 'object': 'refund', 'payment_intent': intent,
+            'amount': int(params.get('amount') or 0), 'status': 'succeeded', 'created': int(time.time()),
+        })
+
+    # -- control y webhooks -----------------------------------------------------------------
+
+    def _complete_checkout(self, params, id):
+        session = self.get(id)
+        with self._lock:
+            if session['status'] == 'open':
+                session.update(status='complete', payment_status='paid', payment_intent=new_id('pi'))
+                if session['mode'] == 'subscription':
+                    session['subscription'] = new_id('sub')
+        self.emit('checkout.session.completed', dict(session))
+        return session
+
+    def _pay_invoice(self, params, id):
+        invoice = self._store({
+            'id': new_id('in'), 'object': 'invoice', 'subscription': id, 'status': 'paid',
+            'amount_paid': int(params.get('amount_paid') or 0), 'created': int(time.time()),
+        })
+        self.emit('invoice.paid', invoice)
+        return invoice
+
+    def emit(self, event_type: str, obj: dict) -> dict:
+        """Construye el evento, lo firma y lo entrega (o lo deja en ``outbox``)."""
+        event = self._store({
+            'id': new_id('evt'), 'object': 'event', 'type': event_type, 'api_version': API_VERSION,
+            'created': int(time.time()), 'livemode': False, 'data': {'object': obj},
+        })
+        payload = json.dumps(event).encode()
+        signature = sign(payload, self.webhook_secret)
+        if self.deliver is None:
+            with self._lock:
+                self.outbox.append((payload, signature))
+            return event
+        t0 = time.perf_counter()
+        self.deliver(payload, signature)
+        with self._lock:
+            self.delivery_ms.append((time.perf_counter() - t0) * 1000)
+        return event
+
+
+def http_deliverer(url: str, timeout: float = 10):
+    """Entrega por HTTP a un endpoint de webhooks (p. ej. el runserver local)."""
+    import requests
+    session = requests.Session()
+
+    def deliver(payload: bytes, signature: str):
+        return session.post(url, data=payload, timeout=timeout, headers={
+            'Content-Type': 'application/json', 'Stripe-Signature': signature,
+        }).status_code
+    return deliver
+
+
+def django_deliverer():
+    """Entrega en proceso a ``stripe_webhook`` (firma verificada incluida), sin servidor HTTP."""
+    from django.db import close_old_connections
+    from django.test import RequestFactory
+    from ..webhooks import stripe_webhook
+    factory = RequestFactory()
+
+    def deliver(payload: bytes, signature: str):
+        request = factory.post('/billing/webhooks/stripe/', data=payload, content_type='application/json',
+                               HTTP_STRIPE_SIGNATURE=signature)
+        try:
+            return stripe_webhook(request).status_code
+        finally:
+            close_old_connections()
+    return deliver
+
+
+class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(app: FakeStripe, host: str = '127.0.0.1', port: int = 0, background: bool = True):
+    """Prepara el servidor de ``app``; devuelve (servidor, base_url).
+
+    Con ``background`` ya está atendiendo en un hilo (parar con ``server.shutdown()``); si no, el
+    llamador ejecuta ``server.serve_forever()``.
+    """
+    server = make_server(host, port, app, server_class=_ThreadingWSGIServer, handler_class=_QuietHandler)
+    base_url = f'http://{host}:{server.server_port}'
+    app.base_url = app.base_url or base_url
+    if background:
+        threading.Thread(target=server.serve_forever, name='stripe-fake', daemon=True).start()
+    return server, base_url
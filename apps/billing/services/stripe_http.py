@@ -0,0 +1,162 @@
+"""Cliente HTTP de Stripe del proceso: pool keep-alive, timeouts acotados, reintentos y latencias.
+
+``configure()`` instala un único ``RequestsClient`` como ``stripe.default_http_client``. Cada
+hilo usa su propia ``requests.Session`` con un pool de ``STRIPE_HTTP_POOL_SIZE`` conexiones, así
+que las llamadas reutilizan la conexión TLS en vez de negociarla cada vez. Los reintentos son los
+de la librería (``stripe.max_network_retries``): backoff exponencial con jitter, respetan
+``Retry-After`` y reenvían la misma ``Idempotency-Key`` que la librería pone en cada POST. Cada
+intento HTTP se cronometra y se acumula por recurso en memoria del proceso; los contadores se
+suman a la caché de Django como mucho cada ``STRIPE_HTTP_STATS_FLUSH_SECONDS`` (y al pedir
+``stats`` o salir el proceso), así que una llamada a Stripe no paga idas y vueltas a la caché.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+STATS_PREFIX = 'billing:stripe:http:'
+# Límites superiores (ms) del histograma de latencia; el último cubre el resto
+BUCKETS_MS = (100, 250, 500, 1000, 2500, 5000)
+RESOURCES_KEY = f'{STATS_PREFIX}resources'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _new_session():
+    size = int(_setting('STRIPE_HTTP_POOL_SIZE', 10))
+    session = requests.Session()
+    # Sin reintentos a nivel de urllib3: los hace la librería de Stripe con su Idempotency-Key
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def resource_of(url: str) -> str:
+    """'https://api.stripe.com/v1/checkout/sessions/cs_1' -> 'checkout'."""
+    path = url.split('://', 1)[-1].split('?', 1)[0]
+    parts = [p for p in path.split('/')[1:] if p]
+    if parts and parts[0] in ('v1', 'v2'):
+        parts = parts[1:]
+    return parts[0] if parts else 'root'
+
+
+def _incr(key: str, n: int = 1):
+    if not cache.add(key, n, None):
+        try:
+            cache.incr(key, n)
+        except ValueError:
+            cache.set(key, n, None)
+
+
+_pending = defaultdict(int)
+_pending_lock = threading.Lock()
+_flush_state = {'at': time.monotonic(), 'known': set()}
+
+
+def record(method: str, url: str, elapsed_ms: int, status: int | None):
+    resource = resource_of(url)
+    bucket = next((b for b in BUCKETS_MS if elapsed_ms <= b), 'inf')
+    failed = status is None or status >= 500 or status == 429
+    with _pending_lock:
+        _pending[(resource, 'count')] += 1
+        _pending[(resource, 'total_ms')] += elapsed_ms
+        _pending[(resource, f'le_{bucket}')] += 1
+        if failed:
+            _pending[(resource, 'errors')] += 1
+        due = time.monotonic() - _flush_state['at'] >= float(_setting('STRIPE_HTTP_STATS_FLUSH_SECONDS', 10))
+    logger.debug('stripe %s %s -> %s in %sms', method.upper(), resource, status, elapsed_ms)
+    if due:
+        flush()
+
+
+def _register_resources(resources):
+    """Añade ``resources`` al conjunto compartido; solo lee y escribe si hay alguno sin confirmar."""
+    new = set(resources) - _flush_state['known']
+    if not new:
+        return
+    current = cache.get(RESOURCES_KEY) or set()
+    if not new <= current:
+        cache.set(RESOURCES_KEY, current | new, None)
+        # Otro proceso pudo escribir a la vez: solo se confirman los que quedaron; el resto se reintenta
+        current = cache.get(RESOURCES_KEY) or set()
+    _flush_state['known'] |= new & current
+
+
+def flush():
+    """Suma a la caché los contadores acumulados en este proceso."""
+    with _pending_lock:
+        batch = dict(_pending)
+        _pending.clear()
+        _flush_state['at'] = time.monotonic()
+    if not batch:
+        return
+    for (resource, name), n in batch.items():
+        _incr(f'{STATS_PREFIX}{resource}:{name}', n)
+    _register_resources({resource for resource, _ in batch})
+
+
+atexit.register(flush)
+
+
+class InstrumentedRequestsClient(stripe.RequestsClient):
+    """RequestsClient con sesión por hilo de pool configurable y medición de cada intento."""
+
+    def _request_internal(self, method, url, headers, post_data, is_streaming):
+        if getattr(self._thread_local, 'session', None) is None:
+            self._thread_local.session = _new_session()
+        t0 = time.perf_counter()
+        status = None
+        try:
+            content, status, rheaders = super()._request_internal(method, url, headers, post_data, is_streaming)
+            return content, status, rheaders
+        finally:
+            record(method, url, int((time.perf_counter() - t0) * 1000), status)
+
+
+_state = {'client': None}
+
+
+def configure(force: bool = False):
+    """Instala el cliente del proceso (idempotente); devuelve el cliente."""
+    if _state['client'] is not None and not force:
+        return _state['client']
+    client = InstrumentedRequestsClient(
+        timeout=(float(_setting('STRIPE_HTTP_CONNECT_TIMEOUT', 5)), float(_setting('STRIPE_HTTP_READ_TIMEOUT', 30))),
+    )
+    stripe.default_http_client = client
+    stripe.max_network_retries = int(_setting('STRIPE_MAX_NETWORK_RETRIES', 2))
+    if _setting('STRIPE_API_BASE', ''):
+        # Stand-in local (services/stripe_fake.py) u otro endpoint compatible
+        stripe.api_base = _setting('STRIPE_API_BASE', '')
+    _state['client'] = client
+    return client
+
+
+def stats():
+    flush()
+    resources = sorted(cache.get(RESOURCES_KEY) or ())
+    labels = [*BUCKETS_MS, 'inf']
+    keys = [f'{STATS_PREFIX}{r}:{k}' for r in resources for k in ('count', 'total_ms', 'errors', *[f'le_{b}' for b in labels])]
+    values = cache.get_many(keys)
+    out = {}
+    for r in resources:
+        base = f'{STATS_PREFIX}{r}:'
+        count = int(values.get(base + 'count', 0))
+        total = int(values.get(base + 'total_ms', 0))
+        out[r] = {
+            'count': count,
+            'errors': int(values.get(base + 'errors', 0)),
+            'avg_ms': round(total / count, 1) if count else 0.0,
+            'histogram_ms': {str(b): int(values.get(f'{base}le_{b}', 0)) for b in labels},
+        }
+    return out
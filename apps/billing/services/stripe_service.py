@@ -1,9 +1,11 @@
 import stripe
 from django.conf import settings
-from django.utils import timezone
+from django.db import transaction
 from django.urls import reverse
-from ..models import Purchase, Plan, CreditPack, CreditTransaction, GuaranteeWindow, RefundRequest, ConsumptionEvent, ServiceType
-from ..selectors import get_wallet_for_user
+from ..models import Purchase, Plan, CreditPack, CreditTransaction, GuaranteeWindow, RefundRequest
+from ..selectors import get_available_balance, get_balance
+from . import guarantees, idempotency, ledger, stripe_cache, stripe_http
+from .service_types import get_service_type, get_service_types
 
 try:
     from apps.notifications.models import Notification
@@ -12,6 +14,7 @@ except Exception:
 
 stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', None)
 stripe.api_version = '2024-06-20'
+stripe_http.configure()
 
 
 def _ensure_stripe_key():
@@ -22,12 +25,25 @@ def _ensure_stripe_key():
 
 
 def get_or_create_stripe_customer(user):
+    # Cacheado por usuario: el perfil solo se lee (y el customer se crea) en un fallo de caché
+    return stripe_cache.get_or_fetch('customer', user.pk, lambda: _stripe_customer_id(user))
+
+
+def _stripe_customer_id(user):
     profile = getattr(user, 'profile', None) or getattr(user, 'my_profile', None)
     # We expect stripe_customer_id on profile if exists
     stripe_customer_id = getattr(profile, 'stripe_customer_id', None)
     if not stripe_customer_id:
         _ensure_stripe_key()
-        customer = stripe.Customer.create(email=user.email or None, name=user.get_username())
+        # Per-profile key: a retried or concurrent call cannot create a second customer
+        has_nonce = profile is not None and hasattr(profile, 'stripe_idempotency_nonce')
+        key = idempotency.stripe_key(profile, 'stripe_idempotency_nonce', 'customer') if has_nonce else None
+        try:
+            customer = stripe.Customer.create(email=user.email or None, name=user.get_username(), idempotency_key=key)
+        except Exception as exc:
+            if has_nonce and idempotency.is_definitive(exc):
+                idempotency.discard_stripe_key(profile, 'stripe_idempotency_nonce')
+            raise
         if profile and hasattr(profile, 'stripe_customer_id'):
             profile.stripe_customer_id = customer.id
             profile.save(update_fields=['stripe_customer_id'])
@@ -79,6 +95,18 @@ def _get_or_create_portal_configuration_id():
         return None
 
 
+def portal_configuration_id():
+    """Id de la configuración del portal, resuelto contra Stripe como mucho una vez por TTL."""
+    return stripe_cache.get_or_fetch(
+        'portal_configuration', getattr(settings, 'STRIPE_PORTAL_CONFIGURATION_ID', '') or 'default',
+        _get_or_create_portal_configuration_id,
+    )
+
+
+def _invalidate_portal_configuration():
+    stripe_cache.invalidate('portal_configuration', getattr(settings, 'STRIPE_PORTAL_CONFIGURATION_ID', '') or 'default')
+
+
 def create_checkout_session(user, plan_or_pack, success_url, cancel_url, mode='payment'):
     # plan_or_pack can be Plan or CreditPack
     price_id = getattr(plan_or_pack, 'stripe_price_id', None)
@@ -135,8 +163,8 @@ def create_billing_portal_session(user, return_url=None):
     _ensure_stripe_key()
     customer_id = get_or_create_stripe_customer(user)
     return_url = return_url or getattr(settings, 'STRIPE_PORTAL_RETURN_URL', '/')
-    # Try to ensure a configuration exists
-    cfg_id = _get_or_create_portal_configuration_id()
+    # Try to ensure a configuration exists (cached: normally no extra Stripe call)
+    cfg_id = portal_configuration_id()
     kwargs = {'customer': customer_id, 'return_url': return_url}
     if cfg_id:
         kwargs['configuration'] = cfg_id
@@ -145,8 +173,11 @@ def create_billing_portal_session(user, return_url=None):
     except Exception as e:
         # Retry once if configuration is missing on the account
         msg = str(e)
-        if 'No configuration provided' in msg or 'default configuration has not been created' in msg:
-            cfg_id = _get_or_create_portal_configuration_id()
+        if 'No configuration provided' in msg or 'default configuration has not been created' in msg \
+                or 'No such configuration' in msg:
+            # The cached configuration may be stale: resolve it again
+            _invalidate_portal_configuration()
+            cfg_id = portal_configuration_id()
             if cfg_id:
                 kwargs['configuration'] = cfg_id
                 portal = stripe.billing_portal.Session.create(**kwargs)
@@ -158,22 +189,27 @@ def create_billing_portal_session(user, return_url=None):
 
 
 def _credit_wallet(user, credits: int, reason: str, metadata: dict):
-    wallet = get_wallet_for_user(user)
-    wallet.balance += credits
-    wallet.save(update_fields=['balance', 'updated_at'])
-    CreditTransaction.objects.create(wallet=wallet, type=CreditTransaction.TYPE_PURCHASE, signed_amount=credits, reason=reason, metadata=metadata)
-    return wallet
+    return ledger.credit(user, credits, CreditTransaction.TYPE_PURCHASE, reason, metadata)
 
 
 def handle_checkout_completed(event):
     data = event['data']['object']
     session_id = data.get('id')
     try:
-        purchase = Purchase.objects.get(checkout_session_id=session_id)
+        with transaction.atomic():
+            # Webhook y fallback de checkout_success compiten por la misma sesión: solo uno la inserta
+            if not idempotency.claim(f'checkout:{session_id}'):
+                return
+            # Sin compra se deshace también la clave (DoesNotExist sale del atomic)
+            purchase = Purchase.objects.get(checkout_session_id=session_id)
+            if purchase.status == Purchase.STATUS_PAID:
+                return
+            _complete_checkout(purchase, data)
     except Purchase.DoesNotExist:
         return
-    if purchase.status == Purchase.STATUS_PAID:
-        return
+
+
+def _complete_checkout(purchase: Purchase, data: dict):
     purchase.status = Purchase.STATUS_PAID
     purchase.payment_intent_id = data.get('payment_intent')
     purchase.subscription_id = data.get('subscription')
@@ -204,12 +240,16 @@ def handle_invoice_paid(event):
     data = event['data']['object']
     sub_id = data.get('subscription')
     try:
-        purchase = Purchase.objects.get(subscription_id=sub_id)
+        with transaction.atomic():
+            # Una factura acredita una sola vez aunque Stripe la entregue varias veces
+            if data.get('id') and not idempotency.claim(f"invoice:{data['id']}"):
+                return
+            purchase = Purchase.objects.get(subscription_id=sub_id)
+            credits = purchase.plan.credits_on_purchase if purchase.plan else 0
+            _credit_wallet(purchase.user, credits, 'Subscription renewal', {'purchase_id': purchase.id, 'invoice_id': data.get('id')})
+            purchase.open_guarantee()
     except Purchase.DoesNotExist:
         return
-    credits = purchase.plan.credits_on_purchase if purchase.plan else 0
-    _credit_wallet(purchase.user, credits, 'Subscription renewal', {'purchase_id': purchase.id, 'invoice_id': data.get('id')})
-    purchase.open_guarantee()
 
 
 def handle_payment_failed(event):
@@ -234,39 +274,14 @@ def handle_payment_failed(event):
     return
 
 
-def _used_credits_during_guarantee(purchase: Purchase) -> int:
-    # Prefer purchases linked in consumption, else fallback by time window
-    qs = ConsumptionEvent.objects.filter(wallet__user=purchase.user, purchase=purchase)
-    if not qs.exists() and purchase.guarantee_starts_at and purchase.guarantee_ends_at:
-        qs = ConsumptionEvent.objects.filter(
-            wallet__user=purchase.user,
-            created_at__gte=purchase.guarantee_starts_at,
-            created_at__lte=purchase.guarantee_ends_at
-        )
-    return sum(c.credits_spent for c in qs)
-
-
 def request_refund(user, purchase: Purchase, amount=None):
-    # Validación de garantía y consumo + posible prorrata
-    now = timezone.now()
+    # Validación de garantía y consumo + posible prorrata (contadores de la ventana)
     if purchase.user_id != user.id:
         raise ValueError('Invalid user')
-    if not purchase.guarantee_ends_at or purchase.guarantee_ends_at < now:
-        raise ValueError('Guarantee window expired')
-
-    used = _used_credits_during_guarantee(purchase)
-    threshold = int(getattr(settings, 'BILLING_ALLOW_REFUND_IF_USED_THRESHOLD', 0))
-    pro_rata = bool(getattr(settings, 'BILLING_REFUND_PRO_RATA', False))
-
-    if used == 0:
-        refund_amount = purchase.amount_usd
-    elif pro_rata and purchase.credits_granted > 0 and purchase.amount_usd:
-        ratio = max(0, (purchase.credits_granted - used) / purchase.credits_granted)
-        refund_amount = round(float(purchase.amount_usd) * ratio, 2)
-    elif used <= threshold:
-        refund_amount = purchase.amount_usd
-    else:
-        raise ValueError('Refund not eligible due to usage')
+    eligibility = guarantees.check(purchase)
+    if not eligibility.eligible:
+        raise ValueError(eligibility.reason)
+    refund_amount = eligibility.refund_amount
 
     # Intentar Stripe refund si hay payment_intent_id y clave
     refund_id = None
@@ -274,7 +289,14 @@ def request_refund(user, purchase: Purchase, amount=None):
         _ensure_stripe_key()
         if purchase.payment_intent_id:
             cents = int(round(float(refund_amount) * 100))
-            r = stripe.Refund.create(payment_intent=purchase.payment_intent_id, amount=cents)
+            key = idempotency.stripe_key(purchase, 'refund_idempotency_nonce', f'refund:{cents}')
+            try:
+                r = stripe.Refund.create(payment_intent=purchase.payment_intent_id, amount=cents, idempotency_key=key)
+            except Exception as exc:
+                # Un 4xx se repetiría con la misma clave durante 24 h; tras un fallo de red se reintenta con ella
+                if idempotency.is_definitive(exc):
+                    idempotency.discard_stripe_key(purchase, 'refund_idempotency_nonce')
+                raise
             refund_id = r.id
     except Exception:
         # fallback a registro interno
@@ -296,32 +318,45 @@ def request_refund(user, purchase: Purchase, amount=None):
     return refund_amount
 
 
-def _ensure_service_type(code: str) -> ServiceType:
-    default_cost = int(getattr(settings, 'BILLING_DEFAULT_EXAM_COST_CREDITS', 1)) if code == 'exam' else 1
-    st, _ = ServiceType.objects.get_or_create(
-        code=code,
-        defaults={'label': code.capitalize(), 'default_cost_credits': default_cost}
-    )
-    return st
-
-
 def debit_credits(user, service_code: str, amount_credits: int, source_metadata=None):
-    st = _ensure_service_type(service_code)
-    wallet = get_wallet_for_user(user)
-    wallet.debit(amount_credits, reason=f'Consume {service_code}', metadata=source_metadata or {})
-    ce = ConsumptionEvent.objects.create(
-        wallet=wallet,
-        service_type=st,
-        credits_spent=amount_credits,
-        source=(source_metadata or {}).get('source', ''),
-        purchase_id=(source_metadata or {}).get('purchase_id')
-    )
+    st = get_service_type(service_code)
+    source_metadata = source_metadata or {}
+    # Saldo, ledger y consumo en una transacción: UPDATE condicional + dos INSERT
+    ledger.debit(user, amount_credits, reason=f'Consume {service_code}', metadata=source_metadata, consumption={
+        'service_type': st,
+        'source': source_metadata.get('source', ''),
+        'purchase_id': source_metadata.get('purchase_id'),
+    })
     return True
 
 
+def debit_credits_bulk(items, mode: str = ledger.MODE_ATOMIC):
+    """Consumo en lote: ``items`` con user, service_code, amount_credits y metadata opcional.
+
+    Ver ``ledger.debit_bulk`` para los modos; devuelve (resultados por item, saldos por user_id).
+    """
+    service_types = get_service_types(i['service_code'] for i in items)
+    entries = []
+    for i in items:
+        metadata = i.get('metadata') or {}
+        entries.append({
+            'user_id': i['user'].pk,
+            'amount': i['amount_credits'],
+            'reason': f"Consume {i['service_code']}",
+            'metadata': metadata,
+            'consumption': {
+                'service_type': service_types[i['service_code']],
+                'source': i.get('source') or metadata.get('source', ''),
+                'purchase_id': metadata.get('purchase_id'),
+            },
+        })
+    return ledger.debit_bulk(entries, mode)
+
+
 def current_balance(user):
-    return get_wallet_for_user(user).balance
+    return get_balance(user)
 
 
 def can_consume(user, service_code: str, amount_credits: int = 1):
-    return current_balance(user) >= amount_credits
+    # Los créditos reservados por servicios en curso no cuentan como disponibles
+    return get_available_balance(user) >= amount_credits
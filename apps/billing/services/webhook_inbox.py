@@ -0,0 +1,142 @@
+"""Bandeja de entrada durable para los webhooks de Stripe.
+
+El endpoint solo verifica la firma y guarda el evento (``enqueue``), así que responde 200 sin
+tocar wallets ni compras. Los workers reclaman lotes con ``SELECT ... FOR UPDATE SKIP LOCKED`` y
+un lease: si un worker muere, el evento vuelve a estar disponible al vencer el lease (al menos una
+vez). El handler y la marca DONE van en la misma transacción, de modo que un evento cuyos efectos
+se confirmaron no se vuelve a aplicar. Los fallos se reintentan con backoff exponencial hasta
+``BILLING_WEBHOOK_MAX_ATTEMPTS`` y después quedan en FAILED.
+"""
+import logging
+import threading
+from datetime import timedelta
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from ..models import StripeWebhookEvent
+from .stripe_service import handle_checkout_completed, handle_invoice_paid, handle_payment_failed
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {
+    'checkout.session.completed': handle_checkout_completed,
+    'invoice.paid': handle_invoice_paid,
+    'invoice.payment_failed': handle_payment_failed,
+}
+
+
+def _setting(name, default):
+    return int(getattr(settings, name, default))
+
+
+def enqueue(event: dict) -> bool:
+    """Guarda el evento una sola vez por id de Stripe; False si ya estaba en la bandeja."""
+    try:
+        with transaction.atomic():
+            StripeWebhookEvent.objects.create(
+                event_id=event['id'], event_type=event.get('type', ''), payload=event,
+            )
+    except IntegrityError:
+        # Reenvío de Stripe de un evento ya recibido
+        return False
+    return True
+
+
+def backoff_seconds(attempts: int) -> int:
+    base = _setting('BILLING_WEBHOOK_BACKOFF_SECONDS', 30)
+    return min(base * 2 ** max(attempts - 1, 0), _setting('BILLING_WEBHOOK_BACKOFF_MAX_SECONDS', 3600))
+
+
+def claim(batch_size: int = 20, now=None):
+    """Reclama hasta ``batch_size`` eventos disponibles (pendientes o con el lease vencido)."""
+    now = now or timezone.now()
+    with transaction.atomic():
+        ids = list(
+            StripeWebhookEvent.objects.filter(
+                status__in=[StripeWebhookEvent.STATUS_PENDING, StripeWebhookEvent.STATUS_PROCESSING],
+                available_at__lte=now,
+            )
+            .order_by('available_at')
+            .select_for_update(skip_locked=True)
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        StripeWebhookEvent.objects.filter(pk__in=ids).update(
+            status=StripeWebhookEvent.STATUS_PROCESSING,
+            attempts=F('attempts') + 1,
+            available_at=now + timedelta(seconds=_setting('BILLING_WEBHOOK_LEASE_SECONDS', 300)),
+        )
+    return list(StripeWebhookEvent.objects.filter(pk__in=ids).order_by('available_at', 'id'))
+
+
+class _LeaseLost(Exception):
+    pass
+
+
+def _owned(evt: StripeWebhookEvent):
+    # El lease sigue siendo nuestro si nadie lo ha reclamado después (attempts no ha cambiado)
+    return StripeWebhookEvent.objects.filter(
+        pk=evt.pk, status=StripeWebhookEvent.STATUS_PROCESSING, attempts=evt.attempts,
+    )
+
+
+def process(evt: StripeWebhookEvent) -> str:
+    """Ejecuta el handler del evento y devuelve su estado final (DONE, PENDING o FAILED)."""
+    handler = HANDLERS.get(evt.event_type)
+    now = timezone.now()
+    try:
+        with transaction.atomic():
+            if handler:
+                handler(evt.payload)
+            if not _owned(evt).update(status=StripeWebhookEvent.STATUS_DONE, processed_at=now, last_error=''):
+                raise _LeaseLost()
+    except _LeaseLost:
+        # Otro worker lo reclamó al vencer el lease; sus efectos se deshacen con el rollback
+        return evt.status
+    except Exception as e:
+        if evt.attempts >= _setting('BILLING_WEBHOOK_MAX_ATTEMPTS', 8):
+            status = StripeWebhookEvent.STATUS_FAILED
+        else:
+            status = StripeWebhookEvent.STATUS_PENDING
+        _owned(evt).update(
+            status=status, last_error=f'{type(e).__name__}: {e}'[:2000],
+            available_at=now + timedelta(seconds=backoff_seconds(evt.attempts)),
+        )
+        evt.status = status
+        return status
+    evt.status = StripeWebhookEvent.STATUS_DONE
+    return evt.status
+
+
+def drain(batch_size: int = 20, stop: threading.Event | None = None) -> dict:
+    """Procesa lotes hasta vaciar lo disponible; devuelve el recuento por estado final."""
+    counts = {}
+    while not (stop and stop.is_set()):
+        batch = claim(batch_size)
+        if not batch:
+            break
+        for evt in batch:
+            status = process(evt)
+            counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def run_worker(batch_size: int = 20, poll_seconds: float = 1.0, stop: threading.Event | None = None, once: bool = False):
+    """Bucle de un worker (un hilo): drena, espera ``poll_seconds`` y repite hasta ``stop``."""
+    stop = stop or threading.Event()
+    totals = {}
+    while not stop.is_set():
+        try:
+            counts = drain(batch_size, stop)
+        except DatabaseError:
+            # Caída o bloqueo transitorio de la base: lo reclamado vuelve al vencer el lease
+            logger.exception('Stripe webhook worker: database error, retrying')
+            counts = {}
+        for status, n in counts.items():
+            totals[status] = totals.get(status, 0) + n
+        if once:
+            break
+        stop.wait(poll_seconds)
+    return totals
@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from apps.billing.models import ConsumptionEvent, CreditTransaction, CreditWallet, ServiceType
+from apps.analytics.services import cache as analytics_cache
+from apps.billing.services import ledger
+from apps.billing.services.stripe_service import debit_credits_bulk, current_balance
+
+
+class ConsumeBatchTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.a = User.objects.create_user(username='a', password='pass')
+        self.b = User.objects.create_user(username='b', password='pass')
+        ledger.credit(self.a, 5)
+        ledger.credit(self.b, 1)
+        ServiceType.objects.create(code='exam', label='Exam')
+        ServiceType.objects.create(code='call', label='Call')
+
+    def _items(self):
+        return [
+            {'user': self.a, 'service_code': 'exam', 'amount_credits': 3},
+            {'user': self.b, 'service_code': 'call', 'amount_credits': 2},
+            {'user': self.a, 'service_code': 'call', 'amount_credits': 2},
+            {'user': self.a, 'service_code': 'exam', 'amount_credits': 1},
+        ]
+
+    def test_atomic_rolls_back_whole_batch(self):
+        with self.assertRaisesMessage(ValueError, 'item 1'):
+            debit_credits_bulk(self._items())
+        self.assertEqual((current_balance(self.a), current_balance(self.b)), (5, 1))
+        self.assertFalse(ConsumptionEvent.objects.exists())
+
+    def test_best_effort_skips_items_without_balance(self):
+        results, balances = debit_credits_bulk(self._items(), ledger.MODE_BEST_EFFORT)
+        self.assertEqual([r['ok'] for r in results], [True, False, True, False])
+        self.assertEqual(balances, {self.a.pk: 0, self.b.pk: 1})
+        self.assertEqual(current_balance(self.a), 0)
+        self.assertEqual(ConsumptionEvent.objects.count(), 2)
+        self.assertEqual(CreditTransaction.objects.filter(type=CreditTransaction.TYPE_DEBIT).count(), 2)
+
+    def test_constant_statements(self):
+        items = [{'user': self.a, 'service_code': 'exam', 'amount_credits': 1}] * 5
+        with CaptureQueriesContext(connection) as ctx:
+            debit_credits_bulk(items)
+        sql = [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+        # service types, wallets, UPDATE, ledger, consumos, contadores de garantía
+        self.assertEqual(len(sql), 6)
+        self.assertEqual(CreditWallet.objects.get(user=self.a).balance, 0)
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.a)
+        url = reverse('billing:consume_batch')
+        payload = {'mode': 'best_effort', 'items': [
+            {'service_code': 'exam', 'amount_credits': 4},
+            {'service_code': 'exam', 'amount_credits': 4},
+        ]}
+        res = client.post(url, payload, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['balances'], {str(self.a.pk): 1})
+        self.assertFalse(res.json()['ok'])
+        res = client.post(url, {'items': [{'service_code': 'exam', 'amount_credits': 1, 'user_id': self.b.pk}]}, format='json')
+        self.assertEqual(res.status_code, 403)
+        res = client.post(url, {'items': [{'service_code': 'exam', 'amount_credits': 9}]}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+    def test_bulk_debit_invalidates_analytics_for_the_day(self):
+        cache.clear()
+        today = timezone.localdate()
+        before = analytics_cache.resolve('summary', {}, today, today).key
+        debit_credits_bulk([{'user': self.a, 'service_code': 'exam', 'amount_credits': 3}])
+        self.assertNotEqual(analytics_cache.resolve('summary', {}, today, today).key, before)
@@ -0,0 +1,65 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.billing.models import GuaranteeWindow, Plan, Purchase
+from apps.billing.services import guarantees, ledger
+
+
+@override_settings(BILLING_REFUND_PRO_RATA=True, BILLING_ALLOW_REFUND_IF_USED_THRESHOLD=0)
+class GuaranteeUsageTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='guarantee', password='pass')
+        plan = Plan.objects.create(name='Pro', slug='pro-g', price_usd=100, credits_on_purchase=10, renewal_interval=Plan.INTERVAL_ONE_OFF)
+        self.purchase = Purchase.objects.create(user=self.user, plan=plan, amount_usd=100, credits_granted=10, status=Purchase.STATUS_PAID)
+        self.purchase.open_guarantee()
+        self.other = Purchase.objects.create(user=self.user, plan=plan, amount_usd=50, credits_granted=10, status=Purchase.STATUS_PAID)
+        self.other.open_guarantee()
+        ledger.credit(self.user, 20)
+
+    def _counters(self, purchase):
+        return GuaranteeWindow.objects.filter(purchase=purchase).values_list('purchase_credits_used', 'window_credits_used').get()
+
+    def test_debits_update_counters(self):
+        ledger.debit(self.user, 3, consumption={'service_type': self._exam(), 'purchase_id': self.purchase.pk})
+        ledger.debit(self.user, 2, consumption={'service_type': self._exam()})
+        self.assertEqual(self._counters(self.purchase), (3, 5))
+        self.assertEqual(self._counters(self.other), (0, 5))
+        # Consumo ligado manda; sin él, el de la ventana
+        self.purchase.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(guarantees.used_credits(self.purchase), 3)
+        self.assertEqual(guarantees.used_credits(self.other), 5)
+        self.assertEqual(guarantees.usage_from_events(self.purchase), (3, 5))
+
+    def test_bulk_debit_updates_counters(self):
+        st = self._exam()
+        ledger.debit_bulk([
+            {'user_id': self.user.pk, 'amount': 1, 'consumption': {'service_type': st, 'purchase_id': self.purchase.pk}},
+            {'user_id': self.user.pk, 'amount': 2, 'consumption': {'service_type': st}},
+        ])
+        self.assertEqual(self._counters(self.purchase), (1, 3))
+
+    def test_refresh_rebuilds_counters(self):
+        ledger.debit(self.user, 4, consumption={'service_type': self._exam()})
+        GuaranteeWindow.objects.update(purchase_credits_used=0, window_credits_used=0)
+        guarantees.refresh_usage(self.purchase)
+        self.assertEqual(self._counters(self.purchase), (0, 4))
+
+    def test_refunds_api_checks_window_without_touching_events(self):
+        Purchase.objects.filter(pk=self.other.pk).update(guarantee_ends_at=timezone.now() - timedelta(days=1))
+        ledger.debit(self.user, 4, consumption={'service_type': self._exam()})
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.assertNumQueries(1):
+            res = client.get(reverse('billing:refunds'))
+        body = res.json()
+        self.assertEqual(body['eligible_purchases'], [self.purchase.pk])
+        self.assertEqual(body['purchases'][0]['refund_amount'], 60.0)
+        self.assertEqual(body['purchases'][0]['credits_used'], 4)
+
+    def _exam(self):
+        from apps.billing.services.service_types import get_service_type
+        return get_service_type('exam')
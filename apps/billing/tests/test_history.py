@@ -0,0 +1,89 @@
+import csv
+import io
+import json
+from unittest import mock
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from apps.billing.models import CreditTransaction
+from apps.billing.selectors import get_wallet_for_user
+from apps.billing.services import history
+
+
+class TransactionHistoryTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hist', password='pass')
+        self.wallet = get_wallet_for_user(self.user)
+        base = timezone.now()
+        txs = CreditTransaction.objects.bulk_create([
+            CreditTransaction(wallet=self.wallet, type=CreditTransaction.TYPE_PURCHASE if i % 3 == 0 else CreditTransaction.TYPE_DEBIT,
+                              signed_amount=i, reason=f'tx {i}', metadata={'i': i})
+            for i in range(25)
+        ])
+        # Varias filas comparten created_at para ejercitar el desempate por id
+        for i, tx in enumerate(txs):
+            CreditTransaction.objects.filter(pk=tx.pk).update(created_at=base - timedelta(minutes=i // 2))
+        other = get_user_model().objects.create_user(username='other', password='pass')
+        CreditTransaction.objects.create(wallet=get_wallet_for_user(other), type=CreditTransaction.TYPE_DEBIT, signed_amount=-1)
+        self.expected = list(CreditTransaction.objects.filter(wallet=self.wallet).values_list('pk', flat=True))
+
+    def test_pages_cover_the_ledger_in_model_order(self):
+        seen, cursor = [], None
+        while True:
+            rows, cursor = history.transactions_page(self.wallet, limit=7, cursor=cursor)
+            seen.extend(t.pk for t in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.expected)
+
+    def test_page_query_count_does_not_depend_on_depth(self):
+        _, cursor = history.transactions_page(self.wallet, limit=20)
+        with self.assertNumQueries(1):
+            rows, next_cursor = history.transactions_page(self.wallet, limit=20, cursor=cursor)
+        self.assertEqual(len(rows), 5)
+        self.assertIsNone(next_cursor)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(ValueError):
+            history.transactions_page(self.wallet, cursor='nope')
+
+    def test_api_paginates_and_filters(self):
+        client = APIClient()
+        client.login(username='hist', password='pass')
+        url = reverse('billing:wallet_transactions')
+        res = client.get(url, {'limit': 10})
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual([r['id'] for r in body['results']], self.expected[:10])
+        res = client.get(url, {'limit': 10, 'cursor': body['next_cursor']})
+        self.assertEqual([r['id'] for r in res.json()['results']], self.expected[10:20])
+        res = client.get(url, {'type': CreditTransaction.TYPE_PURCHASE, 'limit': 100})
+        self.assertEqual(len(res.json()['results']), 9)
+        self.assertEqual(client.get(url, {'cursor': 'bad'}).status_code, 400)
+
+    def test_exports_stream_the_whole_ledger(self):
+        self.client.login(username='hist', password='pass')
+        url = reverse('billing:wallet_export')
+        res = self.client.get(url)
+        self.assertTrue(res.streaming)
+        rows = list(csv.DictReader(io.StringIO(b''.join(res.streaming_content).decode())))
+        self.assertEqual([int(r['id']) for r in rows], sorted(self.expected))
+        self.assertEqual(json.loads(rows[4]['metadata']), {'i': 4})
+
+        res = self.client.get(url, {'fmt': 'ndjson'})
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(res.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines), 25)
+        self.assertEqual(lines[0]['reason'], 'tx 0')
+
+    def test_wallet_page_links_older_transactions(self):
+        self.client.login(username='hist', password='pass')
+        with mock.patch('apps.billing.views.render', return_value=HttpResponse()) as render:
+            self.client.get(reverse('billing:wallet_page'))
+        context = render.call_args.args[2]
+        self.assertEqual([t.pk for t in context['transactions']], self.expected)
+        self.assertIsNone(context['next_cursor'])
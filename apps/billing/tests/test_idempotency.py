@@ -0,0 +1,88 @@
+from unittest import mock
+import stripe
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from apps.billing.models import Plan, Purchase, StripeIdempotencyKey
+from apps.billing.selectors import get_balance
+from apps.billing.services import idempotency, stripe_service
+from apps.billing.services.stripe_service import handle_checkout_completed, handle_invoice_paid
+
+
+class StripeIdempotencyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='idem', password='pass')
+        plan = Plan.objects.create(name='Monthly', slug='monthly', price_usd=10, credits_on_purchase=4)
+        self.purchase = Purchase.objects.create(
+            user=self.user, plan=plan, amount_usd=10, credits_granted=4, checkout_session_id='cs_1', subscription_id='sub_1',
+        )
+
+    def _invoice(self, invoice_id):
+        return {'data': {'object': {'id': invoice_id, 'subscription': 'sub_1'}}}
+
+    def test_invoice_credits_once_per_invoice(self):
+        handle_invoice_paid(self._invoice('in_1'))
+        handle_invoice_paid(self._invoice('in_1'))
+        self.assertEqual(get_balance(self.user), 4)
+        handle_invoice_paid(self._invoice('in_2'))
+        self.assertEqual(get_balance(self.user), 8)
+
+    def test_failed_handler_releases_key(self):
+        with mock.patch.object(stripe_service, '_credit_wallet', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                handle_invoice_paid(self._invoice('in_1'))
+        self.assertFalse(StripeIdempotencyKey.objects.exists())
+        handle_invoice_paid(self._invoice('in_1'))
+        self.assertEqual(get_balance(self.user), 4)
+
+    def test_unknown_subscription_keeps_no_key(self):
+        handle_invoice_paid({'data': {'object': {'id': 'in_x', 'subscription': 'sub_missing'}}})
+        self.assertFalse(StripeIdempotencyKey.objects.exists())
+
+    def test_checkout_webhook_and_fallback_apply_once(self):
+        event = {'data': {'object': {'id': 'cs_1', 'payment_intent': 'pi_1'}}}
+        handle_checkout_completed(event)
+        # Segunda llegada (reentrega o fallback de checkout_success): se queda en el INSERT
+        with mock.patch.object(stripe_service, '_complete_checkout') as complete:
+            handle_checkout_completed(event)
+        complete.assert_not_called()
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.status, Purchase.STATUS_PAID)
+        self.assertEqual(get_balance(self.user), 4)
+
+
+class StripeRequestKeyTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='keys', password='pass')
+        self.purchase = Purchase.objects.create(user=self.user, amount_usd=10)
+
+    def test_key_is_stable_per_row_and_rotates_after_discard(self):
+        key = idempotency.stripe_key(self.purchase, 'refund_idempotency_nonce', 'refund:1000')
+        self.assertTrue(key.startswith(f'refund:1000:{self.purchase.pk}:'))
+        # Otra instancia de la misma fila (otra petición) obtiene la misma clave
+        self.assertEqual(idempotency.stripe_key(Purchase.objects.get(pk=self.purchase.pk), 'refund_idempotency_nonce', 'refund:1000'), key)
+        other = Purchase.objects.create(user=self.user, amount_usd=10)
+        self.assertNotEqual(idempotency.stripe_key(other, 'refund_idempotency_nonce', 'refund:1000').split(':')[-1], key.split(':')[-1])
+        idempotency.discard_stripe_key(self.purchase, 'refund_idempotency_nonce')
+        self.assertNotEqual(idempotency.stripe_key(self.purchase, 'refund_idempotency_nonce', 'refund:1000'), key)
+
+    def _refund_failing_with(self, exc):
+        self.purchase.payment_intent_id = 'pi_1'
+        self.purchase.save(update_fields=['payment_intent_id'])
+        with mock.patch.object(stripe_service, '_ensure_stripe_key'), \
+                mock.patch.object(stripe_service.stripe.Refund, 'create', side_effect=exc) as create:
+            with mock.patch.object(stripe_service.guarantees, 'check', return_value=mock.Mock(eligible=True, refund_amount=10)):
+                stripe_service.request_refund(self.user, self.purchase)
+        self.purchase.refresh_from_db()
+        return create.call_args.kwargs['idempotency_key']
+
+    def test_rejected_refund_does_not_reuse_its_key(self):
+        key = self._refund_failing_with(stripe.error.InvalidRequestError('declined', param=None, http_status=400))
+        self.assertIsNotNone(key)
+        self.assertIsNone(self.purchase.refund_idempotency_nonce)
+
+    def test_connection_error_keeps_the_key_for_the_retry(self):
+        key = self._refund_failing_with(stripe.error.APIConnectionError('timeout'))
+        self.assertEqual(key.split(':')[-1], str(self.purchase.refund_idempotency_nonce))
+        for exc in (stripe.error.APIError('boom', http_status=500), stripe.error.RateLimitError('slow', http_status=429)):
+            self.assertFalse(idempotency.is_definitive(exc))
+        self.assertTrue(idempotency.is_definitive(stripe.error.CardError('declined', param=None, code='card_declined', http_status=402)))
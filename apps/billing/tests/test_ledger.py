@@ -0,0 +1,49 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from apps.billing.models import CreditWallet, CreditTransaction, ConsumptionEvent, ServiceType
+from apps.billing.selectors import get_wallet_for_user
+from apps.billing.services import ledger
+
+
+def _statements(ctx):
+    # Sin SAVEPOINT/RELEASE que añade el atomic() anidado dentro de TestCase
+    return [q['sql'] for q in ctx.captured_queries if not q['sql'].startswith(('SAVEPOINT', 'RELEASE'))]
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='ledger', password='pass')
+        self.wallet = get_wallet_for_user(self.user)
+        self.exam = ServiceType.objects.create(code='exam', label='Exam')
+        ledger.credit(self.user, 5, reason='seed')
+
+    def test_debit_is_update_plus_inserts(self):
+        with CaptureQueriesContext(connection) as ctx:
+            balance = ledger.debit(self.user, 2, reason='Consume exam', consumption={'service_type': self.exam})
+        self.assertEqual(balance, 3)
+        sql = _statements(ctx)
+        # UPDATE del saldo, ledger, consumo y contadores de garantía
+        self.assertEqual(len(sql), 4)
+        self.assertTrue(sql[0].startswith('UPDATE'))
+        self.assertEqual(ConsumptionEvent.objects.get().credits_spent, 2)
+        self.assertEqual(CreditTransaction.objects.filter(type=CreditTransaction.TYPE_DEBIT).get().signed_amount, -2)
+
+    def test_insufficient_leaves_no_trace(self):
+        with self.assertRaisesMessage(ValueError, 'Insufficient credits'):
+            ledger.debit(self.user, 6, consumption={'service_type': self.exam})
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, 5)
+        self.assertFalse(ConsumptionEvent.objects.exists())
+        self.assertEqual(CreditTransaction.objects.count(), 1)
+
+    def test_credit_creates_wallet_lazily(self):
+        other = get_user_model().objects.create_user(username='fresh', password='pass')
+        CreditWallet.objects.filter(user=other).delete()
+        self.assertEqual(ledger.credit(other, 4, CreditTransaction.TYPE_RENEWAL), 4)
+        self.assertEqual(CreditWallet.objects.get(user=other).transactions.get().type, CreditTransaction.TYPE_RENEWAL)
+
+    def test_model_debit_delegates(self):
+        self.assertEqual(self.wallet.debit(1, reason='x'), 4)
+        self.assertEqual(self.wallet.balance, 4)
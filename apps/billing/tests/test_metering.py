@@ -0,0 +1,107 @@
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from apps.analytics.services import cache as analytics_cache
+from apps.billing.models import ConsumptionEvent, CreditTransaction, ServiceType
+from apps.billing.services import ledger
+from apps.billing.services.metering import OVERDRAFT_ALLOW, Meter
+from apps.billing.services.stripe_service import current_balance
+
+
+class MeteringTests(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.a = User.objects.create_user(username='a', password='pass')
+        self.b = User.objects.create_user(username='b', password='pass')
+        ledger.credit(self.a, 100)
+        ledger.credit(self.b, 3)
+        ServiceType.objects.create(code='chat_message', label='Chat', default_cost_credits=1)
+        ServiceType.objects.create(code='call_minute', label='Call', default_cost_credits=2)
+        # Sin hilo: los tests vuelcan a mano o por tamaño
+        self.meter = Meter(flush_seconds=0, flush_events=10_000)
+
+    @override_settings(BILLING_SERVICE_TYPE_TTL=300)
+    def test_record_only_buffers(self):
+        self.meter.record(self.a, 'chat_message')
+        with self.assertNumQueries(0):
+            for _ in range(49):
+                self.meter.record(self.a, 'chat_message')
+        self.assertEqual(self.meter.pending, 50)
+        self.assertEqual(current_balance(self.a), 100)
+
+    def test_flush_aggregates_per_wallet_and_service(self):
+        for _ in range(40):
+            self.meter.record(self.a, 'chat_message')
+        for _ in range(5):
+            self.meter.record(self.a, 'call_minute', source='retell')
+        self.meter.record(self.b, 'chat_message')
+        # Savepoint, SELECT wallets, UPDATE saldos, 2 bulk_create y contadores de la ventana
+        with self.assertNumQueries(7):
+            out = self.meter.flush()
+        self.assertEqual(out, {self.a.pk: (50, 0), self.b.pk: (1, 0)})
+        self.assertEqual((current_balance(self.a), current_balance(self.b)), (50, 2))
+        self.assertEqual(self.meter.pending, 0)
+        events = ConsumptionEvent.objects.filter(wallet__user=self.a).order_by('service_type__code')
+        self.assertEqual([(e.service_type.code, e.credits_spent, e.source, e.metadata['metered_events']) for e in events],
+                         [('call_minute', 10, 'retell', 5), ('chat_message', 40, '', 40)])
+        self.assertEqual(CreditTransaction.objects.filter(wallet__user=self.a, type=CreditTransaction.TYPE_DEBIT).get().signed_amount, -50)
+        self.assertEqual(self.meter.flush(), {})
+
+    def test_clamp_charges_up_to_available(self):
+        for _ in range(5):
+            self.meter.record(self.b, 'chat_message')
+        self.assertEqual(self.meter.flush(), {self.b.pk: (3, 2)})
+        self.assertEqual(current_balance(self.b), 0)
+        tx = CreditTransaction.objects.filter(wallet__user=self.b, type=CreditTransaction.TYPE_DEBIT).get()
+        self.assertEqual(tx.metadata['unbilled'], 2)
+
+    def test_allow_overdraft_goes_negative(self):
+        meter = Meter(flush_seconds=0, flush_events=10_000, overdraft=OVERDRAFT_ALLOW)
+        for _ in range(5):
+            meter.record(self.b, 'chat_message')
+        self.assertEqual(meter.flush(), {self.b.pk: (5, 0)})
+        self.assertEqual(current_balance(self.b), -2)
+
+    def test_flush_invalidates_analytics_for_the_day(self):
+        cache.clear()
+        today = timezone.localdate()
+        before = analytics_cache.resolve('summary', {}, today, today).key
+        self.meter.record(self.a, 'chat_message', credits=5)
+        self.meter.flush()
+        self.assertNotEqual(analytics_cache.resolve('summary', {}, today, today).key, before)
+
+    def test_flush_by_event_count(self):
+        meter = Meter(flush_seconds=0, flush_events=3)
+        for _ in range(3):
+            meter.record(self.a, 'chat_message')
+        self.assertEqual(meter.pending, 0)
+        self.assertEqual(current_balance(self.a), 97)
+
+    def test_failed_flush_keeps_the_batch(self):
+        for _ in range(4):
+            self.meter.record(self.a, 'chat_message')
+        with mock.patch('apps.billing.services.metering.CreditTransaction.objects.bulk_create', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                self.meter.flush()
+        self.assertEqual(current_balance(self.a), 100)
+        self.meter.record(self.a, 'chat_message')
+        self.assertEqual(self.meter.pending, 5)
+        self.assertEqual(self.meter.flush(), {self.a.pk: (5, 0)})
+        self.assertEqual(current_balance(self.a), 95)
+
+    def test_background_thread_flushes(self):
+        meter = Meter(flush_seconds=0.05, flush_events=10_000)
+        with mock.patch('apps.billing.services.metering.close_old_connections'), \
+                mock.patch('apps.billing.services.metering.flush_usage', return_value={}) as flush_usage:
+            meter.record(self.a, 'chat_message')
+            for _ in range(100):
+                if flush_usage.called:
+                    break
+                meter._stop.wait(0.05)
+            meter.close()
+        [(batch, _)] = [c.args for c in flush_usage.call_args_list]
+        self.assertEqual([v[0] for v in batch.values()], [1])
+        self.assertEqual(meter.pending, 0)
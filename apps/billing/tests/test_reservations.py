@@ -0,0 +1,62 @@
+from datetime import timedelta
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from apps.billing.models import ConsumptionEvent, CreditReservation, CreditWallet
+from apps.billing.selectors import get_available_balance
+from apps.billing.services import ledger, reservations
+from apps.billing.services.stripe_service import can_consume, debit_credits
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hold', password='pass')
+        ledger.credit(self.user, 3)
+
+    def _wallet(self):
+        return CreditWallet.objects.get(user=self.user)
+
+    def test_hold_limits_available_balance(self):
+        reservations.hold(self.user, 'exam', 2, reference='r1')
+        self.assertEqual(get_available_balance(self.user), 1)
+        self.assertFalse(can_consume(self.user, 'exam', 2))
+        with self.assertRaisesMessage(ValueError, 'Insufficient credits'):
+            reservations.hold(self.user, 'exam', 2)
+        with self.assertRaisesMessage(ValueError, 'Insufficient credits'):
+            debit_credits(self.user, 'exam', 2)
+
+    def test_capture_debits_once(self):
+        r = reservations.hold(self.user, 'exam', 2, metadata={'source': 'education'})
+        self.assertEqual(reservations.capture(r), 1)
+        w = self._wallet()
+        self.assertEqual((w.balance, w.held), (1, 0))
+        self.assertEqual(ConsumptionEvent.objects.get().source, 'education')
+        with self.assertRaisesMessage(ValueError, 'not held'):
+            reservations.capture(r)
+        self.assertFalse(reservations.release(r))
+
+    def test_release_and_expiry_sweep(self):
+        r = reservations.hold(self.user, 'exam', 1)
+        self.assertTrue(reservations.release(r))
+        reservations.hold(self.user, 'exam', 1, ttl_seconds=60)
+        reservations.hold(self.user, 'exam', 1, ttl_seconds=3600)
+        self.assertEqual(reservations.expire_reservations(now=timezone.now() + timedelta(minutes=5)), 1)
+        w = self._wallet()
+        self.assertEqual((w.balance, w.held), (3, 1))
+        self.assertEqual(CreditReservation.objects.filter(status=CreditReservation.STATUS_EXPIRED).count(), 1)
+
+    def test_expired_holds_do_not_count_before_the_sweep(self):
+        stale = reservations.hold(self.user, 'exam', 3, reference='abandoned')
+        CreditReservation.objects.filter(pk=stale.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(get_available_balance(self.user), 3)
+        self.assertTrue(can_consume(self.user, 'exam', 3))
+        # La reserva nueva libera primero la vencida
+        reservations.hold(self.user, 'exam', 2, reference='fresh')
+        self.assertEqual(CreditReservation.objects.get(pk=stale.pk).status, CreditReservation.STATUS_EXPIRED)
+        self.assertEqual((self._wallet().balance, self._wallet().held), (3, 2))
+
+    def test_debit_releases_expired_holds(self):
+        stale = reservations.hold(self.user, 'exam', 3)
+        CreditReservation.objects.filter(pk=stale.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        debit_credits(self.user, 'exam', 2)
+        self.assertEqual((self._wallet().balance, self._wallet().held), (1, 0))
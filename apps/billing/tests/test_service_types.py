@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.test import TestCase, override_settings
+from apps.billing.models import ServiceType
+from apps.billing.services import service_types
+
+
+@override_settings(BILLING_SERVICE_TYPE_TTL=300, BILLING_DEFAULT_EXAM_COST_CREDITS=3)
+class ServiceTypeRegistryTests(TestCase):
+    def setUp(self):
+        service_types.invalidate()
+        self.addCleanup(service_types.invalidate)
+        ServiceType.objects.create(code='call', label='Call', default_cost_credits=2)
+
+    def test_lookups_served_from_memory(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(service_types.get_service_type('call').label, 'Call')
+            self.assertEqual(service_types.service_cost('call'), 2)
+
+    def test_unknown_code_inserted_once(self):
+        service_types.get_service_type('call')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(service_types.service_cost('exam'), 3)
+        with self.assertNumQueries(0):
+            self.assertEqual(service_types.service_cost('exam'), 3)
+        self.assertEqual(ServiceType.objects.filter(code='exam').count(), 1)
+
+    def test_signals_invalidate(self):
+        st = service_types.get_service_type('call')
+        st.default_cost_credits = 5
+        with self.captureOnCommitCallbacks(execute=True):
+            st.save()
+        self.assertEqual(service_types.service_cost('call'), 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            st.delete()
+        self.assertEqual(service_types.service_cost('call'), 1)
+
+    def test_rolled_back_insert_never_reaches_the_registry(self):
+        service_types.get_service_type('call')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    service_types.get_service_type('chat')
+                    # Otra consulta en la misma transacción no debe cargar la fila sin confirmar
+                    service_types.get_service_type('call')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertNotIn('chat', service_types._state['by_code'])
+        self.assertFalse(ServiceType.objects.filter(code='chat').exists())
@@ -1,8 +1,8 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from apps.billing.models import ServiceType
-from apps.billing.selectors import get_wallet_for_user
-from apps.billing.services.stripe_service import debit_credits, current_balance
+from apps.billing.models import CreditWallet, ServiceType
+from apps.billing.selectors import get_wallet_for_user, peek_wallet
+from apps.billing.services.stripe_service import _credit_wallet, debit_credits, current_balance
 
 
 class BillingServiceTests(TestCase):
@@ -21,3 +21,20 @@ class BillingServiceTests(TestCase):
         self.wallet.refresh_from_db()
         self.assertEqual(self.wallet.balance, 3)
         self.assertEqual(self.wallet.consumptions.count(), 1)
+
+
+class WalletReadPathTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='reader', password='pass')
+        CreditWallet.objects.filter(user=self.user).delete()
+
+    def test_reads_do_not_create_wallet(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(current_balance(self.user), 0)
+        self.assertEqual(peek_wallet(self.user).balance, 0)
+        self.assertFalse(CreditWallet.objects.filter(user=self.user).exists())
+
+    def test_write_path_creates_lazily(self):
+        _credit_wallet(self.user, 4, 'test', {})
+        self.assertEqual(current_balance(self.user), 4)
+        self.assertEqual(peek_wallet(self.user).transactions.count(), 1)
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.billing.services import stripe_cache, stripe_service
+from apps.my_profile.models import Profile
+
+
+@override_settings(STRIPE_SECRET_KEY='sk_test', STRIPE_PORTAL_CONFIGURATION_ID='', STRIPE_PORTAL_RETURN_URL='/')
+class StripeCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='portal', password='pass', is_staff=True)
+        self.profile, _ = Profile.objects.get_or_create(user=self.user)
+        Profile.objects.filter(pk=self.profile.pk).update(stripe_customer_id='cus_1')
+        self.user = get_user_model().objects.get(pk=self.user.pk)
+
+    def _stripe(self):
+        configs = mock.Mock(data=[SimpleNamespace(id='bpc_1')])
+        return (
+            mock.patch.object(stripe_service.stripe, 'api_key', 'sk_test'),
+            mock.patch.object(stripe_service.stripe.billing_portal.Configuration, 'list', return_value=configs),
+            mock.patch.object(stripe_service.stripe.billing_portal.Session, 'create', return_value=SimpleNamespace(url='https://portal')),
+        )
+
+    def test_portal_open_is_a_single_stripe_call_when_warm(self):
+        key, listing, session = self._stripe()
+        with key, listing as list_configs, session as create_session:
+            stripe_service.create_billing_portal_session(self.user)
+            user = get_user_model().objects.get(pk=self.user.pk)
+            with self.assertNumQueries(0):
+                self.assertEqual(stripe_service.create_billing_portal_session(user), 'https://portal')
+        self.assertEqual(list_configs.call_count, 1)
+        self.assertEqual(create_session.call_count, 2)
+        create_session.assert_called_with(customer='cus_1', return_url='/', configuration='bpc_1')
+
+    def test_profile_change_invalidates_customer(self):
+        self.assertEqual(stripe_service.get_or_create_stripe_customer(self.user), 'cus_1')
+        self.profile.refresh_from_db()
+        self.profile.stripe_customer_id = 'cus_2'
+        self.profile.save()
+        user = get_user_model().objects.get(pk=self.user.pk)
+        self.assertEqual(stripe_service.get_or_create_stripe_customer(user), 'cus_2')
+
+    def test_stale_configuration_is_resolved_again(self):
+        stripe_cache.put('portal_configuration', 'default', 'bpc_old')
+        key, listing, session = self._stripe()
+        with key, listing, session as create_session:
+            create_session.side_effect = [Exception('No such configuration: bpc_old'), SimpleNamespace(url='https://portal')]
+            self.assertEqual(stripe_service.create_billing_portal_session(self.user), 'https://portal')
+        self.assertEqual(create_session.call_args.kwargs['configuration'], 'bpc_1')
+
+    def test_stats_endpoint(self):
+        stripe_service.get_or_create_stripe_customer(self.user)
+        stripe_service.get_or_create_stripe_customer(self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        res = client.get(reverse('billing:stripe_cache_stats'))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()['customer'], {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
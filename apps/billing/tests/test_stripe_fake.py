@@ -0,0 +1,81 @@
+from unittest import mock
+import requests
+import stripe
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from apps.billing.models import Plan, Purchase, RefundRequest
+from apps.billing.selectors import get_balance
+from apps.billing.services import stripe_http, webhook_inbox
+from apps.billing.services.stripe_fake import FakeStripe, serve
+from apps.billing.services.stripe_service import create_billing_portal_session, create_checkout_session, request_refund
+
+SECRET = 'whsec_fake_test'
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=SECRET, STRIPE_PORTAL_CONFIGURATION_ID='')
+class FakeStripeFlowTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.app = FakeStripe(webhook_secret=SECRET)
+        self.server, self.base_url = serve(self.app)
+        saved = (stripe.api_base, stripe.api_key)
+        settings_override = override_settings(STRIPE_API_BASE=self.base_url)
+        settings_override.enable()
+        stripe_http.configure(force=True)
+        stripe.api_key = 'sk_test_fake'
+        self.addCleanup(self._restore, saved, settings_override)
+        self.user = get_user_model().objects.create_user(username='fake', password='pass', email='fake@example.com')
+        self.plan = Plan.objects.create(
+            name='Pack', slug='pack-fake', price_usd=20, credits_on_purchase=5,
+            renewal_interval=Plan.INTERVAL_ONE_OFF, stripe_price_id='price_fake',
+        )
+
+    def _restore(self, saved, settings_override):
+        self.server.shutdown()
+        self.server.server_close()
+        settings_override.disable()
+        stripe.api_base, stripe.api_key = saved
+        stripe_http.configure(force=True)
+
+    def test_checkout_webhook_credit_and_refund(self):
+        url, purchase = create_checkout_session(self.user, self.plan, 'http://app/success', 'http://app/cancel')
+        self.assertTrue(url.startswith(self.base_url))
+        requests.post(f'{self.base_url}/_fake/checkout/sessions/{purchase.checkout_session_id}/complete').raise_for_status()
+        [(payload, signature)] = self.app.outbox
+        res = self.client.post(reverse('billing:stripe_webhook'), data=payload, content_type='application/json',
+                               HTTP_STRIPE_SIGNATURE=signature)
+        self.assertEqual(res.status_code, 200)
+        webhook_inbox.drain()
+        purchase.refresh_from_db()
+        self.assertEqual(purchase.status, Purchase.STATUS_PAID)
+        self.assertTrue(purchase.payment_intent_id.startswith('pi_'))
+        self.assertEqual(get_balance(self.user), 5)
+
+        self.assertEqual(request_refund(self.user, purchase), purchase.amount_usd)
+        refund = RefundRequest.objects.get()
+        self.assertEqual(refund.status, RefundRequest.STATUS_COMPLETED)
+        self.assertTrue(refund.stripe_refund_id.startswith('re_'))
+
+    def test_bad_signature_is_rejected(self):
+        self.app.emit('invoice.paid', {'id': 'in_1', 'subscription': 'sub_1'})
+        payload, _ = self.app.outbox[0]
+        res = self.client.post(reverse('billing:stripe_webhook'), data=payload, content_type='application/json',
+                               HTTP_STRIPE_SIGNATURE='t=1,v1=bad')
+        self.assertEqual(res.status_code, 400)
+
+    def test_portal_creates_configuration_once(self):
+        first = create_billing_portal_session(self.user)
+        seen = self.app.requests
+        second = create_billing_portal_session(self.user)
+        self.assertTrue(first.startswith(self.base_url) and second.startswith(self.base_url))
+        # Customer y configuración salen de la caché: solo Session.create
+        self.assertEqual(self.app.requests - seen, 1)
+
+    def test_injected_errors_are_retried_with_the_same_key(self):
+        self.app.error_rate = 1.0
+        with mock.patch.object(stripe_http.InstrumentedRequestsClient, '_sleep_time_seconds', return_value=0):
+            with self.assertRaises(stripe.error.APIError):
+                stripe.Customer.create(email='x@example.com')
+        self.assertEqual(self.app.requests, 3)
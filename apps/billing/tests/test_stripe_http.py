@@ -0,0 +1,85 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+import stripe
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from apps.billing.services import stripe_http
+
+
+class _StripeStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.peers.add(self.client_address)
+        self._reply(200, {'id': 'cus_1', 'object': 'customer'})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.peers.add(self.client_address)
+        self.server.keys.append(self.headers.get('Idempotency-Key'))
+        if len(self.server.keys) == 1:
+            self._reply(500, {'error': {'type': 'api_error', 'message': 'boom'}})
+        else:
+            self._reply(200, {'id': 'cus_2', 'object': 'customer'})
+
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(STRIPE_MAX_NETWORK_RETRIES=2, STRIPE_HTTP_READ_TIMEOUT=5)
+class StripeHttpClientTests(SimpleTestCase):
+    def setUp(self):
+        stripe_http.flush()
+        cache.clear()
+        stripe_http._flush_state['known'].clear()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _StripeStub)
+        self.server.peers, self.server.keys = set(), []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        saved = (stripe.default_http_client, stripe.max_network_retries, stripe.api_base, stripe.api_key)
+        stripe_http.configure(force=True)
+        stripe.api_base, stripe.api_key = f'http://127.0.0.1:{self.server.server_address[1]}', 'sk_test'
+        self.addCleanup(self._restore, saved)
+
+    def _restore(self, saved):
+        self.server.shutdown()
+        self.server.server_close()
+        stripe.default_http_client, stripe.max_network_retries, stripe.api_base, stripe.api_key = saved
+        stripe_http._state['client'] = None
+
+    def test_calls_reuse_one_connection_and_are_measured(self):
+        for _ in range(3):
+            self.assertEqual(stripe.Customer.retrieve('cus_1').id, 'cus_1')
+        self.assertEqual(len(self.server.peers), 1)
+        stats = stripe_http.stats()['customers']
+        self.assertEqual((stats['count'], stats['errors']), (3, 0))
+        self.assertEqual(sum(stats['histogram_ms'].values()), 3)
+
+    def test_post_retries_with_the_same_idempotency_key(self):
+        with mock.patch.object(stripe_http.InstrumentedRequestsClient, '_sleep_time_seconds', return_value=0):
+            self.assertEqual(stripe.Customer.create(email='a@example.com').id, 'cus_2')
+        first, second = self.server.keys
+        self.assertTrue(first)
+        self.assertEqual(first, second)
+        self.assertEqual(stripe_http.stats()['customers']['errors'], 1)
+
+    @override_settings(STRIPE_HTTP_STATS_FLUSH_SECONDS=60)
+    def test_attempts_do_not_touch_the_cache_until_flushed(self):
+        stripe.Customer.retrieve('cus_1')
+        with mock.patch.object(stripe_http, 'cache') as shared:
+            for _ in range(3):
+                stripe.Customer.retrieve('cus_1')
+        self.assertEqual(shared.method_calls, [])
+        self.assertEqual(stripe_http.stats()['customers']['count'], 4)
+
+    def test_resource_of(self):
+        self.assertEqual(stripe_http.resource_of('https://api.stripe.com/v1/checkout/sessions/cs_1?x=1'), 'checkout')
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from apps.billing.models import ServiceType
+from apps.billing.services import ledger
+from apps.billing.throttling import check_shared_cache, parse_rate, take
+
+
+class TokenBucketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('60/m'), 1.0)
+        self.assertEqual(parse_rate('10/s'), 10.0)
+        self.assertIsNone(parse_rate(''))
+
+    def test_burst_then_refill(self):
+        # 1 token/s con ráfaga de 3
+        self.assertEqual([take('k', 1.0, 3, now=100) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(take('k', 1.0, 3, now=100), 1.0)
+        self.assertAlmostEqual(take('k', 1.0, 3, now=100.5), 0.5)
+        self.assertEqual(take('k', 1.0, 3, now=101), 0)
+        self.assertEqual(take('other', 1.0, 3, now=101), 0)
+        # Tras el tiempo de rellenado completo vuelve a admitir la ráfaga entera
+        self.assertEqual([take('k', 1.0, 3, now=110) for _ in range(3)], [0, 0, 0])
+
+
+    def test_check_warns_on_per_process_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379'}}
+        with override_settings(CACHES=locmem, DEBUG=False):
+            self.assertEqual([w.id for w in check_shared_cache()], ['billing.W001'])
+        with override_settings(CACHES=locmem, DEBUG=True):
+            self.assertEqual(check_shared_cache(), [])
+        with override_settings(CACHES=redis, DEBUG=False):
+            self.assertEqual(check_shared_cache(), [])
+
+@override_settings(BILLING_CONSUME_RATE='1/m', BILLING_CONSUME_BURST=2)
+class ConsumeThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='fast', password='pass')
+        ledger.credit(self.user, 100)
+        ServiceType.objects.create(code='exam', label='Exam')
+        ServiceType.objects.create(code='call', label='Call')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _consume(self, code='exam'):
+        return self.client.post(reverse('billing:consume'), {'service_code': code, 'amount_credits': 1}, format='json')
+
+    @override_settings(BILLING_SERVICE_TYPE_TTL=300)
+    def test_429_with_retry_after_per_service(self):
+        self.assertEqual([self._consume().status_code for _ in range(2)], [200, 200])
+        with self.assertNumQueries(0):
+            res = self._consume()
+        self.assertEqual(res.status_code, 429)
+        self.assertTrue(1 <= int(res['Retry-After']) <= 60)
+        # Otro servicio tiene su propio bucket
+        self.assertEqual(self._consume('call').status_code, 200)
+
+    def test_unknown_codes_share_one_bucket(self):
+        self.assertEqual([self._consume(f'made_up_{i}').status_code for i in range(2)], [200, 200])
+        res = self._consume('made_up_2')
+        self.assertEqual(res.status_code, 429)
+        self.assertFalse(ServiceType.objects.filter(code='made_up_2').exists())
+
+    @override_settings(BILLING_CONSUME_RATE='')
+    def test_empty_rate_disables_the_limit(self):
+        self.assertEqual({self._consume().status_code for _ in range(5)}, {200})
+
+
+@override_settings(BILLING_CONSUME_BATCH_RATE='1/m', BILLING_CONSUME_BATCH_BURST=5)
+class ConsumeBatchThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='bulk', password='pass')
+        ledger.credit(self.user, 100)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _batch(self, n):
+        items = [{'service_code': 'exam', 'amount_credits': 1}] * n
+        return self.client.post(reverse('billing:consume_batch'), {'items': items}, format='json')
+
+    def test_one_token_per_item(self):
+        self.assertEqual(self._batch(3).status_code, 200)
+        res = self._batch(3)
+        self.assertEqual(res.status_code, 429)
+        self.assertTrue(int(res['Retry-After']) >= 60)
+        self.assertEqual(self._batch(2).status_code, 200)
+        self.assertEqual(self._batch(1).status_code, 429)
@@ -0,0 +1,76 @@
+import json
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from apps.billing.models import Plan, Purchase, StripeWebhookEvent
+from apps.billing.selectors import get_balance
+from apps.billing.services import webhook_inbox
+from apps.billing.services.stripe_fake import sign
+
+
+def _checkout_event(event_id, session_id):
+    return {'id': event_id, 'type': 'checkout.session.completed', 'data': {'object': {'id': session_id, 'payment_intent': 'pi_1'}}}
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookInboxTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='hook', password='pass')
+        plan = Plan.objects.create(name='Pack', slug='pack', price_usd=10, credits_on_purchase=5, renewal_interval=Plan.INTERVAL_ONE_OFF)
+        self.purchase = Purchase.objects.create(user=self.user, plan=plan, amount_usd=10, credits_granted=5, checkout_session_id='cs_1')
+
+    def _post(self, event, signature=None):
+        payload = json.dumps(event).encode()
+        return self.client.post(
+            reverse('billing:stripe_webhook'), data=payload, content_type='application/json',
+            HTTP_STRIPE_SIGNATURE=signature or sign(payload, 'whsec_test'),
+        )
+
+    def test_endpoint_only_enqueues_and_dedupes(self):
+        event = _checkout_event('evt_1', 'cs_1')
+        self.assertEqual(self._post(event).status_code, 200)
+        self.assertEqual(self._post(event).status_code, 200)
+        stored = StripeWebhookEvent.objects.get()
+        self.assertEqual(stored.status, StripeWebhookEvent.STATUS_PENDING)
+        self.assertEqual(stored.payload, event)
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.status, Purchase.STATUS_PENDING)
+        self.assertEqual(self._post(_checkout_event('evt_2', 'cs_1'), signature='t=1,v1=x').status_code, 400)
+
+    def test_drain_applies_event_once(self):
+        webhook_inbox.enqueue(_checkout_event('evt_1', 'cs_1'))
+        self.assertEqual(webhook_inbox.drain(), {StripeWebhookEvent.STATUS_DONE: 1})
+        self.assertEqual(webhook_inbox.drain(), {})
+        self.purchase.refresh_from_db()
+        self.assertEqual(self.purchase.status, Purchase.STATUS_PAID)
+        self.assertEqual(get_balance(self.user), 5)
+
+    @override_settings(BILLING_WEBHOOK_MAX_ATTEMPTS=2, BILLING_WEBHOOK_BACKOFF_SECONDS=10)
+    def test_failures_back_off_then_fail(self):
+        webhook_inbox.enqueue(_checkout_event('evt_1', 'cs_1'))
+        boom = mock.Mock(side_effect=RuntimeError('db down'))
+        with mock.patch.dict(webhook_inbox.HANDLERS, {'checkout.session.completed': boom}):
+            self.assertEqual(webhook_inbox.drain(), {StripeWebhookEvent.STATUS_PENDING: 1})
+            evt = StripeWebhookEvent.objects.get()
+            self.assertEqual(evt.attempts, 1)
+            self.assertIn('db down', evt.last_error)
+            self.assertGreater(evt.available_at, timezone.now() + timedelta(seconds=5))
+            # Aún en backoff: nada disponible
+            self.assertEqual(webhook_inbox.drain(), {})
+            [evt] = webhook_inbox.claim(now=timezone.now() + timedelta(seconds=30))
+            self.assertEqual(webhook_inbox.process(evt), StripeWebhookEvent.STATUS_FAILED)
+        self.assertEqual(StripeWebhookEvent.objects.get().attempts, 2)
+
+    def test_expired_lease_is_reclaimed_and_stale_worker_loses(self):
+        webhook_inbox.enqueue(_checkout_event('evt_1', 'cs_1'))
+        [stale] = webhook_inbox.claim()
+        self.assertEqual(webhook_inbox.claim(), [])
+        [fresh] = webhook_inbox.claim(now=timezone.now() + timedelta(hours=1))
+        self.assertEqual(fresh.attempts, 2)
+        webhook_inbox.process(stale)
+        self.assertEqual(get_balance(self.user), 0)
+        self.assertEqual(webhook_inbox.process(fresh), StripeWebhookEvent.STATUS_DONE)
+        self.assertEqual(get_balance(self.user), 5)
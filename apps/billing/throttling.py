@@ -0,0 +1,135 @@
+"""Límite de ritmo por usuario y servicio con un token bucket guardado en la caché de Django.
+
+El bucket se guarda como un único número por clave, el instante en que volvería a estar lleno
+(GCRA): cada petición lo adelanta ``1 / ritmo`` segundos y se rechaza si eso lo deja más de
+``burst / ritmo`` segundos por delante de ahora. Equivale a un bucket de ``burst`` tokens que se
+rellena a ``ritmo`` por segundo, con un get y un set de caché por comprobación y sin tocar la
+base de datos. Con una caché compartida (Redis, memcached) el límite es global; con locmem es
+por proceso y cada worker de gunicorn tendría su propio bucket (el límite real sería el ritmo por
+el número de workers): fuera de DEBUG eso se avisa con el check ``billing.W001`` y una vez por
+proceso en el log. Dos peticiones simultáneas del mismo usuario pueden pisarse la escritura y dejar
+pasar una de más: el límite es para frenar clientes desbocados, no un cupo exacto.
+
+Los consumos sueltos van a un bucket por usuario y código de servicio existente (los códigos
+desconocidos comparten uno, así que inventar códigos no da más cupo); los lotes van a un bucket
+aparte por usuario que cobra un token por ítem.
+"""
+import logging
+import time
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+from .services.service_types import is_known
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'billing:throttle:'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+_state = {'warned': False}
+
+
+def check_shared_cache(app_configs=None, **kwargs):
+    """Check de sistema: los buckets necesitan una caché compartida entre workers fuera de DEBUG."""
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if settings.DEBUG or not backend.endswith('.LocMemCache'):
+        return []
+    return [checks.Warning(
+        'Billing rate limits are stored in a per-process cache.',
+        hint='Set CACHE_URL to a shared cache (redis://); with LocMemCache each worker keeps its own bucket.',
+        id='billing.W001',
+    )]
+
+
+def _warn_once():
+    if _state['warned']:
+        return
+    _state['warned'] = True
+    for warning in check_shared_cache():
+        if warning.id not in settings.SILENCED_SYSTEM_CHECKS:
+            logger.warning('%s %s', warning.msg, warning.hint)
+
+
+def parse_rate(rate: str):
+    """'60/m' -> 1.0 peticiones por segundo; vacío o None desactiva el límite."""
+    if not rate:
+        return None
+    num, period = rate.split('/')
+    return int(num) / PERIODS[period.strip()[0]]
+
+
+def take(key: str, rate: float, burst: int, now=None, tokens: int = 1) -> float:
+    """Consume ``tokens`` de ``key``; devuelve 0 si hay, o los segundos hasta tenerlos."""
+    now = time.time() if now is None else now
+    interval = 1 / rate
+    window = burst * interval
+    full_at = max(cache.get(PREFIX + key, now), now) + tokens * interval
+    if full_at - now > window:
+        return full_at - now - window
+    cache.set(PREFIX + key, full_at, timeout=int(window) + 1)
+    return 0.0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle de DRF por usuario y código de servicio; 429 con Retry-After al agotarse."""
+    rate_setting = None
+    burst_setting = None
+    default_rate = '60/m'
+    default_burst = 20
+
+    def get_service_code(self, request, view) -> str:
+        return ''
+
+    def get_tokens(self, request, view) -> int:
+        return 1
+
+    def allow_request(self, request, view):
+        self._wait = 0.0
+        rate = parse_rate(getattr(settings, self.rate_setting, self.default_rate))
+        if rate is None or not request.user or not request.user.is_authenticated:
+            return True
+        _warn_once()
+        burst = max(1, int(getattr(settings, self.burst_setting, self.default_burst)))
+        key = f'{self.rate_setting}:{request.user.pk}:{self.get_service_code(request, view)}'
+        # Nunca más de la ráfaga: un coste mayor no pasaría jamás
+        self._wait = take(key, rate, burst, tokens=min(burst, max(1, self.get_tokens(request, view))))
+        return self._wait == 0
+
+    def wait(self):
+        return self._wait or None
+
+
+class ConsumeThrottle(TokenBucketThrottle):
+    rate_setting = 'BILLING_CONSUME_RATE'
+    burst_setting = 'BILLING_CONSUME_BURST'
+
+    def get_service_code(self, request, view):
+        code = request.data.get('service_code') if hasattr(request.data, 'get') else None
+        # Solo códigos dados de alta: los desconocidos comparten bucket y no crean filas aquí
+        code = str(code or '')[:50]
+        return code if code and is_known(code) else ''
+
+
+class ConsumeBatchThrottle(TokenBucketThrottle):
+    """Lotes de consumo: un bucket por usuario, un token por ítem."""
+    rate_setting = 'BILLING_CONSUME_BATCH_RATE'
+    burst_setting = 'BILLING_CONSUME_BATCH_BURST'
+    default_rate = '600/m'
+    default_burst = 500
+
+    def get_service_code(self, request, view):
+        return 'batch'
+
+    def get_tokens(self, request, view):
+        items = request.data.get('items') if hasattr(request.data, 'get') else None
+        return len(items) if isinstance(items, list) else 1
+
+
+class ExamStartThrottle(TokenBucketThrottle):
+    rate_setting = 'BILLING_EXAM_START_RATE'
+    burst_setting = 'BILLING_EXAM_START_BURST'
+    default_rate = '10/m'
+    default_burst = 5
+
+    def get_service_code(self, request, view):
+        return 'exam'
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import PlansView, CheckoutView, PortalSessionView, WalletView, ConsumeView, RefundsView, plans_page, wallet_page, portal_open, checkout_success, checkout_cancel, refunds_page
+from .views import PlansView, CheckoutView, PortalSessionView, StripeCacheStatsView, StripeHttpStatsView, WalletView, WalletTransactionsView, ConsumeView, ConsumeBatchView, RefundsView, plans_page, wallet_page, wallet_export, portal_open, checkout_success, checkout_cancel, refunds_page
 from .webhooks import stripe_webhook
 
 app_name = 'billing'
@@ -8,8 +8,13 @@ urlpatterns = [
     path('plans/', PlansView.as_view(), name='plans'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('portal/session/', PortalSessionView.as_view(), name='portal_session'),
+    path('stripe/cache-stats/', StripeCacheStatsView.as_view(), name='stripe_cache_stats'),
+    path('stripe/http-stats/', StripeHttpStatsView.as_view(), name='stripe_http_stats'),
     path('wallet/', WalletView.as_view(), name='wallet'),
+    path('wallet/transactions/', WalletTransactionsView.as_view(), name='wallet_transactions'),
+    path('wallet/export/', wallet_export, name='wallet_export'),
     path('consume/', ConsumeView.as_view(), name='consume'),
+    path('consume/batch/', ConsumeBatchView.as_view(), name='consume_batch'),
     path('refunds/', RefundsView.as_view(), name='refunds'),
 
     # Pages
@@ -1,17 +1,21 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.decorators import api_view, permission_classes
+from django.http import StreamingHttpResponse
 from django.shortcuts import render, redirect
 from django.urls import reverse
 from django.conf import settings
 from django.contrib import messages
 
-from .serializers import PlanSerializer, CheckoutSerializer, PortalSessionSerializer, WalletSerializer, ConsumeSerializer, RefundRequestSerializer
-from .selectors import active_plans, get_wallet_for_user
-from .services.stripe_service import create_checkout_session, create_billing_portal_session, debit_credits, current_balance, request_refund, complete_checkout_by_session_id
+from .serializers import PlanSerializer, CheckoutSerializer, PortalSessionSerializer, WalletSerializer, CreditTransactionSerializer, ConsumeSerializer, ConsumeBatchSerializer, RefundRequestSerializer
+from .selectors import active_plans, peek_wallet
+from .services import guarantees, history, stripe_cache, stripe_http
+from .services.stripe_service import create_checkout_session, create_billing_portal_session, debit_credits, debit_credits_bulk, current_balance, request_refund, complete_checkout_by_session_id
 from .models import Plan, CreditPack, Purchase
 from .forms import RefundRequestForm
+from .throttling import ConsumeBatchThrottle, ConsumeThrottle
+from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import ensure_csrf_cookie
 
@@ -61,15 +65,41 @@ class PortalSessionView(APIView):
         return Response({'url': url})
 
 
+class StripeCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    def get(self, request):
+        return Response(stripe_cache.stats())
+
+
+class StripeHttpStatsView(APIView):
+    permission_classes = [IsAdminUser]
+    def get(self, request):
+        return Response(stripe_http.stats())
+
+
 class WalletView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        wallet = get_wallet_for_user(request.user)
-        return Response(WalletSerializer(wallet).data)
+        return Response(WalletSerializer(peek_wallet(request.user)).data)
+
+
+class WalletTransactionsView(APIView):
+    """Transacciones del wallet, más recientes primero; ``?cursor=`` (next_cursor anterior), ``?limit=`` (máx. 200), ``?type=``."""
+    permission_classes = [IsAuthenticated]
+    def get(self, request):
+        try:
+            limit = min(max(int(request.GET.get('limit', 50)), 1), 200)
+            rows, next_cursor = history.transactions_page(
+                peek_wallet(request.user), limit=limit, cursor=request.GET.get('cursor') or None, type=request.GET.get('type') or None,
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({'results': CreditTransactionSerializer(rows, many=True).data, 'next_cursor': next_cursor})
 
 
 class ConsumeView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ConsumeThrottle]
     def post(self, request):
         s = ConsumeSerializer(data=request.data)
         s.is_valid(raise_exception=True)
@@ -77,11 +107,45 @@ class ConsumeView(APIView):
         return Response({'ok': True, 'balance': current_balance(request.user)})
 
 
+class ConsumeBatchView(APIView):
+    """Varios consumos en una llamada; ``mode`` atomic (todo o nada) o best_effort."""
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [ConsumeBatchThrottle]
+    def post(self, request):
+        s = ConsumeBatchSerializer(data=request.data)
+        s.is_valid(raise_exception=True)
+        items = s.validated_data['items']
+        user_ids = {i['user_id'] for i in items if i.get('user_id') not in (None, request.user.pk)}
+        if user_ids and not request.user.is_staff:
+            return Response({'error': 'Only staff can consume for other users'}, status=403)
+        users = {u.pk: u for u in get_user_model().objects.filter(pk__in=user_ids)}
+        if len(users) != len(user_ids):
+            return Response({'error': 'Unknown user'}, status=400)
+        users[request.user.pk] = request.user
+        for i in items:
+            i['user'] = users[i.get('user_id') or request.user.pk]
+        try:
+            results, balances = debit_credits_bulk(items, s.validated_data['mode'])
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+        return Response({
+            'ok': all(r['ok'] for r in results),
+            'results': results,
+            'balances': {str(uid): b for uid, b in balances.items()},
+        })
+
+
 class RefundsView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
-        qs = Purchase.objects.filter(user=request.user, status=Purchase.STATUS_PAID)
-        return Response({'eligible_purchases': [p.id for p in qs]})
+        eligible = guarantees.eligible_purchases(request.user)
+        return Response({
+            'eligible_purchases': [p.id for p, _ in eligible],
+            'purchases': [
+                {'id': p.id, 'refund_amount': e.refund_amount, 'credits_used': e.used, 'guarantee_ends_at': p.guarantee_ends_at}
+                for p, e in eligible
+            ],
+        })
 
     def post(self, request):
         s = RefundRequestSerializer(data=request.data)
@@ -111,21 +175,38 @@ def plans_page(request):
 
 @ensure_csrf_cookie
 def wallet_page(request):
-    from .models import CreditTransaction
     wallet = None
-    transactions = []
+    transactions, next_cursor = [], None
     if request.user.is_authenticated:
-        wallet = get_wallet_for_user(request.user)
-        transactions = wallet.transactions.all()[:50]
+        wallet = peek_wallet(request.user)
+        try:
+            transactions, next_cursor = history.transactions_page(wallet, limit=50, cursor=request.GET.get('cursor') or None)
+        except ValueError:
+            transactions, next_cursor = history.transactions_page(wallet, limit=50)
     context = {
         'menu_items': MENU_ITEMS,
         'segment': 'billing',
         'wallet': wallet,
         'transactions': transactions,
+        'next_cursor': next_cursor,
     }
     return render(request, 'billing/wallet.html', context)
 
 
+@login_required
+def wallet_export(request):
+    """Ledger completo del wallet en streaming: ``?fmt=csv`` (por defecto) o ``?fmt=ndjson``."""
+    wallet = peek_wallet(request.user)
+    if request.GET.get('fmt') == 'ndjson':
+        response = StreamingHttpResponse(history.ndjson_lines(wallet), content_type='application/x-ndjson')
+        filename = 'transactions.ndjson'
+    else:
+        response = StreamingHttpResponse(history.csv_lines(wallet), content_type='text/csv')
+        filename = 'transactions.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 def portal_open(request):
     try:
@@ -158,6 +239,10 @@ def checkout_cancel(request):
     return render(request, 'billing/cancel.html', context)
 
 
+def _eligible_purchases(user):
+    return [p for p, _ in guarantees.eligible_purchases(user)]
+
+
 @login_required
 def refunds_page(request):
     if request.method == 'POST':
@@ -169,7 +254,7 @@ def refunds_page(request):
                     'menu_items': MENU_ITEMS,
                     'segment': 'billing',
                     'error': 'Compra no encontrada',
-                    'eligible': Purchase.objects.filter(user=request.user, status=Purchase.STATUS_PAID),
+                    'eligible': _eligible_purchases(request.user),
                     'form': form,
                 })
             try:
@@ -178,7 +263,7 @@ def refunds_page(request):
                     'menu_items': MENU_ITEMS,
                     'segment': 'billing',
                     'success': f'Reembolso procesado por ${amount}',
-                    'eligible': Purchase.objects.filter(user=request.user, status=Purchase.STATUS_PAID),
+                    'eligible': _eligible_purchases(request.user),
                     'form': RefundRequestForm(),
                 })
             except ValueError as e:
@@ -186,7 +271,7 @@ def refunds_page(request):
                     'menu_items': MENU_ITEMS,
                     'segment': 'billing',
                     'error': str(e),
-                    'eligible': Purchase.objects.filter(user=request.user, status=Purchase.STATUS_PAID),
+                    'eligible': _eligible_purchases(request.user),
                     'form': form,
                 })
     else:
@@ -194,7 +279,7 @@ def refunds_page(request):
     context = {
         'menu_items': MENU_ITEMS,
         'segment': 'billing',
-        'eligible': Purchase.objects.filter(user=request.user, status=Purchase.STATUS_PAID),
+        'eligible': _eligible_purchases(request.user),
         'form': form,
     }
     return render(request, 'billing/refunds.html', context)
@@ -2,7 +2,7 @@ from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 import stripe
-from .services.stripe_service import handle_checkout_completed, handle_invoice_paid, handle_payment_failed
+from .services.webhook_inbox import enqueue
 
 
 stripe.api_key = getattr(settings, 'STRIPE_SECRET_KEY', None)
@@ -21,14 +21,6 @@ def stripe_webhook(request):
     except stripe.error.SignatureVerificationError:
         return HttpResponse(status=400)
 
-    event_type = event['type']
-    if event_type == 'checkout.session.completed':
-        handle_checkout_completed(event)
-    elif event_type == 'invoice.paid':
-        handle_invoice_paid(event)
-    elif event_type == 'invoice.payment_failed':
-        handle_payment_failed(event)
-    elif event_type in ('customer.subscription.updated','customer.subscription.deleted','charge.refunded'):
-        # TODO: extend
-        pass
+    # Se guarda el evento ya verificado (sin volver a parsear el cuerpo); process_stripe_webhooks lo aplica fuera de la petición
+    enqueue(event)
     return HttpResponse(status=200)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from apps.education.services import expire_attempts
+
+
+class Command(BaseCommand):
+    help = 'Mark abandoned IN_PROGRESS exam attempts as EXPIRED and release their credit holds (run periodically)'
+
+    def handle(self, *args, **options):
+        count = expire_attempts()
+        self.stdout.write(self.style.SUCCESS(f'Expired {count} attempt(s)'))
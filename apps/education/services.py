@@ -4,25 +4,32 @@ from django.conf import settings
 from .models import ExamTemplate, ExamAttempt, Question
 from .selectors import get_random_questions
 from apps.billing.services.stripe_service import debit_credits, can_consume
+from apps.billing.services.service_types import service_cost
+from apps.billing.models import CreditReservation
+from apps.billing.services import reservations
 
 
 DEFAULT_PASS_THRESHOLD = float(getattr(settings, 'EDU_PASS_THRESHOLD', 70))
 EXPIRE_MINUTES = int(getattr(settings, 'EDU_EXPIRE_MINUTES', 120))
-EXAM_COST_DEFAULT = int(getattr(settings, 'BILLING_DEFAULT_EXAM_COST_CREDITS', 1))
+
+
+def _reservation_ref(attempt_id):
+    return f'exam_attempt:{attempt_id}'
 
 
 def start_attempt(user, template_id):
     template = ExamTemplate.objects.get(id=template_id, is_active=True)
-    # Check for sufficient credits before starting
-    if not can_consume(user, 'exam', 1):
-        return {'status': 'INSUFFICIENT_CREDITS'}
-
-    # Resume if there is a recent IN_PROGRESS
+    # Resume if there is a recent IN_PROGRESS (its hold already covers the cost)
     cutoff = timezone.now() - timezone.timedelta(minutes=EXPIRE_MINUTES)
     existing = ExamAttempt.objects.filter(user=user, exam_template=template, status=ExamAttempt.STATUS_IN_PROGRESS, started_at__gte=cutoff).first()
     if existing:
         return {'status': 'OK', 'attempt_id': existing.id, 'items': existing.items}
 
+    cost = service_cost('exam')
+    # Cheap lock-free pre-check; the hold below is the authoritative one
+    if not can_consume(user, 'exam', cost):
+        return {'status': 'INSUFFICIENT_CREDITS'}
+
     ids = get_random_questions(template)
     items = []
     q_map = {q.id: q for q in Question.objects.filter(id__in=ids)}
@@ -36,7 +43,17 @@ def start_attempt(user, template_id):
             'choices': q.choices if q.type == Question.TYPE_SC else [],
         })
 
-    attempt = ExamAttempt.objects.create(user=user, exam_template=template, items=items)
+    # Hold the exam cost for the attempt's lifetime so parallel attempts cannot overspend
+    with transaction.atomic():
+        attempt = ExamAttempt.objects.create(user=user, exam_template=template, items=items)
+        try:
+            reservations.hold(
+                user, 'exam', cost, ttl_seconds=EXPIRE_MINUTES * 60, reference=_reservation_ref(attempt.id),
+                metadata={'source': 'education', 'attempt_id': attempt.id},
+            )
+        except ValueError:
+            transaction.set_rollback(True)
+            return {'status': 'INSUFFICIENT_CREDITS'}
     return {'status': 'OK', 'attempt_id': attempt.id, 'items': items}
 
 
@@ -119,8 +136,19 @@ def submit_attempt(user, attempt_id, answers_payload):
 
     # debit credits exactly once
     if attempt.credits_spent == 0:
-        cost = int(getattr(settings, 'BILLING_DEFAULT_EXAM_COST_CREDITS', EXAM_COST_DEFAULT))
-        debit_credits(user, 'exam', cost, {'source': 'education', 'attempt_id': attempt.id})
+        held = reservations.held_for(_reservation_ref(attempt.id))
+        cost = None
+        if held:
+            try:
+                reservations.capture(held)
+                cost = held.amount
+            except ValueError:
+                # expire_attempts expired the hold between held_for() and capture()
+                cost = None
+        if cost is None:
+            # Attempts started before reservations, or whose hold already expired
+            cost = service_cost('exam')
+            debit_credits(user, 'exam', cost, {'source': 'education', 'attempt_id': attempt.id})
         attempt.credits_spent = cost
 
     attempt.save(update_fields=['items', 'score_pct', 'passed', 'status', 'finished_at', 'credits_spent'])
@@ -130,5 +158,7 @@ def submit_attempt(user, attempt_id, answers_payload):
 def expire_attempts():
     cutoff = timezone.now() - timezone.timedelta(minutes=EXPIRE_MINUTES)
     stale = ExamAttempt.objects.filter(status=ExamAttempt.STATUS_IN_PROGRESS, started_at__lt=cutoff)
-    count = stale.update(status=ExamAttempt.STATUS_EXPIRED)
+    ids = list(stale.values_list('id', flat=True))
+    count = ExamAttempt.objects.filter(id__in=ids, status=ExamAttempt.STATUS_IN_PROGRESS).update(status=ExamAttempt.STATUS_EXPIRED)
+    reservations.release_references([_reservation_ref(i) for i in ids], status=CreditReservation.STATUS_EXPIRED)
     return count
@@ -49,3 +49,76 @@ def test_start_and_submit_attempt(client):
     a = ExamAttempt.objects.get(id=attempt_id)
     if result['status'] == 'OK':
         assert a.status == 'SUBMITTED'
+
+
+@pytest.mark.django_db
+def test_attempt_holds_credits_until_submit():
+    from apps.billing.models import CreditWallet
+    from apps.billing.services import ledger
+    from apps.education.services import start_attempt, submit_attempt
+
+    u = get_user_model().objects.create_user(username='u2', password='pass')
+    ledger.credit(u, 1)
+    t = Topic.objects.create(name='Hold', slug='hold')
+    for i in range(2):
+        Question.objects.create(topic=t, type='TF', text=f'TF {i}', difficulty='easy', correct_answer='true')
+    first = ExamTemplate.objects.create(name='One', topic=t, num_questions=2, is_active=True)
+    second = ExamTemplate.objects.create(name='Two', topic=t, num_questions=2, is_active=True)
+
+    started = start_attempt(u, first.id)
+    assert started['status'] == 'OK'
+    # El saldo cubre un examen: el segundo en paralelo no puede arrancar
+    assert start_attempt(u, second.id) == {'status': 'INSUFFICIENT_CREDITS'}
+    assert ExamAttempt.objects.filter(user=u).count() == 1
+
+    answers = [{'question_id': it['question_id'], 'selected': 'true'} for it in started['items']]
+    assert submit_attempt(u, started['attempt_id'], answers)['status'] == 'OK'
+    w = CreditWallet.objects.get(user=u)
+    assert (w.balance, w.held) == (0, 0)
+    assert ExamAttempt.objects.get(id=started['attempt_id']).credits_spent == 1
+
+
+@pytest.mark.django_db
+def test_resume_attempt_at_exact_balance():
+    from apps.billing.services import ledger
+    from apps.education.services import start_attempt
+
+    u = get_user_model().objects.create_user(username='u4', password='pass')
+    ledger.credit(u, 1)
+    t = Topic.objects.create(name='Resume', slug='resume')
+    for i in range(2):
+        Question.objects.create(topic=t, type='TF', text=f'TF {i}', difficulty='easy', correct_answer='true')
+    template = ExamTemplate.objects.create(name='Resume', topic=t, num_questions=2, is_active=True)
+
+    started = start_attempt(u, template.id)
+    assert started['status'] == 'OK'
+    # La reserva del intento abierto ya cubre el coste: reanudar no vuelve a exigir saldo
+    resumed = start_attempt(u, template.id)
+    assert resumed == {'status': 'OK', 'attempt_id': started['attempt_id'], 'items': started['items']}
+
+
+@pytest.mark.django_db
+def test_submit_falls_back_to_debit_when_hold_expires_mid_submit():
+    from unittest import mock
+    from apps.billing.models import CreditReservation, CreditWallet
+    from apps.billing.services import ledger, reservations
+    from apps.education.services import _reservation_ref, start_attempt, submit_attempt
+
+    u = get_user_model().objects.create_user(username='u3', password='pass')
+    ledger.credit(u, 1)
+    t = Topic.objects.create(name='Race', slug='race')
+    for i in range(2):
+        Question.objects.create(topic=t, type='TF', text=f'TF {i}', difficulty='easy', correct_answer='true')
+    template = ExamTemplate.objects.create(name='Race', topic=t, num_questions=2, is_active=True)
+    started = start_attempt(u, template.id)
+    ref = _reservation_ref(started['attempt_id'])
+    stale = reservations.held_for(ref)
+    # expire_reservations gana la carrera después de que submit lea la reserva
+    reservations.release_references([ref], status=CreditReservation.STATUS_EXPIRED)
+
+    answers = [{'question_id': it['question_id'], 'selected': 'true'} for it in started['items']]
+    with mock.patch('apps.education.services.reservations.held_for', return_value=stale):
+        assert submit_attempt(u, started['attempt_id'], answers)['status'] == 'OK'
+    w = CreditWallet.objects.get(user=u)
+    assert (w.balance, w.held) == (0, 0)
+    assert ExamAttempt.objects.get(id=started['attempt_id']).credits_spent == 1
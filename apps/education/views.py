@@ -27,6 +27,7 @@ from .selectors import get_active_templates, get_user_attempts, stats_user
 from .permissions import IsStaff
 
 from apps.my_profile.models import Profile
+from apps.billing.throttling import ExamStartThrottle
 
 # -------------------- Retell webhook and session APIs (existing) --------------------
 class RetellExamCompletedView(APIView):
@@ -318,6 +319,7 @@ class TemplatesAPI(APIView):
 
 class StartAttemptAPI(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [ExamStartThrottle]
     def post(self, request):
         template_id = request.data.get('template_id')
         r = start_attempt(request.user, template_id)
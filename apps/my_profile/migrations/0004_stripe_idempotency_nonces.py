@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-18 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('my_profile', '0003_profile_stripe_customer_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='stripe_idempotency_nonce',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -5,6 +5,8 @@ class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='profile')
     external_id = models.CharField(max_length=255, blank=True, null=True, unique=True, db_index=True)
     stripe_customer_id = models.CharField(max_length=100, blank=True, null=True, unique=True)
+    # Nonce de la Idempotency-Key de Stripe.Customer.create (billing.services.idempotency)
+    stripe_idempotency_nonce = models.UUIDField(blank=True, null=True, editable=False)
     phone = models.CharField(max_length=20, blank=True)
     address = models.CharField(max_length=255, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
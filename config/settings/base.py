@@ -311,14 +311,59 @@ STRIPE_PUBLISHABLE_KEY = env("STRIPE_PUBLISHABLE_KEY", default="")
 STRIPE_WEBHOOK_SECRET = env("STRIPE_WEBHOOK_SECRET", default="")
 STRIPE_PORTAL_RETURN_URL = env("STRIPE_PORTAL_RETURN_URL", default="http://localhost:8000/")
 STRIPE_PORTAL_CONFIGURATION_ID = env("STRIPE_PORTAL_CONFIGURATION_ID", default="")
+# Cliente HTTP de Stripe: timeouts (s), reintentos con backoff y conexiones keep-alive por hilo
+STRIPE_HTTP_CONNECT_TIMEOUT = env.float("STRIPE_HTTP_CONNECT_TIMEOUT", default=5)
+STRIPE_HTTP_READ_TIMEOUT = env.float("STRIPE_HTTP_READ_TIMEOUT", default=30)
+STRIPE_MAX_NETWORK_RETRIES = env.int("STRIPE_MAX_NETWORK_RETRIES", default=2)
+STRIPE_HTTP_POOL_SIZE = env.int("STRIPE_HTTP_POOL_SIZE", default=10)
+# Cada cuántos segundos se suman a la caché las latencias de Stripe acumuladas en el proceso
+STRIPE_HTTP_STATS_FLUSH_SECONDS = env.float("STRIPE_HTTP_STATS_FLUSH_SECONDS", default=10)
+# URL base de la API de Stripe; p. ej. http://127.0.0.1:12111 con `manage.py stripe_fake_server` (vacío = Stripe real)
+STRIPE_API_BASE = env("STRIPE_API_BASE", default="")
 
 BILLING_REFUND_PRO_RATA = env.bool("BILLING_REFUND_PRO_RATA", default=False)
 BILLING_DEFAULT_EXAM_COST_CREDITS = env.int("BILLING_DEFAULT_EXAM_COST_CREDITS", default=1)
 BILLING_ALLOW_REFUND_IF_USED_THRESHOLD = env.int("BILLING_ALLOW_REFUND_IF_USED_THRESHOLD", default=0)
 BILLING_CREDIT_CARRYOVER = env.bool("BILLING_CREDIT_CARRYOVER", default=False)
+# Segundos que cada proceso reutiliza su registro de ServiceType (los cambios locales lo invalidan antes)
+BILLING_SERVICE_TYPE_TTL = env.int("BILLING_SERVICE_TYPE_TTL", default=300)
+# TTL por defecto de las reservas de créditos (expire_credit_reservations libera las vencidas)
+BILLING_RESERVATION_TTL_SECONDS = env.int("BILLING_RESERVATION_TTL_SECONDS", default=3600)
+# Webhooks de Stripe: intentos antes de dejar el evento en FAILED y backoff exponencial entre ellos
+BILLING_WEBHOOK_MAX_ATTEMPTS = env.int("BILLING_WEBHOOK_MAX_ATTEMPTS", default=8)
+BILLING_WEBHOOK_BACKOFF_SECONDS = env.int("BILLING_WEBHOOK_BACKOFF_SECONDS", default=30)
+BILLING_WEBHOOK_BACKOFF_MAX_SECONDS = env.int("BILLING_WEBHOOK_BACKOFF_MAX_SECONDS", default=3600)
+# Segundos que un worker retiene un evento antes de que otro pueda reclamarlo
+BILLING_WEBHOOK_LEASE_SECONDS = env.int("BILLING_WEBHOOK_LEASE_SECONDS", default=300)
+# TTL de la caché de objetos de Stripe (configuración del portal, precios, ids de customer)
+BILLING_STRIPE_CACHE_TTL = env.int("BILLING_STRIPE_CACHE_TTL", default=3600)
+# Consumo medido (services/metering.py): volcado cada N segundos o N eventos; clamp | allow al quedarse sin saldo
+BILLING_METER_FLUSH_SECONDS = env.float("BILLING_METER_FLUSH_SECONDS", default=5)
+BILLING_METER_FLUSH_EVENTS = env.int("BILLING_METER_FLUSH_EVENTS", default=1000)
+BILLING_METER_OVERDRAFT = env("BILLING_METER_OVERDRAFT", default="clamp")
+# Token bucket por usuario y servicio (billing/throttling.py): ritmo "n/s|m|h|d" (vacío = sin límite) y ráfaga
+BILLING_CONSUME_RATE = env("BILLING_CONSUME_RATE", default="60/m")
+BILLING_CONSUME_BURST = env.int("BILLING_CONSUME_BURST", default=20)
+# Lotes de /billing/consume/batch/: un token por ítem, por usuario
+BILLING_CONSUME_BATCH_RATE = env("BILLING_CONSUME_BATCH_RATE", default="600/m")
+BILLING_CONSUME_BATCH_BURST = env.int("BILLING_CONSUME_BATCH_BURST", default=500)
+BILLING_EXAM_START_RATE = env("BILLING_EXAM_START_RATE", default="10/m")
+BILLING_EXAM_START_BURST = env.int("BILLING_EXAM_START_BURST", default=5)
 
 STRIPE_UI_PREVIEW = env.bool("STRIPE_UI_PREVIEW", default=False)
 
 EDU_PASS_THRESHOLD = env.float("EDU_PASS_THRESHOLD", default=70.0)
 EDU_REVEAL_CORRECT_ANSWERS = env.bool("EDU_REVEAL_CORRECT_ANSWERS", default=False)
 EDU_EXPIRE_MINUTES = env.int("EDU_EXPIRE_MINUTES", default=120)
+
+# Cache: local-memory by default (one per process); prod needs a shared CACHE_URL (redis://, see render.yaml)
+CACHES = {"default": env.cache_url("CACHE_URL", default="locmemcache://")}
+
+# Analytics: margen de re-escaneo del build incremental de facts (segundos)
+ANALYTICS_WATERMARK_OVERLAP_SECONDS = env.int("ANALYTICS_WATERMARK_OVERLAP_SECONDS", default=300)
+# Analytics: TTL de los resultados cacheados (las escrituras invalidan antes por versión de día)
+ANALYTICS_CACHE_TTL = env.int("ANALYTICS_CACHE_TTL", default=300)
+# Analytics: segundos que vale una celda de cohortes del mes en curso antes de recalcularla al leer
+ANALYTICS_COHORTS_TTL = env.int("ANALYTICS_COHORTS_TTL", default=3600)
+# Analytics: hilos para cargar en paralelo los paneles del dashboard (1 = en serie)
+ANALYTICS_DASHBOARD_WORKERS = env.int("ANALYTICS_DASHBOARD_WORKERS", default=5)
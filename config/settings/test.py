@@ -26,3 +26,12 @@ PASSWORD_HASHERS = [
 ]
 
 EMAIL_BACKEND = "django.core.mail.backends.locmem.EmailBackend"
+
+# TestCase envuelve cada test en una transacción que otras conexiones (hilos) no ven
+ANALYTICS_DASHBOARD_WORKERS = 1
+
+# Los rollbacks de TestCase no emiten post_delete: sin registro de ServiceType entre tests
+BILLING_SERVICE_TYPE_TTL = 0
+
+# Caché local a propósito en tests: sin aviso de throttles en caché por proceso
+SILENCED_SYSTEM_CHECKS = ["billing.W001"]